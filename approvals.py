@@ -0,0 +1,237 @@
+import os
+import csv
+import json
+import datetime
+
+SNAPSHOT_PATH = "data/approvals_snapshot.json"
+DEFAULT_CONSUMER = "default"
+APPROVED_VALUES = ("true", "wahr")
+APPROVALS_SHEET = "approvals"
+# caption_file / image_urls_file hold the caption text and "|"-joined URLs; names kept for the sheet
+APPROVALS_COLUMNS = ["product_id", "titel", "description", "caption_file", "image_urls_file", "approved"]
+
+
+def is_approved(value):
+    return str(value).strip().lower() in APPROVED_VALUES
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def read_workbook_rows(path, sheet=None):
+    """Rows of the approvals sheet as dicts, streamed with openpyxl in read-only mode."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet and sheet in workbook.sheetnames else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return []
+        columns = [str(c).strip() if c is not None else "" for c in header]
+        result = []
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            row = {col: _jsonable(v) for col, v in zip(columns, values) if col}
+            if row.get("product_id") is None:
+                continue
+            product_id = row["product_id"]
+            if isinstance(product_id, float) and product_id.is_integer():
+                product_id = int(product_id)
+            row["product_id"] = str(product_id).strip()
+            result.append(row)
+        return result
+    finally:
+        workbook.close()
+
+
+class ApprovalsReader:
+    """Approvals sheet reader with a parsed snapshot keyed by file mtime and size.
+
+    Unchanged workbooks are served from ``data/approvals_snapshot.json``
+    without opening them. The snapshot also keeps the approval states each
+    ``consumer`` saw on its last read, so every consumer (the scheduler, the
+    posting worker, ...) can ask which rows changed since it last looked,
+    independently of the others.
+    """
+
+    def __init__(self, path, snapshot_path=SNAPSHOT_PATH, sheet=APPROVALS_SHEET, consumer=DEFAULT_CONSUMER):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.sheet = sheet
+        self.consumer = consumer
+
+    def _load_snapshots(self):
+        if not os.path.exists(self.snapshot_path):
+            return {}
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _save_snapshots(self, snapshots):
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshots, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def read(self):
+        """Return ``(rows, changed)``: all rows, and those whose approval state changed since this consumer's last read.
+
+        New rows count as changed when they are approved. ``changed`` is
+        empty when neither the workbook nor the consumer's view changed.
+        """
+        if not os.path.exists(self.path):
+            return [], []
+        stat = os.stat(self.path)
+        key = os.path.abspath(self.path)
+        snapshots = self._load_snapshots()
+        snapshot = snapshots.get(key) or {}
+        if snapshot.get("mtime_ns") == stat.st_mtime_ns and snapshot.get("size") == stat.st_size:
+            rows = snapshot["rows"]
+        else:
+            rows = read_workbook_rows(self.path, self.sheet)
+        seen = snapshot.get("seen", {})
+        before = seen.get(self.consumer, {})
+        states = {row["product_id"]: is_approved(row.get("approved")) for row in rows}
+        if rows is snapshot.get("rows") and states == before:
+            return rows, []
+
+        changed = [row for row in rows if states[row["product_id"]] != before.get(row["product_id"], False)]
+        seen[self.consumer] = states
+        snapshots[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "rows": rows, "seen": seen}
+        self._save_snapshots(snapshots)
+        return rows, changed
+
+    def approved(self):
+        rows, _ = self.read()
+        return [row for row in rows if is_approved(row.get("approved"))]
+
+
+def get_approved_entries(path, sheet=APPROVALS_SHEET, consumer=DEFAULT_CONSUMER):
+    return ApprovalsReader(path, sheet=sheet, consumer=consumer).approved()
+
+
+class ApprovalsWriter:
+    """Collects prepared posts and merges them into the approvals CSV and workbook in one pass.
+
+    Rows are keyed by ``product_id``: a product prepared again updates its
+    existing row instead of adding a duplicate, and the reviewer's
+    ``approved`` value is never overwritten.
+    """
+
+    def __init__(self, csv_path, encoding="utf-8"):
+        self.csv_path = csv_path
+        self.encoding = encoding
+        self.rows = {}
+
+    def add(self, product_id, titel, description, caption, image_urls):
+        self.rows[str(product_id)] = {
+            "product_id": str(product_id),
+            "titel": titel,
+            "description": description,
+            "caption_file": caption,
+            "image_urls_file": "|".join(image_urls),
+            "approved": "FALSE",
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _merge(self, existing):
+        """Merge pending rows into ``existing`` (dict by product_id), keeping reviewer decisions."""
+        for product_id, row in self.rows.items():
+            current = existing.get(product_id)
+            if current is not None:
+                row = {**row, "approved": current.get("approved", row["approved"])}
+            existing[product_id] = row
+        return existing
+
+    def flush(self):
+        """Write the merged CSV atomically."""
+        existing = {}
+        if os.path.exists(self.csv_path) and os.stat(self.csv_path).st_size:
+            with open(self.csv_path, newline="", encoding=self.encoding, errors="replace") as f:
+                for row in csv.DictReader(f, delimiter=";"):
+                    if row.get("product_id"):
+                        existing[row["product_id"]] = row
+        merged = self._merge(existing)
+
+        directory = os.path.dirname(self.csv_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.csv_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding=self.encoding) as f:
+            writer = csv.DictWriter(f, fieldnames=APPROVALS_COLUMNS, delimiter=";", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(merged.values())
+        os.replace(tmp_path, self.csv_path)
+        return len(merged)
+
+    def export_excel(self, excel_path, sheet=APPROVALS_SHEET):
+        """Update the single approvals sheet of the workbook in place: changed cells and new rows only."""
+        from openpyxl import Workbook, load_workbook
+
+        if os.path.exists(excel_path):
+            workbook = load_workbook(excel_path)
+        else:
+            workbook = Workbook()
+            workbook.active.title = sheet
+        if sheet in workbook.sheetnames:
+            worksheet = workbook[sheet]
+        else:
+            worksheet = workbook.create_sheet(sheet, 0)
+        header = [cell.value for cell in worksheet[1] if cell.value is not None]
+        for column in APPROVALS_COLUMNS:
+            if column not in header:
+                header.append(column)
+                worksheet.cell(1, len(header), column)
+        index = {name: i + 1 for i, name in enumerate(header)}
+
+        row_of = {}
+        for r, (product_id,) in enumerate(
+            worksheet.iter_rows(min_row=2, min_col=index["product_id"], max_col=index["product_id"],
+                                values_only=True), start=2):
+            if product_id is not None:
+                if isinstance(product_id, float) and product_id.is_integer():
+                    product_id = int(product_id)
+                row_of[str(product_id).strip()] = r
+
+        updated = added = 0
+        for product_id, row in self.rows.items():
+            r = row_of.get(product_id)
+            if r is None:
+                r = worksheet.max_row + 1
+                added += 1
+            else:
+                updated += 1
+            for column in APPROVALS_COLUMNS:
+                if column == "approved" and product_id in row_of:
+                    continue  # reviewer's decision
+                worksheet.cell(r, index[column], row[column])
+
+        tmp_path = excel_path + ".tmp.xlsx"
+        workbook.save(tmp_path)
+        os.replace(tmp_path, excel_path)
+        return added, updated
+
+
+if __name__ == "__main__":
+    import sys
+
+    rows, changed = ApprovalsReader(sys.argv[1], consumer="cli").read()
+    print(f"🔍 {sum(is_approved(r.get('approved')) for r in rows)} of {len(rows)} rows approved")
+    for row in changed:
+        state = "approved" if is_approved(row.get("approved")) else "unapproved"
+        print(f"   {row['product_id']}: {state}")
@@ -0,0 +1,54 @@
+"""Throughput of llm.batch.generate_captions against a stub LLM server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_batch_captions --products 32 --latency 0.2
+"""
+
+import time
+import argparse
+
+from llm.batch import generate_captions
+from llm.ollama_client import OllamaClient
+from benchmarks.fakes import FakeOllamaServer
+
+
+def make_caption_fn(base_url):
+    client = OllamaClient(base_url, pool_size=16)
+
+    def caption_fn(product, timeout):
+        return client.chat(product["description"], model="stub", timeout=timeout).text
+
+    return caption_fn
+
+
+def run(products, latency, workers_list):
+    catalogue = [{"id": str(i), "titel": f"Produkt {i}", "description": "Beschreibung " * 20}
+                 for i in range(products)]
+    results = []
+    with FakeOllamaServer(latency=latency) as server:
+        caption_fn = make_caption_fn(server.url)
+        for workers in workers_list:
+            start = time.perf_counter()
+            ok = sum(r.ok for r in generate_captions(catalogue, caption_fn=caption_fn, max_workers=workers, timeout=30))
+            elapsed = time.perf_counter() - start
+            results.append((workers, ok, elapsed, ok / elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds per request")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'ok':>4} {'seconds':>8} {'captions/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers, ok, elapsed, throughput in run(args.products, args.latency, args.workers):
+        baseline = baseline or throughput
+        print(f"{workers:>7} {ok:>4} {elapsed:>8.2f} {throughput:>10.2f} {throughput / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Caption quality gate: check time against the caption history, and regeneration of rejected captions.
+
+Fills a scratch caption history with N synthetic posted captions and times
+CaptionGate.problems, then runs llm.batch.generate_checked_captions against
+a fake Ollama server and checks that rejected captions are regenerated and
+never served again from the caption cache:
+
+    python -m benchmarks.bench_caption_gate --history 5000 --checks 200
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.fakes import FakeOllamaServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = ("Pfanne Topf Messer Holz Keramik Glas schön neu für die Küche jeden Tag kochen backen grillen "
+         "spülmaschinenfest handlich robust Geschenk Familie Sommer Winter Frühstück Abendessen").split()
+BAD_CAPTION = "<b>Ein schönes Produkt!</b> #hagengrote"
+
+
+def random_caption(rng, words=40):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + " #hagengrote #küche"
+
+
+def time_checks(history, checks, seed):
+    from caption_quality import CaptionGate
+
+    rng = random.Random(seed)
+    gate = CaptionGate(os.path.join("data", "bench_caption_history.sqlite3"))
+    start = time.perf_counter()
+    gate.remember_many((f"p{i}", random_caption(rng)) for i in range(history))
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    rejected = sum(bool(gate.problems(random_caption(rng))) for _ in range(checks))
+    checked = time.perf_counter() - start
+    gate.close()
+    return indexed, checked, rejected
+
+
+def run_checked(products, max_regenerations):
+    from llm.batch import generate_checked_captions
+    from caption_quality import rule_problems
+
+    results = list(generate_checked_captions(products, lambda product, caption: rule_problems(caption),
+                                             max_regenerations=max_regenerations, max_workers=4, timeout=30))
+    return sum(r.ok for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=5000, help="posted captions in the history")
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--products", type=int, default=8, help="products for the regeneration check")
+    parser.add_argument("--regenerations", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    sys.path.insert(0, REPO_ROOT)
+    replies = {"text": BAD_CAPTION}
+    products = [{"id": str(100000 + i), "titel": f"Produkt {i}", "description": "Beschreibung"}
+                for i in range(args.products)]
+    attempts = args.products * (args.regenerations + 1)
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeOllamaServer(latency=0.01, reply=lambda prompt: replies["text"], seed=args.seed) as ollama:
+        os.chdir(workdir)  # config/ and data/ are relative to the working directory
+        try:
+            os.makedirs("config")
+            with open(os.path.join("config", "secrets.json"), "w", encoding="utf-8") as f:
+                json.dump({"ollama_host": ollama.url, "prompt": "Bildunterschrift für {titel}: {description}"}, f)
+
+            indexed, checked, duplicates = time_checks(args.history, args.checks, args.seed)
+            print(f"index {args.history} captions: {indexed:6.2f}s")
+            print(f"check {args.checks} captions:   {checked:6.2f}s "
+                  f"({checked / args.checks * 1000:.2f}ms each, {duplicates} rejected)")
+
+            # Every attempt is rejected: each one asks the model, and a rerun is not served the rejected text
+            for run in ("first run", "rerun"):
+                before = ollama.requests
+                ok = run_checked(products, args.regenerations)
+                calls = ollama.requests - before
+                print(f"{run}: {ok} accepted, {calls} LLM calls for {attempts} attempts")
+                assert ok == 0 and calls == attempts, f"{run}: expected {attempts} LLM calls, got {calls}"
+
+            # Accepted captions are still cached
+            replies["text"] = "Ein schönes Produkt für jeden Tag! #hagengrote"
+            run_checked(products, args.regenerations)
+            before = ollama.requests
+            ok = run_checked(products, args.regenerations)
+            print(f"accepted rerun: {ok} accepted, {ollama.requests - before} LLM calls")
+            assert ok == args.products and ollama.requests == before, "accepted captions were not served from cache"
+        finally:
+            os.chdir(cwd)
+    print("✅ Rejected captions are regenerated and never served from the cache.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Carousel publish time against a local fake Graph API.
+
+Compares the former sequential upload (create, poll every 2s, sleep 1s per
+item) with master_scheduler.upload_and_publish:
+
+    python -m benchmarks.bench_carousel_upload --images 5 --processing-time 1.5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import requests
+
+from benchmarks.fakes import FakeGraphServer, FakeImageServer
+
+IG_USER_ID = "1784000000"
+TOKEN = "fake-token"
+
+
+def legacy_publish(base_url, image_urls, caption):
+    def wait_until_ready(media_id):
+        for _ in range(10):
+            status = requests.get(f"{base_url}/{media_id}?fields=status_code",
+                                  params={"access_token": TOKEN}).json().get("status_code")
+            if status == "FINISHED":
+                return True
+            time.sleep(2)
+        return False
+
+    media_ids = []
+    for url in image_urls:
+        res = requests.post(f"{base_url}/{IG_USER_ID}/media", params={
+            "image_url": url, "is_carousel_item": "true", "access_token": TOKEN})
+        media_id = res.json()["id"]
+        assert wait_until_ready(media_id)
+        media_ids.append(media_id)
+        time.sleep(1)
+    res = requests.post(f"{base_url}/{IG_USER_ID}/media", params={
+        "children": ",".join(media_ids), "media_type": "CAROUSEL", "caption": caption, "access_token": TOKEN})
+    carousel_id = res.json()["id"]
+    assert wait_until_ready(carousel_id)
+    return requests.post(f"{base_url}/{IG_USER_ID}/media_publish",
+                         params={"creation_id": carousel_id, "access_token": TOKEN}).json()
+
+
+def prepare_workdir(workdir, base_url, product_id, image_urls, caption):
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    with open(os.path.join(workdir, "config", "secrets.json"), "w") as f:
+        json.dump({"access_token": TOKEN, "ig_user_id": IG_USER_ID, "sharepoint": "approvals.xlsx",
+                   "graph_api_url": base_url}, f)
+    product_dir = os.path.join(workdir, "output", product_id)
+    os.makedirs(product_dir, exist_ok=True)
+    with open(os.path.join(product_dir, "image_urls.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(image_urls))
+    with open(os.path.join(product_dir, "caption.txt"), "w", encoding="utf-8") as f:
+        f.write(caption)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--processing-time", type=float, default=1.5, help="fake container processing seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake per-request seconds")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    caption = "Ein schönes Produkt! #hagengrote"
+
+    with FakeGraphServer(latency=args.latency, processing_time=args.processing_time) as server, \
+            FakeImageServer(latency=0) as images, tempfile.TemporaryDirectory() as workdir:
+        image_urls = [images.add(f"/bilder/gross/100001_{i}.jpg") for i in range(args.images)]
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            legacy_publish(server.url, image_urls, caption)
+            legacy = time.perf_counter() - start
+            print(f"sequential: {legacy:6.2f}s")
+
+        prepare_workdir(workdir, server.url, "100001", image_urls, caption)
+        cwd = os.getcwd()
+        os.chdir(workdir)  # config/secrets.json is read relative to the working directory
+        sys.path.insert(0, cwd)
+        try:
+            import master_scheduler
+
+            requests_before = server.requests
+            start = time.perf_counter()
+            response = master_scheduler.upload_and_publish("100001")
+            current = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+        assert all("id" in r for r in response.values()), response
+        print(f"concurrent: {current:6.2f}s ({server.requests - requests_before} requests)")
+        if not args.skip_legacy:
+            print(f"speedup:    {legacy / current:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
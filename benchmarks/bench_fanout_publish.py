@@ -0,0 +1,67 @@
+"""Fan-out publish time of publisher.Publisher against a local fake Graph API.
+
+Publishes one carousel to N Instagram accounts plus one Facebook Page, first
+one target after the other, then all targets at once with shared readiness
+polling; the concurrent run should take about as long as the slowest target:
+
+    python -m benchmarks.bench_fanout_publish --accounts 4 --images 5
+"""
+
+import time
+import argparse
+
+import graph_api
+from publisher import Post, Publisher, InstagramTarget, FacebookPageTarget
+from benchmarks.fakes import FakeGraphServer
+
+TOKEN = "fake-token"
+
+
+def make_targets(base_url, accounts):
+    client = graph_api.get_graph(TOKEN, base_url)
+    targets = [InstagramTarget(f"ig-{i}", client, f"17840000000{i}") for i in range(accounts)]
+    targets.append(FacebookPageTarget("fb-page", client, "1000000000"))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=4, help="Instagram targets (plus one Facebook Page)")
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--processing-time", type=float, default=1.5, help="fake container processing seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake per-request seconds")
+    args = parser.parse_args()
+
+    image_urls = [f"https://shop.example/bilder/gross/100001_{i}.jpg" for i in range(args.images)]
+    post = Post("100001", "Ein schönes Produkt! #hagengrote", image_urls)
+
+    with FakeGraphServer(latency=args.latency, processing_time=args.processing_time) as server:
+        publisher = Publisher(make_targets(server.url, args.accounts))
+
+        start = time.perf_counter()
+        for name in publisher.targets:
+            results = publisher.publish(post, [name])
+            assert results[name].ok, results[name].error
+        sequential = time.perf_counter() - start
+
+        requests_before = server.requests
+        start = time.perf_counter()
+        results = publisher.publish(post)
+        concurrent = time.perf_counter() - start
+        assert all(r.ok for r in results.values()), results
+        slowest = max(r.elapsed for r in results.values())
+
+        # No targets left means no Graph calls, not a publish to every target
+        requests_after = server.requests
+        assert publisher.publish(post, []) == {}
+        assert server.requests == requests_after, "publish(post, []) called the Graph API"
+
+    print(f"targets:    {len(results)}")
+    print(f"sequential: {sequential:6.2f}s")
+    print(f"concurrent: {concurrent:6.2f}s ({server.requests - requests_before} requests, "
+          f"slowest target {slowest:.2f}s)")
+    print(f"speedup:    {sequential / concurrent:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
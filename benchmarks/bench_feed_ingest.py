@@ -0,0 +1,86 @@
+"""Wall time and peak memory of product feed ingestion on a synthetic WebSale TSV.
+
+Compares the legacy full-DataFrame load against the chunked, column-pruned
+reader in fetch_product_list, each in its own process so peak RSS is clean:
+
+    python -m benchmarks.bench_feed_ingest --rows 50000 100000 200000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from benchmarks.catalogue import write_feed
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_ingest(source, out_path):
+    import pandas as pd
+
+    product_df = pd.read_csv(source, encoding="latin-1", on_bad_lines="skip", sep="\t")
+    base_columns = ["id", "titel", "description", "image_link", "Bestand"]
+    zusatz_columns = [col for col in product_df.columns if col.startswith("Zusatzbild_")]
+    product_df = product_df[base_columns + zusatz_columns]
+    product_df.to_csv(out_path, index=False, sep=";", encoding="latin-1")
+
+
+def streaming_ingest(source, out_path):
+    from fetch_product_list import fetch_product_data
+
+    fetch_product_data(source, csv_path=out_path)
+
+
+def worker(mode, source, workdir):
+    os.chdir(workdir)  # config/secrets.json is read relative to the working directory
+    start = time.perf_counter()
+    out_path = os.path.join(workdir, f"{mode}.csv")
+    (legacy_ingest if mode == "legacy" else streaming_ingest)(source, out_path)
+    elapsed = time.perf_counter() - start
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "peak_mib": peak_kib / 1024}))
+
+
+def measure(mode, source, workdir):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_feed_ingest", "--worker", mode, source, workdir],
+        capture_output=True, text=True, check=True, env=env, cwd=REPO_ROOT,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[25000, 50000, 100000])
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(*args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "config"))
+        with open(os.path.join(workdir, "config", "secrets.json"), "w") as f:
+            json.dump({"websale-url": ""}, f)
+
+        print(f"{'rows':>8} {'feed MiB':>9} {'legacy s':>9} {'legacy MiB':>11} {'stream s':>9} {'stream MiB':>11}")
+        for rows in args.rows:
+            source = os.path.join(workdir, f"feed_{rows}.tsv")
+            write_feed(source, rows)
+            legacy = measure("legacy", source, workdir)
+            streaming = measure("streaming", source, workdir)
+            print(f"{rows:>8} {os.path.getsize(source) / 2**20:>9.1f} "
+                  f"{legacy['seconds']:>9.2f} {legacy['peak_mib']:>11.0f} "
+                  f"{streaming['seconds']:>9.2f} {streaming['peak_mib']:>11.0f}")
+            os.remove(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Throughput of image_pipeline.ImagePipeline on a synthetic sample image set.
+
+Serves generated shop-sized JPEGs (mixed aspect ratios, up to 3000px) from a
+local fake image host and renders Instagram derivatives with 1 and N worker
+processes, then once more with a warm derivative cache:
+
+    python -m benchmarks.bench_image_pipeline --images 40 --processes 1 4
+"""
+
+import io
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from image_pipeline import ImagePipeline
+from benchmarks.fakes import FakeImageServer
+
+SIZES = [(3000, 3000), (2400, 1600), (1600, 2400), (3000, 1200), (1200, 2400), (2000, 1500)]
+
+
+def sample_images(n, seed=0):
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for i in range(n):
+        size = SIZES[i % len(SIZES)]
+        image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(30):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            draw.ellipse((x, y, x + rng.randrange(50, 600), y + rng.randrange(50, 600)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=92)
+        images.append(out.getvalue())
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    images = sample_images(args.images)
+    print(f"{len(images)} images, {sum(map(len, images)) / 2**20:.1f} MiB")
+
+    with FakeImageServer(latency=0) as server, tempfile.TemporaryDirectory() as workdir:
+        urls = [server.add(f"/bilder/gross/{100000 + i}.jpg", data) for i, data in enumerate(images)]
+
+        print(f"{'processes':>9} {'seconds':>8} {'images/s':>9} {'output MiB':>11}")
+        for processes in args.processes:
+            out_dir = os.path.join(workdir, f"cold-{processes}")
+            start = time.perf_counter()
+            results = ImagePipeline(out_dir, processes=processes).process(urls)
+            elapsed = time.perf_counter() - start
+            assert len(results) == len(urls)
+            assert all(r["width"] <= 1080 and 0.8 <= r["width"] / r["height"] <= 1.91 for r in results.values())
+            output = sum(r["bytes"] for r in results.values()) / 2**20
+            print(f"{processes:>9} {elapsed:>8.2f} {len(urls) / elapsed:>9.1f} {output:>11.1f}")
+
+        before = server.requests
+        start = time.perf_counter()
+        ImagePipeline(out_dir, processes=args.processes[-1]).process(urls)
+        elapsed = time.perf_counter() - start
+        print(f"{'cached':>9} {elapsed:>8.2f} {len(urls) / elapsed:>9.1f}  "
+              f"({server.requests - before} conditional requests)")
+
+
+if __name__ == "__main__":
+    main()
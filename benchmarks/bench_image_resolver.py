@@ -0,0 +1,77 @@
+"""Image URL checks for a weekly batch against a local fake image host.
+
+Compares one ``requests.head`` per URL in sequence with
+image_resolver.ImageResolver (concurrent HEADs on a pooled session), cold
+and with a warm cache. Half of the products only have the normal
+resolution, and one in ten lacks an additional image:
+
+    python -m benchmarks.bench_image_resolver --products 7 --latency 0.1
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+import requests
+
+from image_resolver import ImageResolver, high_res_candidates
+from benchmarks.fakes import FakeImageServer
+
+
+def catalogue(server, products):
+    slots = []
+    for p in range(products):
+        for i in range(5):
+            path = f"/bilder/normal/{100000 + p}_{i}.jpg"
+            if p % 10 == 0 and i == 4:
+                slots.append([server.url + path.replace("/normal/", "/gross/"), server.url + path])
+                continue  # listed in the feed, missing on the shop
+            server.add(path)
+            if p % 2 == 0:
+                server.add(path.replace("/normal/", "/gross/"))
+            slots.append(high_res_candidates(server.url + path))
+    return slots
+
+
+def sequential(slots):
+    resolved = []
+    for candidates in slots:
+        for url in candidates:
+            response = requests.head(url, timeout=10)
+            if response.status_code == 200:
+                resolved.append(url)
+                break
+    return resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.1, help="fake seconds per request")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with FakeImageServer(latency=args.latency) as server, tempfile.TemporaryDirectory() as workdir:
+        slots = catalogue(server, args.products)
+        print(f"{len(slots)} images, {sum(map(len, slots))} candidate URLs")
+
+        start = time.perf_counter()
+        expected = sequential(slots)
+        legacy = time.perf_counter() - start
+        print(f"sequential: {legacy:6.2f}s")
+
+        resolver = ImageResolver(os.path.join(workdir, "image_cache.sqlite3"), max_workers=args.workers)
+        for label in ("concurrent", "cached"):
+            before = server.requests
+            start = time.perf_counter()
+            resolved = resolver.resolve(slots)
+            elapsed = time.perf_counter() - start
+            assert resolved == expected, (resolved, expected)
+            print(f"{label + ':':<11} {elapsed:6.2f}s ({server.requests - before} requests, "
+                  f"{legacy / elapsed:.1f}x)")
+        resolver.close()
+
+
+if __name__ == "__main__":
+    main()
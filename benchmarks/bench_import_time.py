@@ -0,0 +1,98 @@
+"""Startup cost of the entry-point modules, from ``python -X importtime``.
+
+For each module a fresh interpreter imports it and the cumulative import
+time and its heaviest direct dependencies are reported, together with the
+wall time of the whole process:
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time master_scheduler --runs 10 --budget-ms 1000
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["settings", "master_scheduler", "posting_worker", "run_weekly", "fetch_product_list",
+           "llm.generate_caption", "rezept_automation"]
+
+
+def parse_importtime(stderr):
+    """``[(depth, name, self_us, cumulative_us)]`` from ``-X importtime`` output, in report order."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        entries.append((depth, stripped, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def direct_dependencies(entries, module):
+    """Depth-1 imports made while importing ``module`` (they are reported just before it)."""
+    end = next(i for i, (depth, name, _, _) in enumerate(entries) if depth == 0 and name == module)
+    start = end
+    while start > 0 and entries[start - 1][0] > 0:
+        start -= 1
+    return [(name, cumulative) for depth, name, _, cumulative in entries[start:end] if depth == 1]
+
+
+def measure(module, runs):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, env=env, cwd=REPO_ROOT)
+        walls.append(time.perf_counter() - start)
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1]}
+    entries = parse_importtime(out.stderr)
+    cumulative = next(c for depth, name, _, c in entries if depth == 0 and name == module)
+    heaviest = sorted(direct_dependencies(entries, module), key=lambda item: -item[1])[:3]
+    return {"wall": statistics.median(walls), "import": cumulative / 1e6, "heaviest": heaviest}
+
+
+def _timed(cmd):
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="interpreter starts per module (median wall time)")
+    parser.add_argument("--budget-ms", type=float, help="exit non-zero if a module's wall time exceeds this")
+    args = parser.parse_args()
+
+    baseline = statistics.median(
+        _timed([sys.executable, "-c", "pass"]) for _ in range(args.runs)
+    )
+    print(f"{'interpreter':<22} {baseline * 1000:>8.0f}ms wall")
+
+    over_budget = []
+    for module in args.modules:
+        result = measure(module, args.runs)
+        if "error" in result:
+            print(f"{module:<22} failed: {result['error']}")
+            over_budget.append(module)
+            continue
+        heaviest = ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in result["heaviest"])
+        print(f"{module:<22} {result['wall'] * 1000:>8.0f}ms wall {result['import'] * 1000:>8.0f}ms import"
+              f"   {heaviest}")
+        if args.budget_ms and result["wall"] * 1000 > args.budget_ms:
+            over_budget.append(module)
+
+    if args.budget_ms and over_budget:
+        print(f"over budget ({args.budget_ms:.0f}ms): {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Per-call latency, time to first token and tokens/s of llm.ollama_client against the fake server.
+
+Compares a pooled keep-alive client against opening a fresh connection per call:
+
+    python -m benchmarks.bench_ollama_client --calls 20
+"""
+
+import time
+import argparse
+import statistics
+
+from llm.ollama_client import OllamaClient
+from benchmarks.fakes import FakeOllamaServer
+
+
+def run(server_url, calls, pooled):
+    client = OllamaClient(server_url)
+    results = []
+    start = time.perf_counter()
+    for i in range(calls):
+        if not pooled:
+            client.close()
+            client = OllamaClient(server_url)
+        results.append(client.chat(f"Caption {i}", model="stub"))
+    client.close()
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    with FakeOllamaServer(latency=args.latency, token_delay=args.token_delay) as server:
+        for pooled in (False, True):
+            total, results = run(server.url, args.calls, pooled)
+            label = "pooled" if pooled else "per-call"
+            print(f"{label:>8}: {total:.2f}s total, "
+                  f"latency p50 {statistics.median(r.latency for r in results) * 1000:.1f}ms, "
+                  f"ttft p50 {statistics.median(r.time_to_first_token for r in results) * 1000:.1f}ms, "
+                  f"{statistics.mean(r.tokens_per_second for r in results):.0f} tok/s")
+        assert all(r.text == server.reply for r in results), "streamed reply does not match"
+
+
+if __name__ == "__main__":
+    main()
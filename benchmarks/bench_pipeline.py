@@ -0,0 +1,296 @@
+"""End-to-end pipeline benchmark against local stand-ins for WebSale, Ollama, the Graph API and the shop images.
+
+Generates a synthetic catalogue, then runs the feed download
+(fetch_product_data), the weekly preparation (prepare_multiple_products and
+the approvals export), master_scheduler.main for a few posts and the recipe
+flows in a scratch directory, and reports throughput and per-stage latency.
+With a stored baseline, any step or stage that got slower than the tolerance
+fails the run (exit code 1):
+
+    python -m benchmarks.bench_pipeline --products 2000 --update-baseline
+    python -m benchmarks.bench_pipeline --products 2000 --failure-rate 0.05 --seed 7
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from urllib.parse import urlsplit
+
+import metrics
+from benchmarks.fakes import FakeWebSaleServer, FakeOllamaServer, FakeGraphServer, FakeImageServer
+from benchmarks.catalogue import write_feed, add_product_images, write_recipe_exports
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "pipeline.json")
+RUNS_LOG = "data/metrics/bench.jsonl"
+APPROVALS_XLSX = "approvals.xlsx"
+# Parameters that change the workload; a baseline only applies to the same ones
+WORKLOAD = ["products", "prepare", "posts", "pack_size", "feed_latency", "ollama_latency", "token_delay",
+            "graph_latency", "processing_time", "image_latency", "failure_rate", "seed"]
+
+
+def caption_reply(prompt):
+    # Packed requests list one JSON object per product and expect JSON back
+    packed = [json.loads(line) for line in prompt.splitlines() if line.startswith('{"id"')]
+    if packed:
+        return json.dumps({"captions": [{"id": p["id"], "caption": f"{p['titel']} für jeden Tag! #hagengrote"}
+                                        for p in packed]}, ensure_ascii=False)
+    # Recipe captions must mention the recipe code to pass validation
+    code = re.search(r"Code: (R\d+)", prompt)
+    if code:
+        return (f"<think>ok</think>🍽️ Rezept der Woche 🥗\n\nZutaten:\n500 g Karotten 🥕\n\n"
+                f"👉 www.hagengrote.de ➡️ Code: {code.group(1)}\n\n#rezeptderwoche #hagengrote")
+    # Distinct per product, or the caption gate rejects them as near-duplicates
+    title = re.search(r"Produkt: (.*)", prompt)
+    return f"<think>ok</think>{title.group(1) if title else 'Ein schönes Produkt'} für jeden Tag! #hagengrote #küche"
+
+
+def write_secrets(feed, ollama, graph, images, erp_dir, pack_size):
+    os.makedirs("config", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    with open(os.path.join(REPO_ROOT, "config", "seasonal_rules.json"), "rb") as src, \
+            open(os.path.join("config", "seasonal_rules.json"), "wb") as dst:
+        dst.write(src.read())
+    with open(os.path.join("config", "secrets.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "websale-url": feed.feed_url,
+            "ollama_host": ollama.url,
+            "prompt": "Schreibe eine kurze Instagram-Bildunterschrift für dieses Produkt.\n\n"
+                      "Produkt: {titel}\nBeschreibung: {description}",
+            "caption_pack_size": pack_size,
+            "graph_api_url": graph.url,
+            "access_token": "fake-token",
+            "ig_user_id": "1784000000",
+            "sharepoint": APPROVALS_XLSX,
+            "erp_csv_dir": erp_dir,
+            "recipe_image_base_url": images.url + "/rezepte",
+        }, f)
+
+
+def approve_all(path):
+    """Tick ``approved`` for every row of the approvals workbook, as the reviewer would."""
+    from openpyxl import load_workbook
+
+    from approvals import APPROVALS_SHEET
+
+    workbook = load_workbook(path)
+    worksheet = workbook[APPROVALS_SHEET]
+    header = [cell.value for cell in worksheet[1]]
+    column = header.index("approved") + 1
+    for r in range(2, worksheet.max_row + 1):
+        worksheet.cell(r, column, "TRUE")
+    workbook.save(path)
+
+
+def run_fetch(run):
+    from fetch_product_list import fetch_product_data
+
+    return fetch_product_data()
+
+
+def run_prepare(args):
+    def prepare(run):
+        from run_weekly import prepare_multiple_products
+
+        writer = prepare_multiple_products(limit=args.prepare)
+        with metrics.timer("export_approvals"):
+            writer.export_excel(APPROVALS_XLSX)
+        approve_all(APPROVALS_XLSX)
+        return len(writer)
+    return prepare
+
+
+def run_publish(args, graph):
+    def publish(run):
+        import master_scheduler
+        from post_history import get_history
+
+        for _ in range(args.posts):
+            master_scheduler.main()
+
+        # Publishing a post that every target already has must not call the Graph API
+        published = sorted(get_history().ids(status="published"))
+        if published:
+            requests = graph.requests
+            assert master_scheduler.upload_and_publish(published[0]) == {}
+            assert graph.requests == requests, f"republishing {published[0]} called the Graph API"
+        return run.counters.get("posts.published", 0)
+    return publish
+
+
+def run_recipes(images, erp_dir):
+    def recipes(run):
+        import rezept_automation
+        from post_history import get_history, RECIPE
+
+        names = write_recipe_exports(erp_dir, rezept_automation.REZEPT_IDS)
+        for nummer, name in names.items():
+            images.images[urlsplit(rezept_automation.recipe_image_candidates(name, nummer)[0]).path] = 300_000
+
+        # The plain functions behind the Prefect flows, without a Prefect engine
+        getattr(rezept_automation.pregenerate_recipe_flow, "fn", rezept_automation.pregenerate_recipe_flow)()
+        post = getattr(rezept_automation.post_recipe_flow, "fn", rezept_automation.post_recipe_flow)
+        for _ in rezept_automation.REZEPT_IDS:
+            post()
+        return len(get_history().ids(kind=RECIPE))
+    return recipes
+
+
+def measure(name, fn):
+    start = time.perf_counter()
+    with metrics.run(f"bench_{name}", log_path=RUNS_LOG) as run:
+        items = fn(run)
+    seconds = time.perf_counter() - start
+    return {
+        "items": items,
+        "seconds": round(seconds, 4),
+        "per_second": round(items / seconds, 3) if seconds else 0.0,
+        "stages": {
+            stage: {
+                "calls": entry["count"],
+                "p50": round(metrics.percentile(entry["samples"], 0.5), 4),
+                "p95": round(metrics.percentile(entry["samples"], 0.95), 4),
+            }
+            for stage, entry in sorted(run.stages.items()) if entry["samples"]
+        },
+        "counters": dict(sorted(run.counters.items())),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Regressions of ``results`` against ``baseline``, as readable lines."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline["steps"].get(name)
+        if not base:
+            continue
+        if result["items"] < base["items"]:
+            regressions.append(f"{name}: {result['items']} items, baseline {base['items']}")
+        checks = [("wall time", result["seconds"], base["seconds"])]
+        checks += [(f"{stage} p95", stage_result["p95"], base["stages"][stage]["p95"])
+                   for stage, stage_result in result["stages"].items() if stage in base["stages"]]
+        for label, value, reference in checks:
+            if value > reference * (1 + tolerance) and value - reference > min_delta:
+                regressions.append(f"{name} {label}: {value:.3f}s, baseline {reference:.3f}s "
+                                   f"(+{(value / reference - 1) * 100 if reference else float('inf'):.0f}%)")
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{'step':<10} {'items':>7} {'seconds':>9} {'items/s':>9}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['items']:>7} {result['seconds']:>9.2f} {result['per_second']:>9.2f}")
+    print(f"\n{'step':<10} {'stage':<20} {'calls':>6} {'p50 s':>8} {'p95 s':>8}")
+    for name, result in results.items():
+        for stage, s in result["stages"].items():
+            print(f"{name:<10} {stage:<20} {s['calls']:>6} {s['p50']:>8.3f} {s['p95']:>8.3f}")
+    print(f"\n{'step':<10} {'counter':<20} {'value':>10}")
+    for name, result in results.items():
+        for counter, value in result["counters"].items():
+            print(f"{name:<10} {counter:<20} {value:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000, help="rows in the synthetic feed")
+    parser.add_argument("--prepare", type=int, default=7, help="products prepared by the weekly step")
+    parser.add_argument("--posts", type=int, default=3, help="master_scheduler runs")
+    parser.add_argument("--pack-size", type=int, default=1, help="short products captioned per Ollama request")
+    parser.add_argument("--feed-latency", type=float, default=0.05)
+    parser.add_argument("--ollama-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--graph-latency", type=float, default=0.05)
+    parser.add_argument("--processing-time", type=float, default=1.5, help="fake container processing seconds")
+    parser.add_argument("--image-latency", type=float, default=0.01)
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="share of failed Ollama, Graph and image requests")
+    parser.add_argument("--seed", type=int, default=0, help="seeds the catalogue and each server's failures")
+    parser.add_argument("--steps", nargs="+", default=["fetch", "prepare", "publish", "recipes"],
+                        choices=["fetch", "prepare", "publish", "recipes"])
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns below this many seconds")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    sys.path.insert(0, REPO_ROOT)
+    results = {}
+    # One independent failure sequence per server, all reproducible from --seed
+    seeds = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeOllamaServer(latency=args.ollama_latency, token_delay=args.token_delay, reply=caption_reply,
+                             failure_rate=args.failure_rate, seed=seeds.getrandbits(32)) as ollama, \
+            FakeGraphServer(latency=args.graph_latency, processing_time=args.processing_time,
+                            failure_rate=args.failure_rate, seed=seeds.getrandbits(32)) as graph, \
+            FakeImageServer(latency=args.image_latency, failure_rate=args.failure_rate,
+                            seed=seeds.getrandbits(32)) as images, \
+            FakeWebSaleServer(os.path.join(workdir, "feed.tsv"), latency=args.feed_latency,
+                              seed=seeds.getrandbits(32)) as feed:
+        write_feed(feed.feed_path, args.products, image_base=images.url, seed=args.seed)
+        add_product_images(images, args.products, seed=args.seed)
+        erp_dir = os.path.join(workdir, "erp")
+
+        os.chdir(workdir)  # config/, data/ and output/ are relative to the working directory
+        try:
+            write_secrets(feed, ollama, graph, images, erp_dir, args.pack_size)
+            steps = {
+                "fetch": run_fetch,
+                "prepare": run_prepare(args),
+                "publish": run_publish(args, graph),
+                "recipes": run_recipes(images, erp_dir),
+            }
+            for name in args.steps:
+                print(f"▶️ {name}")
+                results[name] = measure(name, steps[name])
+        finally:
+            os.chdir(cwd)
+        requests = {"websale": feed.requests, "ollama": ollama.requests, "graph": graph.requests,
+                    "images": images.requests}
+        failures = {"ollama": ollama.failures, "graph": graph.failures, "images": images.failures}
+
+    print_results(results)
+    print(f"\nrequests: {requests}, injected failures: {failures}")
+    if args.failure_rate > 0 and not sum(failures.values()):
+        print(f"❌ --failure-rate {args.failure_rate} injected no failures in {sum(requests.values())} requests; "
+              f"use more products or posts, or another --seed.")
+        sys.exit(1)
+
+    workload = {key: getattr(args, key) for key in WORKLOAD}
+    report = {"workload": workload, "steps": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️ No baseline at {args.baseline}; store one with --update-baseline.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("workload") != workload:
+        print(f"⚠️ Baseline was recorded with {baseline.get('workload')}; not comparing.")
+        return
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print("\n❌ Regressions against the baseline:")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ No regressions against the baseline (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
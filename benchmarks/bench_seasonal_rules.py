@@ -0,0 +1,78 @@
+"""Seasonal keyword matching cost per 100k products.
+
+Compares the legacy per-row ``any(keyword in text)`` loop against the
+compiled rule matcher applied in bulk:
+
+    python -m benchmarks.bench_seasonal_rules --products 100000
+"""
+
+import time
+import random
+import argparse
+import datetime
+
+import pandas as pd
+
+from seasonal_rules import SeasonalRules
+
+WORDS = ["Topf", "Pfanne", "Messer", "Küche", "Edelstahl", "Schüssel", "Deko", "Geschenk", "Kerze",
+         "Brett", "Glas", "Tasse", "Löffel", "Backform", "Gewürz", "Öl", "Essig", "Tee", "Kaffee", "Mühle"]
+SEASONAL = ["Weihnachten", "Advent", "Ostern", "Osterhase", "Frühling", "Fruehling", "Xmas"]
+
+
+def synthetic_products(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        words = rng.choices(WORDS, k=40)
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), rng.choice(SEASONAL))
+        rows.append({"titel": " ".join(words[:4]), "description": " ".join(words[4:]), "category": "Haushalt"})
+    return pd.DataFrame(rows)
+
+
+def legacy(products, month):
+    # The former run_weekly.is_seasonally_relevant, row by row
+    def relevant(row):
+        category = row.get("category", "").lower()
+        title = row.get("titel", "").lower()
+        description = row.get("description", "").lower()
+        if month == 12:
+            return any(k in (title + description + category) for k in ["weihnachten", "xmas", "christmas", "advent"])
+        if month in [3, 4]:
+            return any(k in (title + description + category) for k in ["ostern", "hase", "frühling", "oster"])
+        return not any(k in (title + description + category)
+                       for k in ["weihnachten", "xmas", "christmas", "advent", "ostern", "hase"])
+
+    return [relevant(row) for row in products.to_dict(orient="records")]
+
+
+def compiled(products, today):
+    matcher = SeasonalRules.load().matcher(today)
+    text = products["titel"] + " " + products["description"] + " " + products["category"]
+    return matcher.mask(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    args = parser.parse_args()
+
+    products = synthetic_products(args.products)
+    scale = 100000 / args.products
+    print(f"{'season':>10} {'legacy ms/100k':>15} {'compiled ms/100k':>17} {'matches':>8}")
+    for today in (datetime.date(2024, 12, 10), datetime.date(2024, 4, 1), datetime.date(2024, 7, 1)):
+        start = time.perf_counter()
+        legacy(products, today.month)
+        legacy_ms = (time.perf_counter() - start) * 1000 * scale
+
+        start = time.perf_counter()
+        mask = compiled(products, today)
+        compiled_ms = (time.perf_counter() - start) * 1000 * scale
+
+        name = SeasonalRules.load().rule_for(today).get("name", "")
+        print(f"{name:>10} {legacy_ms:>15.0f} {compiled_ms:>17.0f} {int(mask.sum()):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Synthetic shop catalogue for the offline benchmarks: WebSale feed, product images and ERP recipe exports."""
+
+import os
+import csv
+import random
+
+EXTRA_COLUMNS = 40  # unused feed columns, as in the real export
+SEASONAL_WORDS = ["Weihnachten", "Advent", "Ostern", "Frühling"]
+INGREDIENTS = ["Karotten", "Zwiebeln", "Knoblauch", "Butter", "Zitrone", "Eier", "Mehl", "Sahne", "Petersilie",
+               "Kartoffeln", "Lauch", "Paprika"]
+
+
+def product_id(n):
+    return f"{100000 + n}"
+
+
+def write_feed(path, rows, image_base="https://shop.example", extra_columns=EXTRA_COLUMNS, seed=0):
+    """WebSale TSV export with ``rows`` products; about a tenth are seasonal, some out of stock."""
+    rng = random.Random(seed)
+    header = ["id", "titel", "description", "image_link", "Bestand", "category"]
+    header += [f"Zusatzbild_{i}" for i in range(1, 5)]
+    header += [f"attr_{i}" for i in range(extra_columns)]
+    with open(path, "w", newline="", encoding="latin-1") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(header)
+        for n in range(rows):
+            season = f" {rng.choice(SEASONAL_WORDS)}" if rng.random() < 0.1 else ""
+            # Shop HTML; about one in ten descriptions is very long
+            words = rng.randint(300, 600) if rng.random() < 0.1 else rng.randint(5, 40)
+            description = f"<p>{'Beschreibung ' * words}</p><ul><li>spülmaschinenfest</li><li>Maße:&nbsp;20 cm</li></ul>"
+            writer.writerow(
+                [product_id(n), f"Produkt {n} Küche{season}", description,
+                 f"{image_base}/bilder/normal/{product_id(n)}.jpg", rng.randint(0, 200), "Haushalt"]
+                + [f"{product_id(n)}_{i}.jpg" if rng.random() < 0.5 else "" for i in range(1, 5)]
+                + [f"wert {rng.random():.6f}" for _ in range(extra_columns)]
+            )
+    return path
+
+
+def add_product_images(server, rows, high_res_share=0.8, seed=0):
+    """Register the feed's images on a ``FakeImageServer``; only some have a ``/gross/`` version."""
+    rng = random.Random(seed)
+    for n in range(rows):
+        for name in [product_id(n)] + [f"{product_id(n)}_{i}" for i in range(1, 5)]:
+            server.images[f"/bilder/normal/{name}.jpg"] = 200_000
+            if rng.random() < high_res_share:
+                server.images[f"/bilder/gross/{name}.jpg"] = 800_000
+
+
+def write_recipe_exports(directory, recipe_ids, seed=0):
+    """``V2AR1001.csv`` and ``V4AR1005.csv`` ERP exports with one web recipe per id; returns the names."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    names = {}
+    with open(os.path.join(directory, "V2AR1001.csv"), "w", newline="", encoding="cp850") as mar, \
+            open(os.path.join(directory, "V4AR1005.csv"), "w", newline="", encoding="cp850") as text:
+        mar_writer = csv.writer(mar, delimiter=";")
+        text_writer = csv.writer(text, delimiter=";")
+        mar_writer.writerow(["NUMMER", "TEXT_KZ", "BEZEICHNUNG"])
+        text_writer.writerow(["TEXTNR", "STICHWORT", "INTERNET", "BANAME"])
+        for rid in recipe_ids:
+            nummer, textnr = f"R{rid}", f"T{rid}"
+            names[nummer] = f"Gemüsepfanne mit {rng.choice(INGREDIENTS)} {rid}"
+            ingredients = "<br>".join(f"{rng.randint(1, 500)} g {item}"
+                                      for item in rng.sample(INGREDIENTS, rng.randint(4, 12)))
+            mar_writer.writerow([nummer, textnr, names[nummer]])
+            text_writer.writerow([textnr, "rezept", f"<p>{ingredients}</p>", names[nummer]])
+        # Non-recipe articles and French texts the index must skip
+        mar_writer.writerow(["100001", "T1", "Pfanne"])
+        text_writer.writerow(["T1", "fr_rezept", "<p>Recette</p>", "Poêle"])
+    return names
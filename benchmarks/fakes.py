@@ -0,0 +1,399 @@
+"""Local stand-ins for the external services, for offline benchmarks and dry runs."""
+
+import os
+import json
+import time
+import zlib
+import random
+import shutil
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeServer:
+    """Runs a ``ThreadingHTTPServer`` on a free localhost port in a background thread.
+
+    A share ``failure_rate`` of the requests is answered with a server
+    error, drawn from a generator seeded with ``seed``. Without a seed each
+    kind of fake gets its own, derived from its class name, so servers
+    running side by side do not fail in lockstep.
+    """
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, failure_rate=0.0, seed=None):
+        handler = type("Handler", (self.handler_class,), {"fake": self})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.requests = 0
+        self.failures = 0
+        self.failure_rate = failure_rate
+        self._random = random.Random(zlib.crc32(type(self).__name__.encode()) if seed is None else seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def should_fail(self):
+        with self._lock:
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.failures += 1
+                return True
+            return False
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OllamaHandler(_JSONHandler):
+    def do_POST(self):
+        self.fake.count_request()
+        payload = self.read_json()
+        self.fake.payloads.append(payload)
+        if self.path == "/api/chat":
+            field = "message"
+        elif self.path == "/api/generate":
+            field = "response"
+        else:
+            self.send_json({"error": "not found"}, status=404)
+            return
+
+        time.sleep(self.fake.latency)
+        if self.fake.should_fail():
+            self.send_json({"error": "model runner has unexpectedly stopped"}, status=500)
+            return
+        if field == "response" and "prompt" not in payload:
+            # Preload request: load the model, generate nothing
+            self.send_json({"model": payload.get("model"), "response": "", "done": True})
+            return
+
+        messages = payload.get("messages") or [{}]
+        tokens = self.fake.tokens(payload.get("prompt") or messages[-1].get("content", ""))
+        stats = {
+            "done": True,
+            "prompt_eval_count": len(str(payload.get("prompt") or payload.get("messages", ""))) // 4,
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) * self.fake.token_delay * 1e9),
+        }
+        if not payload.get("stream", True):
+            self.send_json({"model": payload.get("model"), **self._piece(field, "".join(tokens)), **stats})
+            return
+
+        # Streamed NDJSON, one chunk per token, like the real server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(self.fake.token_delay)
+            self._write_chunk({"model": payload.get("model"), **self._piece(field, token), "done": False})
+        self._write_chunk({"model": payload.get("model"), **self._piece(field, ""), **stats})
+        self.wfile.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _piece(field, text):
+        if field == "message":
+            return {"message": {"role": "assistant", "content": text}}
+        return {"response": text}
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(FakeServer):
+    """Answers ``/api/chat`` and ``/api/generate`` like a local Ollama server.
+
+    ``latency`` is the delay before the first token (prompt evaluation),
+    ``token_delay`` the delay between streamed tokens. ``reply`` is the
+    generated text, or a function of the prompt returning it. Request
+    bodies are kept in ``payloads``.
+    """
+
+    handler_class = _OllamaHandler
+
+    def __init__(self, latency=0.2, token_delay=0.0, reply="<think>ok</think>Ein schönes Produkt! #hagengrote",
+                 failure_rate=0.0, seed=None):
+        super().__init__(failure_rate, seed)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply = reply
+        self.payloads = []
+
+    def tokens(self, prompt=""):
+        reply = self.reply(prompt) if callable(self.reply) else self.reply
+        words = reply.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+
+class _GraphHandler(_JSONHandler):
+    def send_json(self, payload, status=200, headers=None):
+        usage = json.dumps({"call_count": self.fake.app_usage(), "total_time": 0, "total_cputime": 0})
+        super().send_json(payload, status, {"X-App-Usage": usage, **(headers or {})})
+
+    def _params(self):
+        from urllib.parse import urlsplit, parse_qs
+
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        return parts.path.strip("/").split("/"), params
+
+    def _failed(self):
+        if not self.fake.should_fail():
+            return False
+        self.send_json({"error": {"message": "An unexpected error has occurred.", "code": 2}}, status=500)
+        return True
+
+    def do_GET(self):
+        self.fake.count_request()
+        time.sleep(self.fake.latency)
+        if self._failed():
+            return
+        path, params = self._params()
+        ids = params["ids"].split(",") if "ids" in params else [path[-1]] if path[-1] else []
+        statuses = {media_id: {"id": media_id, "status_code": self.fake.status(media_id)} for media_id in ids}
+        if "ids" in params:
+            self.send_json(statuses)
+        elif ids and statuses[ids[0]]["status_code"]:
+            self.send_json(statuses[ids[0]])
+        else:
+            self.send_json({"error": {"message": "Unknown object", "code": 100}}, status=400)
+
+    def do_POST(self):
+        self.fake.count_request()
+        self.read_json()
+        time.sleep(self.fake.latency)
+        if self._failed():
+            return
+        path, params = self._params()
+        if len(path) == 2 and path[1] == "media":
+            self.send_json({"id": self.fake.create(path[0], params)})
+        elif len(path) == 2 and path[1] == "media_publish":
+            media_id = params.get("creation_id")
+            if self.fake.status(media_id) != "FINISHED":
+                self.send_json({"error": {"message": "Media not ready", "code": 9007}}, status=400)
+            else:
+                self.send_json({"id": self.fake.publish(path[0], media_id)})
+        elif len(path) == 2 and path[1] in ("photos", "feed"):
+            # Facebook Page posts are published synchronously
+            media_id = self.fake.create(path[0], params)
+            if params.get("published") == "false":
+                self.send_json({"id": media_id})
+            else:
+                self.send_json({"id": self.fake.publish(path[0], media_id)})
+        else:
+            self.send_json({"error": {"message": "Unsupported request", "code": 100}}, status=400)
+
+
+class FakeGraphServer(FakeServer):
+    """Graph API stand-in for ``/{ig-user}/media``, ``/media_publish``, status polling and Page ``/photos``/``/feed``.
+
+    Containers report ``IN_PROGRESS`` until ``processing_time`` seconds after
+    creation, then ``FINISHED``. Every request takes ``latency`` seconds and
+    adds ``usage_per_call`` percent to the reported ``X-App-Usage`` call count.
+    Failed requests get the transient Graph error (code 2). Containers of
+    the users in ``error_users`` end in ``ERROR`` instead of ``FINISHED``.
+    """
+
+    handler_class = _GraphHandler
+
+    def __init__(self, latency=0.05, processing_time=1.5, usage_per_call=0.0, failure_rate=0.0, seed=None,
+                 error_users=()):
+        super().__init__(failure_rate, seed)
+        self.latency = latency
+        self.processing_time = processing_time
+        self.usage_per_call = usage_per_call
+        self.error_users = set(error_users)
+        self.containers = {}
+        self.published = []
+        self._next_id = 17800000000000000
+
+    def create(self, user_id, params):
+        with self._lock:
+            self._next_id += 1
+            media_id = str(self._next_id)
+            self.containers[media_id] = {"user": user_id, "params": params, "created": time.monotonic()}
+        return media_id
+
+    def status(self, media_id):
+        container = self.containers.get(media_id)
+        if container is None:
+            return None
+        if time.monotonic() - container["created"] >= self.processing_time:
+            return "ERROR" if container["user"] in self.error_users else "FINISHED"
+        return "IN_PROGRESS"
+
+    def app_usage(self):
+        return min(100, int(self.requests * self.usage_per_call))
+
+    def publish(self, user_id, media_id):
+        with self._lock:
+            self.published.append((user_id, media_id))
+            self._next_id += 1
+            return str(self._next_id)
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, body):
+        self.fake.count_request()
+        self.fake.methods.append((self.command, self.path))
+        time.sleep(self.fake.latency)
+        image = self.fake.images.get(self.path.split("?", 1)[0])
+        if not body and self.fake.head_status:
+            self.send_response(self.fake.head_status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.fake.should_fail():
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if image is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = image if isinstance(image, bytes) else b"\xff" * image
+        etag = f'"{zlib.crc32(data):x}-{len(data)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+
+class FakeImageServer(FakeServer):
+    """Shop image host: serves the paths in ``images`` as JPEGs, 404 otherwise.
+
+    Values are the image bytes, or a byte size for placeholder content.
+    Conditional requests with a matching ``If-None-Match`` get a 304.
+    With ``head_status`` set, every HEAD request is answered with that
+    status instead (e.g. 405 for a host that only serves GET). Requests
+    are kept in ``methods`` as ``(method, path)``.
+    """
+
+    handler_class = _ImageHandler
+
+    def __init__(self, images=None, latency=0.05, failure_rate=0.0, seed=None, head_status=None):
+        super().__init__(failure_rate, seed)
+        self.images = dict(images or {})
+        self.latency = latency
+        self.head_status = head_status
+        self.methods = []
+
+    def add(self, path, image=200_000):
+        self.images[path] = image
+        return self.url + path
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _empty(self, status, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self.fake.count_request()
+        time.sleep(self.fake.latency)
+        if self.fake.should_fail():
+            self._empty(503)
+            return
+        if self.path.split("?", 1)[0] != self.fake.path:
+            self._empty(404)
+            return
+        if self.headers.get("If-None-Match") == self.fake.etag:
+            self._empty(304, self.fake.etag)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/tab-separated-values; charset=latin-1")
+        self.send_header("Content-Length", str(os.path.getsize(self.fake.feed_path)))
+        self.send_header("ETag", self.fake.etag)
+        self.end_headers()
+        with open(self.fake.feed_path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, 1 << 16)
+
+
+class FakeWebSaleServer(FakeServer):
+    """WebSale product export: serves the TSV file ``feed_path`` at ``url + path``.
+
+    The ETag follows the file's mtime and size, so an unchanged feed
+    answers conditional requests with a 304.
+    """
+
+    handler_class = _FeedHandler
+
+    def __init__(self, feed_path, path="/export/produkte.tsv", latency=0.05, failure_rate=0.0, seed=None):
+        super().__init__(failure_rate, seed)
+        self.feed_path = feed_path
+        self.path = path
+        self.latency = latency
+
+    @property
+    def feed_url(self):
+        return self.url + self.path
+
+    @property
+    def etag(self):
+        stat = os.stat(self.feed_path)
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
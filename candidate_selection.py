@@ -0,0 +1,74 @@
+import time
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from seasonal_rules import get_matcher
+
+MIN_STOCK = 10
+EXCLUDED_ID_PATTERN = r'^\d+H[A-Z]\d+'
+
+
+def seasonal_mask(products, today=None):
+    """Vectorized seasonal filter over title, description and category.
+
+    The active rule from ``config/seasonal_rules.json`` decides which
+    keywords a product must or must not mention.
+    """
+    text = products["titel"].fillna("")
+    for column in ("description", "category"):
+        if column in products.columns:
+            text = text + " " + products[column].fillna("")
+    return get_matcher(today or datetime.date.today()).mask(text)
+
+
+def _parse_stock(column):
+    try:
+        return column.replace("", np.nan).astype("float64")
+    except (TypeError, ValueError):
+        # Malformed values only exist in a few rows; coerce them to NaN
+        return pd.to_numeric(column, errors="coerce")
+
+
+def weighted_order(weights, rng):
+    """Random permutation where higher weights tend to come first (Efraimidis-Spirakis keys)."""
+    weights = np.asarray(weights, dtype="float64")
+    keys = rng.random(len(weights)) ** (1.0 / np.maximum(weights, 1e-9))
+    return np.argsort(-keys, kind="stable")
+
+
+def select_candidates(products, posted_ids=(), limit=None, today=None, seed=None, min_stock=MIN_STOCK):
+    """Filter the product table to eligible products and return them in weighted random order.
+
+    Products are eligible if they have an id, are not a ``…H…`` variant id,
+    have no post history entry, have at least ``min_stock`` in stock and are
+    seasonally relevant. Products with more stock are more likely to come
+    first. Returns ``(candidates, timings)`` where ``timings`` maps each
+    filter to its duration in seconds.
+    """
+    timings = {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[name] = time.perf_counter() - start
+        return result
+
+    ids = products["id"].fillna("").astype(str)
+    mask = timed("id", lambda: (ids != "") & ~ids.duplicated() & ~ids.str.match(EXCLUDED_ID_PATTERN))
+    # Plain object strings: isin() against a Python set is much faster on them
+    mask &= timed("posted", lambda: ~ids.astype(object).isin(set(posted_ids)))
+    stock = timed("stock", lambda: _parse_stock(products["Bestand"]))
+    mask &= (stock >= min_stock).fillna(False)
+    # Text matching is the most expensive filter, so it only sees the remaining rows
+    mask[mask] = timed("season", lambda: seasonal_mask(products[mask], today))
+
+    eligible = products[mask]
+    rng = np.random.default_rng(seed)
+    order = timed("sample", lambda: weighted_order(np.log1p(stock[mask].to_numpy()), rng))
+    candidates = eligible.iloc[order]
+    if limit is not None:
+        candidates = candidates.head(limit)
+    timings["total"] = sum(timings.values())
+    return candidates, timings
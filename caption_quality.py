@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import random
+import struct
+import hashlib
+
+from post_history import PRODUCT
+from sqlite_store import open_db, shared
+
+CAPTION_HISTORY_DB = "data/caption_history.sqlite3"
+MAX_LENGTH = 2200  # Instagram caption limit
+MAX_HASHTAGS = 30  # Instagram rejects posts with more
+DUPLICATE_THRESHOLD = 0.8  # estimated Jaccard similarity of word 3-shingles
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+BANDS = 16  # LSH bands of NUM_PERM // BANDS rows; pairs at 0.8 similarity share a band with p > 0.999
+
+_THINK = re.compile(r"</?think\b", re.IGNORECASE)
+_HTML = re.compile(r"</?[a-zA-Z][a-zA-Z0-9]*(?:\s[^<>]*)?/?>")
+_HASHTAG = re.compile(r"(?<![\w#])#\w+")
+_PLACEHOLDER = re.compile(r"\{(?:titel|description|product_id)\}")
+_WORD = re.compile(r"\w+")
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)  # fixed: signatures are stored and compared across runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_ROWS = NUM_PERM // BANDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captions (
+    kind TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    caption TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (kind, post_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bands (
+    kind TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    PRIMARY KEY (kind, band, bucket, post_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bands_post ON bands (kind, post_id);
+"""
+
+
+def rule_problems(caption, required=(), max_length=MAX_LENGTH, max_hashtags=MAX_HASHTAGS):
+    """Reasons ``caption`` must not go to the reviewers, from the compiled rules; empty if it passes."""
+    if not caption or not caption.strip():
+        return ["empty caption"]
+    problems = []
+    if len(caption) > max_length:
+        problems.append(f"caption longer than {max_length} characters ({len(caption)})")
+    if _THINK.search(caption):
+        problems.append("caption contains <think> output")
+    elif _HTML.search(caption):
+        problems.append("caption contains HTML tags")
+    if _PLACEHOLDER.search(caption):
+        problems.append("caption contains an unfilled prompt placeholder")
+    hashtags = len(_HASHTAG.findall(caption))
+    if hashtags > max_hashtags:
+        problems.append(f"caption has {hashtags} hashtags, at most {max_hashtags} allowed")
+    lowered = caption.lower()
+    for text in required:
+        if text and text.lower() not in lowered:
+            problems.append(f"caption does not mention {text}")
+    return problems
+
+
+def shingles(caption):
+    """Stable 64-bit hashes of the caption's word 3-grams (hashtags included, case folded)."""
+    words = _WORD.findall(caption.lower())
+    grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))]
+    return {int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams}
+
+
+def minhash(caption):
+    """MinHash signature (NUM_PERM values) of the caption's shingles."""
+    hashes = shingles(caption)
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def _pack(signature):
+    return struct.pack(f">{NUM_PERM}Q", *signature)
+
+
+def _unpack(blob):
+    return struct.unpack(f">{NUM_PERM}Q", blob)
+
+
+def _buckets(signature):
+    return [(band, hashlib.blake2b(_pack(signature)[band * _ROWS * 8:(band + 1) * _ROWS * 8],
+                                   digest_size=8).hexdigest())
+            for band in range(BANDS)]
+
+
+class CaptionGate:
+    """Quality gate for generated captions before they reach the approvals sheet.
+
+    ``problems`` runs the compiled rule checks and looks for near-duplicates
+    of published captions (MinHash over word shingles with LSH banding, so a
+    check probes an index instead of comparing against every caption) and
+    of captions accepted earlier in this process. Published captions are
+    added with ``remember`` and kept in ``data/caption_history.sqlite3``.
+    """
+
+    def __init__(self, path=CAPTION_HISTORY_DB, threshold=DUPLICATE_THRESHOLD, max_length=MAX_LENGTH,
+                 max_hashtags=MAX_HASHTAGS):
+        self.threshold = threshold
+        self.max_length = max_length
+        self.max_hashtags = max_hashtags
+        self._accepted = {}  # (kind, post_id) -> signature, this run only
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def near_duplicate(self, caption, kind=PRODUCT, exclude=None, signature=None):
+        """``(post_id, similarity)`` of the most similar known caption above the threshold, or None."""
+        signature = signature or minhash(caption)
+        buckets = _buckets(signature)
+        with self._lock:
+            candidates = {}
+            for band, bucket in buckets:
+                for post_id, blob in self._conn.execute(
+                        "SELECT c.post_id, c.signature FROM bands b JOIN captions c "
+                        "ON c.kind = b.kind AND c.post_id = b.post_id "
+                        "WHERE b.kind = ? AND b.band = ? AND b.bucket = ?", (kind, band, bucket)):
+                    candidates[post_id] = _unpack(blob)
+            candidates.update((post_id, sig) for (k, post_id), sig in self._accepted.items() if k == kind)
+        best = None
+        for post_id, other in candidates.items():
+            if post_id == exclude:
+                continue
+            score = similarity(signature, other)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (post_id, score)
+        return best
+
+    def problems(self, caption, required=(), kind=PRODUCT, post_id=None):
+        """Rule violations and near-duplicates of ``caption``; empty if it may go to review."""
+        problems = rule_problems(caption, required, self.max_length, self.max_hashtags)
+        if caption and caption.strip():
+            duplicate = self.near_duplicate(caption, kind, exclude=str(post_id) if post_id else None)
+            if duplicate:
+                problems.append(f"caption is a near-duplicate of {duplicate[0]} ({duplicate[1]:.0%} similar)")
+        return problems
+
+    def accept(self, post_id, caption, kind=PRODUCT):
+        """Treat ``caption`` as taken for the rest of this run, so later captions of the batch differ from it."""
+        with self._lock:
+            self._accepted[(kind, str(post_id))] = minhash(caption)
+
+    def remember(self, post_id, caption, kind=PRODUCT):
+        """Add a published caption to the history later captions are compared against."""
+        self.remember_many([(post_id, caption)], kind=kind)
+
+    def remember_many(self, entries, kind=PRODUCT):
+        """Add several ``(post_id, caption)`` published captions in one transaction."""
+        signed = [(str(post_id), caption, minhash(caption)) for post_id, caption in entries]
+        now = time.time()
+        with self._lock, self._conn:
+            for post_id, caption, signature in signed:
+                self._conn.execute("DELETE FROM bands WHERE kind = ? AND post_id = ?", (kind, post_id))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO captions (kind, post_id, signature, caption, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (kind, post_id, _pack(signature), caption, now),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO bands (kind, band, bucket, post_id) VALUES (?, ?, ?, ?)",
+                    ((kind, band, bucket, post_id) for band, bucket in _buckets(signature)),
+                )
+
+    def count(self, kind=PRODUCT):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM captions WHERE kind = ?", (kind,)).fetchone()[0]
+
+
+@shared
+def get_gate():
+    """Process-wide gate on the default history path."""
+    return CaptionGate()
+
+
+def backfill(output_dir="output"):
+    """Index the captions of already published products and recipes; returns how many were added."""
+    from post_history import get_history, RECIPE
+    from recipe_queue import get_queue
+
+    products = []
+    for product_id in get_history().ids(kind=PRODUCT, status="published"):
+        path = os.path.join(output_dir, product_id, "caption.txt")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                products.append((product_id, f.read().strip()))
+    recipes = list(get_queue().captions().items())
+    get_gate().remember_many(products, kind=PRODUCT)
+    get_gate().remember_many(recipes, kind=RECIPE)
+    return len(products) + len(recipes)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Caption quality gate.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="index the captions of everything published so far")
+    check = sub.add_parser("check", help="check caption files against the rules and the published captions")
+    check.add_argument("files", nargs="+")
+    check.add_argument("--require", action="append", default=[], help="text the caption must contain")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"✅ {backfill()} published captions indexed in {CAPTION_HISTORY_DB}")
+    else:
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                problems = get_gate().problems(f.read().strip(), required=args.require)
+            print(f"{'❌' if problems else '✅'} {path}" + "".join(f"\n   {p}" for p in problems))
@@ -1,39 +1,176 @@
-import pandas as pd
 import requests
+import io
 import os
-import json
+from contextlib import contextmanager
 
+import metrics
+from settings import secrets
 
-# Load secrets
-with open("config/secrets.json", "r") as f:
-    secrets = json.load(f)
-    
-ws_url = secrets['websale-url']    
 encoding = "latin-1"
 
-def fetch_product_data():
-    print("Fetching product data...")
-    
-    # Load the full product CSV
-    product_df = pd.read_csv(
-        ws_url,
+PRODUCT_CSV = "data/product_list.csv"
+PRODUCT_SNAPSHOT = "data/product_list.parquet"
+CHUNK_SIZE = 20000
+
+# Base columns to keep; Zusatzbild_* columns are added if present
+base_columns = ['id', 'titel', 'description', 'image_link', 'Bestand']
+
+
+def wanted_column(column):
+    return column in base_columns or column.startswith("Zusatzbild_")
+
+
+def _binary_stream(response):
+    """Streaming body of a ``requests`` response that pandas reads as binary (so `encoding` applies)."""
+    response.raw.decode_content = True
+    response.raw.auto_close = False  # BufferedReader expects EOF, not a closed stream
+    return io.BufferedReader(response.raw)
+
+
+@contextmanager
+def open_feed(source):
+    """Binary file-like handle on the feed, streamed instead of downloaded in full."""
+    if os.path.exists(source):
+        with open(source, "rb") as f:
+            yield f
+        return
+    with requests.get(source, stream=True, timeout=(10, 300)) as response:
+        response.raise_for_status()
+        yield _binary_stream(response)
+
+
+def read_product_chunks(feed, chunksize=CHUNK_SIZE):
+    """Parse an open binary feed handle into DataFrames of at most ``chunksize`` rows."""
+    import pandas as pd
+
+    reader = pd.read_csv(
+        feed,
         encoding=encoding,
         on_bad_lines='skip',
-        sep='\t'
+        sep='\t',
+        usecols=wanted_column,
+        dtype=str,
+        chunksize=chunksize,
     )
+    for chunk in reader:
+        missing = [col for col in base_columns if col not in chunk.columns]
+        if missing:
+            raise KeyError(f"Product feed is missing columns: {missing}")
+        zusatz_columns = [col for col in chunk.columns if col.startswith("Zusatzbild_")]
+        chunk = chunk[base_columns + zusatz_columns]
+        chunk["Bestand"] = pd.to_numeric(chunk["Bestand"], errors="coerce").astype("float32")
+        yield chunk
+
+
+def iter_product_chunks(source=None, chunksize=CHUNK_SIZE):
+    """Yield the feed as DataFrames of at most ``chunksize`` rows, reading only the needed columns."""
+    with open_feed(source or secrets['websale-url']) as feed:
+        yield from read_product_chunks(feed, chunksize)
 
-    # Base columns to keep
-    base_columns = ['id', 'titel', 'description', 'image_link', 'Bestand']
-    
-    # Check and include Zusatzbild columns if present
-    zusatz_columns = [col for col in product_df.columns if col.startswith("Zusatzbild_")]
-    columns_to_export = base_columns + zusatz_columns
 
-    product_df = product_df[columns_to_export]
+def _parquet_writer(path, chunk):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("⚠️ pyarrow not installed, skipping columnar snapshot.")
+        return None
+    # Explicit types: a Zusatzbild column that is empty in the first chunk would
+    # otherwise be inferred as null and reject the image names of later chunks.
+    schema = pa.schema([(column, pa.float32() if column == "Bestand" else pa.string())
+                        for column in chunk.columns])
+    return pq.ParquetWriter(path, schema, compression="zstd"), pa
 
-    # Save to local CSV
-    product_df.to_csv("data/product_list.csv", index=False, sep=';', encoding=encoding)
-    print("Product list updated with Zusatzbild columns.")
+
+@metrics.timer("fetch")
+def fetch_product_data(source=None, csv_path=PRODUCT_CSV, snapshot_path=None, chunksize=CHUNK_SIZE):
+    print("Fetching product data...")
+
+    # Write chunk by chunk to temporary files and swap them in at the end, so
+    # peak memory is one chunk and readers never see a half-written list.
+    tmp_csv = csv_path + ".tmp"
+    tmp_snapshot = snapshot_path + ".tmp" if snapshot_path else None
+    parquet = None
+    rows = 0
+    done = False
+
+    try:
+        for i, chunk in enumerate(iter_product_chunks(source, chunksize)):
+            chunk.to_csv(tmp_csv, mode="w" if i == 0 else "a", header=(i == 0),
+                         index=False, sep=';', encoding=encoding)
+            if tmp_snapshot:
+                if i == 0:
+                    parquet = _parquet_writer(tmp_snapshot, chunk)
+                if parquet:
+                    writer, pa = parquet
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+            rows += len(chunk)
+        if rows == 0:
+            raise ValueError("Product feed is empty, keeping the previous product list.")
+        done = True
+    finally:
+        if parquet:
+            parquet[0].close()
+        if not done:
+            for path in (tmp_csv, tmp_snapshot):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+    os.replace(tmp_csv, csv_path)
+    if parquet:
+        os.replace(tmp_snapshot, snapshot_path)
+    print(f"Product list updated with Zusatzbild columns ({rows} products).")
+    return rows
+
+@metrics.timer("fetch")
+def sync_product_data(source=None, csv_path=PRODUCT_CSV, chunksize=CHUNK_SIZE):
+    """Incremental sync: skip an unmodified feed, otherwise apply only the changed products.
+
+    Returns the ``Delta`` of the run; ``ProductStore.changed_since(run_id)``
+    answers which products changed after an earlier run.
+    """
+    from product_store import ProductStore
+
+    source = source or secrets['websale-url']
+    store = ProductStore()
+
+    if os.path.exists(source):
+        with open(source, "rb") as feed:
+            delta = store.apply_snapshot(read_product_chunks(feed, chunksize))
+    else:
+        etag, last_modified = store.feed_validators()
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        with requests.get(source, headers=headers, stream=True, timeout=(10, 300)) as response:
+            if response.status_code == 304:
+                delta = store.record_unchanged(etag, last_modified)
+                print(f"Product feed not modified (run {delta.run_id}), nothing to sync.")
+                return delta
+            response.raise_for_status()
+            delta = store.apply_snapshot(
+                read_product_chunks(_binary_stream(response), chunksize),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+
+    if delta or not os.path.exists(csv_path):
+        store.export_csv(csv_path, encoding=encoding)
+    print(f"Product store synced (run {delta.run_id}): {delta.summary()}.")
+    return delta
 
 if __name__ == "__main__":
-    fetch_product_data()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download the WebSale product feed.")
+    parser.add_argument("--snapshot", action="store_true", help=f"also write {PRODUCT_SNAPSHOT}")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only apply added/changed/removed products to the local product store")
+    args = parser.parse_args()
+    if args.incremental:
+        sync_product_data()
+    else:
+        fetch_product_data(snapshot_path=PRODUCT_SNAPSHOT if args.snapshot else None)
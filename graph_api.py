@@ -0,0 +1,232 @@
+import json
+import time
+import random
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://graph.facebook.com/v22.0"
+
+# Graph error codes worth retrying: temporary/unknown errors and rate limits
+TRANSIENT_CODES = {1, 2}
+RATE_LIMIT_CODES = {4, 17, 32, 613, 80001, 80002}
+THROTTLE_THRESHOLD = 75  # % of any usage quota at which calls start slowing down
+MAX_THROTTLE_DELAY = 60
+
+
+class GraphAPIError(Exception):
+    def __init__(self, message, status=None, code=None, payload=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.payload = payload
+
+    @property
+    def rate_limited(self):
+        return self.status == 429 or self.code in RATE_LIMIT_CODES
+
+    @property
+    def transient(self):
+        return self.rate_limited or self.code in TRANSIENT_CODES or (self.status or 0) >= 500
+
+
+def parse_usage(headers):
+    """Highest quota usage in percent and the longest regain-access wait (s) from Graph usage headers."""
+    usage, regain = 0, 0
+    for header in ("X-App-Usage", "X-Business-Use-Case-Usage", "X-Ad-Account-Usage"):
+        raw = headers.get(header)
+        if not raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            continue
+        if header == "X-Business-Use-Case-Usage" and isinstance(data, dict):
+            # {business_id: [{"type": ..., "call_count": ..., ...}, ...]}
+            entries = [entry for values in data.values() for entry in values]
+        else:
+            entries = [data]
+        for entry in entries:
+            for key in ("call_count", "total_time", "total_cputime", "acc_id_util_pct"):
+                value = entry.get(key)
+                if isinstance(value, (int, float)):
+                    usage = max(usage, value)
+            regain = max(regain, (entry.get("estimated_time_to_regain_access") or 0) * 60)
+    return usage, regain
+
+
+class GraphClient:
+    """Pooled Graph API client with timeouts, jittered retries and usage-based throttling.
+
+    Idempotent calls (status reads, container creation) are retried on
+    network errors, 5xx responses and transient Graph errors. Publishing is
+    only retried when Graph explicitly rejected the call for rate limiting,
+    so a timeout can never publish the same post twice.
+    """
+
+    def __init__(self, access_token, base_url=DEFAULT_BASE_URL, timeout=(10, 60), max_retries=4,
+                 backoff=1.0, pool_size=10, throttle_threshold=THROTTLE_THRESHOLD):
+        self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.throttle_threshold = throttle_threshold
+        self.usage = 0
+        self._throttle_until = 0.0
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, path, **params):
+        return self.request("GET", path, params)
+
+    def post(self, path, idempotent=True, **params):
+        return self.request("POST", path, params, idempotent=idempotent)
+
+    def request(self, method, path, params=None, idempotent=True):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params = {**(params or {}), "access_token": self.access_token}
+        attempt = 0
+        while True:
+            self._wait_for_throttle()
+            start = time.monotonic()
+            try:
+                res = self.session.request(method, url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Only a failed connect is known not to have reached Graph
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                logger.warning("graph %s %s failed after %.0fms: %s", method, path,
+                               (time.monotonic() - start) * 1000, e)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+            else:
+                elapsed = (time.monotonic() - start) * 1000
+                self._update_usage(res.headers)
+                logger.info("graph %s %s %s %.0fms usage=%s%%", method, path, res.status_code, elapsed, self.usage)
+                error = self._error(res)
+                if error is None:
+                    return res.json()
+                retryable = error.rate_limited or (idempotent and error.transient)
+                if not retryable or attempt >= self.max_retries:
+                    raise error
+            attempt += 1
+            # Full jitter: uniform in [0, backoff * 2^attempt]
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    # ---- Instagram publishing helpers ----
+
+    def create_container(self, ig_user_id, **params):
+        with metrics.timer("upload"):
+            media_id = self.post(f"{ig_user_id}/media", **params).get("id")
+        if not media_id:
+            raise GraphAPIError(f"Media creation failed for {ig_user_id}")
+        return media_id
+
+    def publish(self, ig_user_id, creation_id):
+        with metrics.timer("publish"):
+            return self.post(f"{ig_user_id}/media_publish", idempotent=False, creation_id=creation_id)
+
+    def statuses(self, media_ids):
+        """``status_code`` of several containers in one request."""
+        data = self.get("", ids=",".join(media_ids), fields="status_code")
+        return {media_id: data.get(media_id, {}).get("status_code") for media_id in media_ids}
+
+    def wait_until_all_ready(self, media_ids, timeout=60, initial_delay=0.5, max_delay=8):
+        """Poll all containers together until every one is FINISHED.
+
+        Uses exponential backoff between rounds and returns the ids that were
+        not ready before ``timeout``; raises if a container reports ERROR.
+        """
+        with metrics.timer("poll"):
+            return self._poll(set(media_ids), timeout, initial_delay, max_delay)
+
+    def poll_ready(self, media_ids, timeout=60, initial_delay=0.5, max_delay=8):
+        """``wait_until_all_ready`` that does not raise: returns ``(not_ready, failed)``.
+
+        ``failed`` maps the containers in ERROR or EXPIRED to their status;
+        the other containers are polled on until ready or ``timeout``.
+        """
+        failed = {}
+        with metrics.timer("poll"):
+            return self._poll(set(media_ids), timeout, initial_delay, max_delay, failed), failed
+
+    def _poll(self, pending, timeout, initial_delay, max_delay, failed=None):
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        while pending:
+            for media_id, status in self.statuses(sorted(pending)).items():
+                if status == "FINISHED":
+                    pending.discard(media_id)
+                elif status in ("ERROR", "EXPIRED"):
+                    if failed is None:
+                        raise GraphAPIError(f"Media {media_id} failed processing: {status}")
+                    failed[media_id] = status
+                    pending.discard(media_id)
+            if not pending or time.monotonic() + delay > deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+        return pending
+
+    def wait_until_ready(self, media_id, timeout=60):
+        return not self.wait_until_all_ready([media_id], timeout=timeout)
+
+    # ---- internals ----
+
+    def _error(self, res):
+        try:
+            payload = res.json()
+        except ValueError:
+            payload = {}
+        error = payload.get("error") if isinstance(payload, dict) else None
+        if res.status_code < 400 and not error:
+            return None
+        error = error or {}
+        return GraphAPIError(
+            f"Graph API error {res.status_code}: {error.get('message') or res.text[:200]}",
+            status=res.status_code,
+            code=error.get("code"),
+            payload=payload,
+        )
+
+    def _update_usage(self, headers):
+        usage, regain = parse_usage(headers)
+        with self._lock:
+            self.usage = usage
+            delay = regain
+            if usage >= self.throttle_threshold:
+                # Scale the pause from 0 at the threshold up to MAX_THROTTLE_DELAY at 100%
+                span = max(1, 100 - self.throttle_threshold)
+                delay = max(delay, MAX_THROTTLE_DELAY * min(1.0, (usage - self.throttle_threshold) / span))
+            if delay:
+                self._throttle_until = max(self._throttle_until, time.monotonic() + delay)
+
+    def _wait_for_throttle(self):
+        with self._lock:
+            wait = self._throttle_until - time.monotonic()
+        if wait > 0:
+            logger.warning("graph usage at %s%%, throttling for %.1fs", self.usage, wait)
+            time.sleep(wait)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_graph(access_token, base_url=None, pool_size=10):
+    """Process-wide client per token and base URL, so every caller shares one connection pool."""
+    key = (access_token, (base_url or DEFAULT_BASE_URL).rstrip("/"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = GraphClient(access_token, base_url=key[1], pool_size=pool_size)
+        return client
@@ -0,0 +1,239 @@
+import io
+import os
+import json
+import math
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import metrics
+
+DERIVATIVE_DIR = "data/image_derivatives"
+MANIFEST_NAME = "image_manifest.json"
+# Bump when the processing below changes, so existing derivatives are rebuilt
+PIPELINE_VERSION = "1"
+
+MAX_WIDTH = 1080
+MIN_ASPECT, MAX_ASPECT = 4 / 5, 1.91  # width / height accepted by Instagram feed posts
+JPEG_QUALITY = 85
+DOWNLOAD_WORKERS = 8
+
+
+def derivative_name(data):
+    """Content address of the derivative of the original image bytes ``data``."""
+    digest = hashlib.sha256(f"{PIPELINE_VERSION}:{MAX_WIDTH}:{JPEG_QUALITY}:".encode("ascii"))
+    digest.update(data)
+    return digest.hexdigest() + ".jpg"
+
+
+def render_derivative(data):
+    """Instagram-compliant JPEG of ``data``: aspect ratio cropped into range, at most MAX_WIDTH wide.
+
+    Returns ``(jpeg_bytes, width, height)``.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, "white")
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+
+        width, height = image.size
+        aspect = width / height
+        if aspect > MAX_ASPECT:
+            new_width = int(height * MAX_ASPECT)
+            left = (width - new_width) // 2
+            image = image.crop((left, 0, left + new_width, height))
+        elif aspect < MIN_ASPECT:
+            new_height = int(width / MIN_ASPECT)
+            top = (height - new_height) // 2
+            image = image.crop((0, top, width, top + new_height))
+
+        if image.width > MAX_WIDTH:
+            # Keep the rounded height inside the aspect ratio range
+            new_height = round(image.height * MAX_WIDTH / image.width)
+            new_height = min(max(new_height, math.ceil(MAX_WIDTH / MAX_ASPECT)), math.floor(MAX_WIDTH / MIN_ASPECT))
+            image = image.resize((MAX_WIDTH, new_height), Image.LANCZOS)
+
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return out.getvalue(), image.width, image.height
+
+
+def _process_file(job):
+    """Process pool worker: render ``source`` into ``target`` unless it already exists."""
+    source, target = job
+    if not os.path.exists(target):
+        with open(source, "rb") as f:
+            jpeg, _, _ = render_derivative(f.read())
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(jpeg)
+        os.replace(tmp_path, target)
+    from PIL import Image
+
+    with Image.open(target) as image:
+        return target, image.width, image.height, os.path.getsize(target)
+
+
+class ImagePipeline:
+    """Downloads product images once and renders cached, Instagram-ready derivatives.
+
+    Derivatives are stored under ``out_dir`` by the hash of the original
+    bytes, so an image is processed only once however many products or runs
+    use it. Downloads are conditional on the last ETag of each URL. With
+    ``public_base_url`` set (where ``out_dir`` is served from), manifests
+    carry the URL Instagram should fetch instead of the shop URL.
+    """
+
+    def __init__(self, out_dir=DERIVATIVE_DIR, public_base_url=None, processes=None,
+                 download_workers=DOWNLOAD_WORKERS):
+        import requests
+
+        self.out_dir = out_dir
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.processes = processes
+        self.download_workers = download_workers
+        self.session = requests.Session()
+        self._sources_path = os.path.join(out_dir, "sources.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(out_dir, "originals"), exist_ok=True)
+        try:
+            with open(self._sources_path, "r", encoding="utf-8") as f:
+                self.sources = json.load(f)
+        except (OSError, ValueError):
+            self.sources = {}
+
+    def _save_sources(self):
+        tmp_path = self._sources_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f)
+        os.replace(tmp_path, self._sources_path)
+
+    def _fetch(self, url):
+        """``(path of the downloaded original or None, sources entry)``; only changed images are downloaded."""
+        known = self.sources.get(url)
+        headers = {}
+        if known and os.path.exists(os.path.join(self.out_dir, known["derivative"])):
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            else:
+                return None, known
+        response = self.session.get(url, headers=headers, timeout=(5, 60))
+        if response.status_code == 304:
+            return None, known
+        response.raise_for_status()
+        data = response.content
+        name = derivative_name(data)
+        source = os.path.join(self.out_dir, "originals", name[:-len(".jpg")])
+        if not os.path.exists(os.path.join(self.out_dir, name)):
+            with open(source, "wb") as f:
+                f.write(data)
+        entry = {"etag": response.headers.get("ETag"), "derivative": name}
+        with self._lock:
+            self.sources[url] = entry
+        return source, entry
+
+    @metrics.timer("preprocess_images")
+    def process(self, urls):
+        """``{url: manifest entry}`` for the images of ``urls`` that could be downloaded and rendered."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.download_workers, len(urls) or 1))) as pool:
+            futures = {url: pool.submit(self._fetch, url) for url in urls}
+            for url, future in futures.items():
+                try:
+                    fetched[url] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Could not download {url}: {e}")
+
+        jobs = {}
+        for url, (source, entry) in fetched.items():
+            target = os.path.join(self.out_dir, entry["derivative"])
+            jobs.setdefault(target, source)
+
+        rendered = {}
+        to_render = [(source, target) for target, source in jobs.items() if not os.path.exists(target)]
+        if to_render:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                futures = {pool.submit(_process_file, job): job for job in to_render}
+                for future, (source, target) in futures.items():
+                    try:
+                        rendered[target] = future.result()
+                    except Exception as e:
+                        print(f"⚠️ Could not process {target}: {e}")
+                    os.remove(source)
+        for target in jobs:
+            if target not in rendered and os.path.exists(target):
+                rendered[target] = _process_file((None, target))
+        self._save_sources()
+
+        results = {}
+        for url, (_, entry) in fetched.items():
+            target = os.path.join(self.out_dir, entry["derivative"])
+            if target not in rendered:
+                continue
+            path, width, height, size = rendered[target]
+            results[url] = {
+                "source_url": url,
+                "path": path,
+                "public_url": f"{self.public_base_url}/{entry['derivative']}" if self.public_base_url else None,
+                "width": width,
+                "height": height,
+                "bytes": size,
+            }
+        return results
+
+    def write_manifest(self, product_dir, urls, processed=None):
+        """Write ``image_manifest.json`` next to ``image_urls.txt``; images that failed are left out."""
+        processed = processed if processed is not None else self.process(urls)
+        images = [processed[url] for url in urls if url in processed]
+        path = os.path.join(product_dir, MANIFEST_NAME)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": PIPELINE_VERSION, "images": images}, f, indent=2)
+        return path
+
+
+def load_manifest(product_dir):
+    """``{source_url: public_url}`` from a product's manifest, or ``{}`` without one."""
+    try:
+        with open(os.path.join(product_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {image["source_url"]: image["public_url"] for image in manifest.get("images", []) if image.get("public_url")}
+
+
+def preprocess_products(product_ids, public_base_url=None, output_dir="output", processes=None):
+    """Build the manifests of several prepared products, processing all their images in one pass."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("⚠️ Pillow not installed, skipping image preprocessing.")
+        return 0
+    pipeline = ImagePipeline(public_base_url=public_base_url, processes=processes)
+    image_urls = {}
+    for product_id in product_ids:
+        with open(os.path.join(output_dir, product_id, "image_urls.txt"), "r", encoding="utf-8") as f:
+            image_urls[product_id] = [line.strip() for line in f if line.strip()]
+    processed = pipeline.process(url for urls in image_urls.values() for url in urls)
+    for product_id, urls in image_urls.items():
+        pipeline.write_manifest(os.path.join(output_dir, product_id), urls, processed)
+    return len(processed)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from settings import secrets
+
+    parser = argparse.ArgumentParser(description="Render Instagram-ready derivatives of prepared products' images.")
+    parser.add_argument("product_ids", nargs="+", help="folders under output/ with an image_urls.txt")
+    parser.add_argument("--processes", type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    count = preprocess_products(args.product_ids, secrets.get("image_public_base_url"), processes=args.processes)
+    print(f"✅ {count} images processed, manifests written.")
@@ -0,0 +1,165 @@
+import time
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from sqlite_store import open_db, shared
+
+IMAGE_CACHE_DB = "data/image_cache.sqlite3"
+DEFAULT_WORKERS = 8
+TTL = 24 * 3600  # seconds a verified image is trusted
+MISSING_TTL = 3600  # shorter for missing or broken images, which are often uploaded later
+HEAD_TIMEOUT = (5, 10)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    url TEXT PRIMARY KEY,
+    status INTEGER,
+    content_type TEXT,
+    size INTEGER,
+    etag TEXT,
+    checked_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class ImageInfo:
+    url: str
+    status: int = None
+    content_type: str = None
+    size: int = None
+    etag: str = None
+    checked_at: float = 0.0
+
+    @property
+    def ok(self):
+        return self.status == 200 and (self.content_type or "").startswith("image/")
+
+
+def high_res_candidates(url):
+    """Candidate URLs for one shop image, best resolution first."""
+    if not url:
+        return []
+    gross = url.replace("/normal/", "/gross/")
+    return [gross, url] if gross != url else [url]
+
+
+class ImageResolver:
+    """Checks image URLs with concurrent HEAD requests and remembers the answers.
+
+    Results are cached in ``data/image_cache.sqlite3`` for ``ttl`` seconds
+    (``missing_ttl`` for URLs that did not answer with an image), so a
+    prepared post is checked again at publish time without new requests.
+    """
+
+    def __init__(self, path=IMAGE_CACHE_DB, max_workers=DEFAULT_WORKERS, ttl=TTL, missing_ttl=MISSING_TTL,
+                 timeout=HEAD_TIMEOUT):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        self.session.close()
+        self._conn.close()
+
+    def _cached(self, urls, now):
+        fresh = {}
+        with self._lock:
+            for url in urls:
+                row = self._conn.execute(
+                    "SELECT url, status, content_type, size, etag, checked_at FROM images WHERE url = ?", (url,)
+                ).fetchone()
+                if row is None:
+                    continue
+                info = ImageInfo(*row)
+                if now - info.checked_at < (self.ttl if info.ok else self.missing_ttl):
+                    fresh[url] = info
+        return fresh
+
+    def _store(self, infos):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO images (url, status, content_type, size, etag, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((i.url, i.status, i.content_type, i.size, i.etag, i.checked_at) for i in infos),
+            )
+
+    def _head(self, url):
+        import requests
+
+        try:
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+            if response.status_code in (405, 501):
+                # Server does not answer HEAD: read only the headers of a GET
+                with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                    pass
+        except requests.RequestException:
+            return ImageInfo(url, checked_at=time.time())
+        size = response.headers.get("Content-Length")
+        return ImageInfo(
+            url,
+            status=response.status_code,
+            content_type=response.headers.get("Content-Type"),
+            size=int(size) if size and size.isdigit() else None,
+            etag=response.headers.get("ETag"),
+            checked_at=time.time(),
+        )
+
+    @metrics.timer("resolve_images")
+    def check(self, urls):
+        """``{url: ImageInfo}`` for ``urls``; only URLs without a fresh cache entry are requested."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        results = self._cached(urls, time.time())
+        missing = [u for u in urls if u not in results]
+        metrics.count("images.cached", len(results))
+        metrics.count("images.requested", len(missing))
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing)),
+                                    thread_name_prefix="image-head") as pool:
+                checked = list(pool.map(self._head, missing))
+            self._store(checked)
+            results.update((info.url, info) for info in checked)
+        return results
+
+    def resolve(self, slots):
+        """First available candidate of each slot; slots without a working image are dropped.
+
+        ``slots`` is a list of candidate lists, best candidate first. All
+        candidates of all slots are checked in one concurrent pass.
+        """
+        infos = self.check(url for candidates in slots for url in candidates)
+        resolved = []
+        for candidates in slots:
+            url = next((u for u in candidates if infos.get(u) and infos[u].ok), None)
+            if url:
+                resolved.append(url)
+        return resolved
+
+
+@shared
+def get_resolver():
+    """Process-wide resolver on the default cache path."""
+    return ImageResolver()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check image URLs (cached) and print what the shop serves.")
+    parser.add_argument("urls", nargs="+")
+    args = parser.parse_args()
+
+    for url, info in get_resolver().check(args.urls).items():
+        mark = "✅" if info.ok else "❌"
+        print(f"{mark} {info.status} {info.content_type} {info.size} {url}")
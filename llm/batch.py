@@ -0,0 +1,176 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 300  # seconds per caption
+MAX_REGENERATIONS = 2  # new attempts for a caption the quality check rejected
+
+
+class CaptionRejected(Exception):
+    """A caption still failed the quality check after its regenerations."""
+
+
+@dataclass
+class CaptionResult:
+    product: dict
+    caption: str = None
+    error: Exception = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _finished(result):
+    metrics.observe("caption", result.elapsed)
+    metrics.count("captions.ok" if result.ok else "captions.failed")
+    return result
+
+
+def _default_caption_fn(product, timeout, feedback=None):
+    from llm.generate_caption import generate_caption
+
+    return generate_caption(
+        product.get("description"), product.get("titel"), product.get("id"), timeout=timeout, feedback=feedback
+    )
+
+
+def _default_discard(product):
+    from llm.generate_caption import discard_caption
+
+    discard_caption(product.get("description"), product.get("titel"), product.get("id"))
+
+
+def _default_pack_fn(products, timeout):
+    from llm.generate_caption import generate_packed_captions
+
+    return generate_packed_captions(products, timeout=timeout)
+
+
+def generate_captions(products, caption_fn=None, max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                      pack_size=1, pack_fn=None):
+    """Generate captions for ``products`` concurrently, yielding results as they finish.
+
+    ``caption_fn(product, timeout)`` is called once per product on a thread
+    pool of ``max_workers``. A failing product yields a result with ``error``
+    set and does not affect the others. A product still running ``timeout``
+    seconds after it started yields a ``TimeoutError`` result; its worker is
+    left to finish in the background since threads cannot be cancelled, so
+    ``caption_fn`` should honour the timeout itself as well.
+
+    With ``pack_size`` > 1, products are grouped by ``pack_size`` and each
+    group is first asked from ``pack_fn(products, timeout)`` in one request;
+    products it returns None for are submitted to the pool one by one with
+    ``caption_fn``. The timeout applies to each request on its own.
+    """
+    caption_fn = caption_fn or _default_caption_fn
+    pack_fn = pack_fn or _default_pack_fn
+    products = list(products)
+    if not products:
+        return
+
+    started = {}  # job -> start time of its request
+    lock = threading.Lock()
+
+    def run(job):
+        with lock:
+            started[job] = time.monotonic()
+        if len(job) == 1:
+            return [caption_fn(products[job[0]], timeout)]
+        try:
+            return pack_fn([products[i] for i in job], timeout)
+        except Exception as e:
+            logger.warning("packed caption request for %d products failed: %s", len(job), e)
+            return [None] * len(job)
+
+    size = max(1, pack_size)
+    jobs = [tuple(range(i, min(i + size, len(products)))) for i in range(0, len(products), size)]
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="caption")
+    try:
+        pending = {executor.submit(run, job): job for job in jobs}
+        while pending:
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+
+            for future in done:
+                job = pending.pop(future)
+                elapsed = now - started.get(job, now)
+                try:
+                    captions = future.result()
+                except Exception as e:
+                    yield _finished(CaptionResult(products[job[0]], error=e, elapsed=elapsed))
+                    continue
+                for index, caption in zip(job, captions):
+                    if caption is None and len(job) > 1:
+                        # Not answered by the pack: its own request, with its own timeout
+                        pending[executor.submit(run, (index,))] = (index,)
+                    else:
+                        yield _finished(CaptionResult(products[index], caption=caption, elapsed=elapsed))
+
+            with lock:
+                expired = [f for f, job in pending.items() if job in started and now - started[job] > timeout]
+            for future in expired:
+                job = pending.pop(future)
+                future.cancel()
+                for index in job:
+                    yield _finished(CaptionResult(
+                        products[index],
+                        error=TimeoutError(f"Caption generation exceeded {timeout}s"),
+                        elapsed=now - started[job],
+                    ))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_checked_captions(products, check, caption_fn=None, discard=None, max_regenerations=MAX_REGENERATIONS,
+                              **kwargs):
+    """``generate_captions`` with a quality check, regenerating only the rejected captions.
+
+    ``check(product, caption)`` returns the caption's problems (empty if it
+    passes) and is called just before a result is yielded, so it also sees
+    whatever the caller did with earlier results. A rejected product is
+    captioned again with ``caption_fn(product, timeout, feedback=problems)``,
+    at most ``max_regenerations`` times and without packing; after that it
+    yields a ``CaptionRejected`` result. ``discard(product)`` is called for
+    every rejected caption to drop it from the response cache, so it is not
+    served again (with the default ``caption_fn``: from the caption cache).
+    Other keyword arguments go to ``generate_captions``.
+    """
+    if caption_fn is None:
+        caption_fn, discard = _default_caption_fn, discard or _default_discard
+    discard = discard or (lambda product: None)
+    feedback = {}  # id(product) -> problems of its last caption
+
+    def retry_fn(product, timeout):
+        return caption_fn(product, timeout, feedback=feedback[id(product)])
+
+    attempt_products, attempt_fn = list(products), caption_fn
+    for attempt in range(max_regenerations + 1):
+        rejected = []
+        for result in generate_captions(attempt_products, caption_fn=attempt_fn, **kwargs):
+            problems = check(result.product, result.caption) if result.ok else None
+            if not problems:
+                yield result
+                continue
+            metrics.count("captions.rejected")
+            discard(result.product)
+            if attempt == max_regenerations:
+                yield CaptionResult(result.product, caption=result.caption,
+                                    error=CaptionRejected("; ".join(problems)), elapsed=result.elapsed)
+                continue
+            logger.info("caption rejected, regenerating: %s", "; ".join(problems))
+            feedback[id(result.product)] = problems
+            rejected.append(result.product)
+        if not rejected:
+            return
+        metrics.count("captions.regenerated", len(rejected))
+        attempt_products, attempt_fn = rejected, retry_fn
+        kwargs["pack_size"] = 1
@@ -0,0 +1,186 @@
+import json
+import time
+import hashlib
+
+from sqlite_store import open_db, shared
+
+CACHE_DB = "data/caption_cache.sqlite3"
+MAX_ENTRIES = 5000
+MAX_BYTES = 50 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def cache_key(prompt, model, options=None, scope=None):
+    """Content address of a generation request.
+
+    ``scope`` separates requests whose prompt alone does not identify the
+    item, e.g. a product caption prompt that does not embed the product.
+    """
+    payload = json.dumps(
+        {"prompt": prompt, "model": model, "options": options or {}, "scope": scope},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CaptionCache:
+    """On-disk LLM response cache with least-recently-used eviction.
+
+    Entries are evicted oldest-use first once there are more than
+    ``max_entries`` of them or they exceed ``max_bytes`` of text in total.
+    """
+
+    def __init__(self, path=CACHE_DB, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT text FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._bump("misses")
+                return None
+            self.hits += 1
+            self._bump("hits")
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, text, model=""):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, model, text, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, text, len(text.encode("utf-8")), now, now),
+            )
+            self._evict(self.max_entries, self.max_bytes)
+
+    def delete(self, key):
+        """Drop one entry, e.g. a reply that turned out unusable; returns whether it existed."""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount == 1
+
+    def get_or_generate(self, prompt, model, generate, options=None, scope=None):
+        """Return the cached response for this request, calling ``generate()`` only on a miss."""
+        key = cache_key(prompt, model, options, scope)
+        text = self.get(key)
+        if text is None:
+            text = generate()
+            self.put(key, text, model)
+        return text
+
+    def prune(self, max_entries=None, max_bytes=None, older_than=None):
+        """Evict down to the given limits (defaults: the configured ones); returns entries removed."""
+        with self._lock, self._conn:
+            removed = 0
+            if older_than is not None:
+                cur = self._conn.execute("DELETE FROM entries WHERE last_used < ?", (time.time() - older_than,))
+                removed += cur.rowcount
+            removed += self._evict(
+                self.max_entries if max_entries is None else max_entries,
+                self.max_bytes if max_bytes is None else max_bytes,
+            )
+            return removed
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM counters")
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters"))
+            models = dict(self._conn.execute("SELECT model, COUNT(*) FROM entries GROUP BY model"))
+        return {
+            "entries": count,
+            "bytes": size,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "models": models,
+        }
+
+    def _bump(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _evict(self, max_entries, max_bytes):
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= max_entries and size <= max_bytes:
+            return 0
+        removed = 0
+        for key, entry_size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_used"
+        ).fetchall():
+            if count <= max_entries and size <= max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            count -= 1
+            size -= entry_size
+            removed += 1
+        return removed
+
+
+@shared
+def get_cache():
+    """Process-wide cache on the default database path."""
+    return CaptionCache()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and prune the caption cache.")
+    parser.add_argument("--path", default=CACHE_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show entry count, size and hit/miss counters")
+    prune = sub.add_parser("prune", help="evict least recently used entries")
+    prune.add_argument("--max-entries", type=int)
+    prune.add_argument("--max-bytes", type=int)
+    prune.add_argument("--older-than-days", type=float)
+    sub.add_parser("clear", help="remove all entries and reset counters")
+    args = parser.parse_args()
+
+    cache = CaptionCache(args.path)
+    if args.command == "stats":
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0.0
+        print(f"📦 {stats['entries']} entries, {stats['bytes'] / 1024:.1f} KiB")
+        print(f"🎯 {stats['hits']} hits / {stats['misses']} misses ({hit_rate:.0%} hit rate)")
+        for model, count in sorted(stats["models"].items()):
+            print(f"   {model}: {count}")
+    elif args.command == "prune":
+        older_than = args.older_than_days * 86400 if args.older_than_days is not None else None
+        removed = cache.prune(args.max_entries, args.max_bytes, older_than)
+        print(f"🧹 Removed {removed} entries")
+    elif args.command == "clear":
+        cache.clear()
+        print("🧹 Cache cleared")
@@ -1,32 +1,152 @@
-import subprocess
 import re
 import json
+import logging
+
+from llm.ollama_client import get_client
+from llm.caption_cache import get_cache, cache_key
+from llm.preprocess import prepare_input, estimate_tokens, count_prompt, DESCRIPTION_TOKENS
+from settings import secrets
+
+logger = logging.getLogger(__name__)
 
 encoding="utf-8"
 
-with open("config/secrets.json", "r", encoding="utf-8") as f:
-    secrets = json.load(f)
+DEFAULT_CAPTION_MODEL = "qwen3:latest"
+PACK_MAX_TOKENS = 120  # products with a longer description get a request of their own
+
+# {titel}, {description} and {product_id} in secrets['prompt'] are filled in per product
+_FIELD = re.compile(r"\{(titel|description|product_id)\}")
+
+FEEDBACK_PROMPT = """{prompt}
+
+Eine vorige Bildunterschrift wurde abgelehnt ({problems}). Schreibe eine neue, die das behebt."""
+
+PACK_PROMPT = """{instructions}
+
+Schreibe für jedes der folgenden Produkte eine eigene Bildunterschrift nach diesen Vorgaben; <titel>, <description> und <product_id> stehen für die Angaben des jeweiligen Produkts. Antworte nur mit JSON: ein Eintrag in "captions" pro Produkt, mit dessen "id".
+
+{products}"""
+
+PACK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "captions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "string"}, "caption": {"type": "string"}},
+                "required": ["id", "caption"],
+            },
+        },
+    },
+    "required": ["captions"],
+}
+
+def caption_model():
+    return secrets.get("caption_model", DEFAULT_CAPTION_MODEL)
     
 def clean_caption(raw_output):
     # Remove <think>...</think> and surrounding whitespace
     return re.sub(r'<think>.*?</think>', '', raw_output, flags=re.DOTALL).strip()
 
-def generate_caption(description: str, product_name: str, product_id: str, lang: str = "de") -> str:
-    prompt = secrets['prompt']
+def build_prompt(template, fields):
+    """``template`` with the product placeholders replaced by ``fields``; other braces are left alone."""
+    return _FIELD.sub(lambda m: str(fields.get(m.group(1)) or ""), template)
 
-    result = subprocess.run(
-        ["ollama", "run", "qwen3:latest"],
-        input=prompt.encode(encoding),
-        capture_output=True
-    )
+def with_feedback(prompt, feedback):
+    """``prompt`` asking for a new caption that fixes ``feedback``, the problems of a rejected one."""
+    if not feedback:
+        return prompt
+    return FEEDBACK_PROMPT.format(prompt=prompt, problems="; ".join(feedback))
 
-    if result.returncode != 0:
-        raise RuntimeError("Ollama call failed: " + result.stderr.decode(encoding))
-    raw_caption = result.stdout.decode(encoding).strip()
+def product_fields(description, product_name, product_id):
+    """Prompt fields of a product, the description cleaned and cut to DESCRIPTION_TOKENS."""
+    return {
+        "titel": product_name or "",
+        "description": prepare_input(description or "", DESCRIPTION_TOKENS),
+        "product_id": product_id,
+    }
+
+def _raw_tokens(template, description, product_name, product_id):
+    return estimate_tokens(build_prompt(template, {
+        "titel": product_name, "description": description, "product_id": product_id}))
+
+def generate_caption(description: str, product_name: str, product_id: str, lang: str = "de", timeout: float = None,
+                     feedback: list = None) -> str:
+    template = secrets['prompt']
+    base_prompt = build_prompt(template, product_fields(description, product_name, product_id))
+    prompt = with_feedback(base_prompt, feedback)
+
+    model = caption_model()
+    client = get_client(secrets.get("ollama_host"))
+
+    def generate():
+        count_prompt(prompt, _raw_tokens(template, description, product_name, product_id))
+        return client.chat(prompt, model=model, timeout=timeout).text
+
+    cache = get_cache()
+    if feedback:
+        # A retry for a rejected caption always asks the model; its reply replaces the rejected one
+        raw_caption = generate()
+        cache.put(cache_key(base_prompt, model, scope=product_id), raw_caption, model)
+    else:
+        raw_caption = cache.get_or_generate(base_prompt, model, generate, scope=product_id)
     caption = clean_caption(raw_caption)
 
     return caption
 
+def discard_caption(description, product_name, product_id):
+    """Drop the cached caption of a product, so a rejected caption is not served again."""
+    prompt = build_prompt(secrets['prompt'], product_fields(description, product_name, product_id))
+    return get_cache().delete(cache_key(prompt, caption_model(), scope=product_id))
+
+def generate_packed_captions(products, timeout=None):
+    """Captions of several short products from one structured-output request.
+
+    Returns a list aligned with ``products``. Entries are None for products
+    with a description above PACK_MAX_TOKENS or missing from the reply, so
+    the caller can caption those one by one. Cached captions are reused and
+    new ones are cached under the same key as a single request.
+    """
+    template = secrets['prompt']
+    model = caption_model()
+    cache = get_cache()
+    captions = [None] * len(products)
+    packed = {}
+    for i, product in enumerate(products):
+        fields = product_fields(product.get("description"), product.get("titel"), product.get("id"))
+        key = cache_key(build_prompt(template, fields), model, scope=product.get("id"))
+        cached = cache.get(key)
+        if cached is not None:
+            captions[i] = clean_caption(cached)
+        elif estimate_tokens(fields["description"]) <= PACK_MAX_TOKENS:
+            packed[str(product.get("id"))] = (i, key, fields)
+    if len(packed) < 2:
+        return captions
+
+    instructions = build_prompt(template, {name: f"<{name}>" for name in ("titel", "description", "product_id")})
+    prompt = PACK_PROMPT.format(instructions=instructions, products="\n".join(
+        json.dumps({"id": product_id, "titel": fields["titel"], "description": fields["description"]},
+                   ensure_ascii=False)
+        for product_id, (_, _, fields) in packed.items()
+    ))
+    count_prompt(prompt, sum(_raw_tokens(template, products[i].get("description"), fields["titel"], product_id)
+                             for product_id, (i, _, fields) in packed.items()))
+    reply = get_client(secrets.get("ollama_host")).chat(prompt, model=model, timeout=timeout, format=PACK_SCHEMA)
+    try:
+        entries = json.loads(clean_caption(reply.text))["captions"]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning("packed caption reply for %d products unusable: %s", len(packed), e)
+        return captions
+    for entry in entries:
+        target = packed.get(str(entry.get("id"))) if isinstance(entry, dict) else None
+        caption = clean_caption(str(entry.get("caption") or "")) if target else ""
+        if caption:
+            i, key, _ = target
+            cache.put(key, caption, model)
+            captions[i] = caption
+    return captions
+
 if __name__ == "__main__":
     import csv
     with open("../data/product_list.csv", "r", encoding=encoding) as f:
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_KEEP_ALIVE = "30m"  # how long Ollama keeps the model loaded after a call
+DEFAULT_TIMEOUT = 300
+
+
+def _normalize_host(host):
+    host = (host or os.environ.get("OLLAMA_HOST") or DEFAULT_HOST).rstrip("/")
+    if "://" not in host:
+        host = "http://" + host
+    return host
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    model: str
+    latency: float  # seconds from request to last token
+    time_to_first_token: float
+    eval_count: int = 0
+    prompt_eval_count: int = 0
+    tokens_per_second: float = 0.0
+
+
+class OllamaClient:
+    """Long-lived client for the Ollama HTTP API.
+
+    Requests go through one pooled ``requests.Session`` so connections are
+    reused, ``keep_alive`` asks the server to keep the model resident between
+    calls, and responses are streamed so time to first token can be measured.
+    """
+
+    def __init__(self, host=None, keep_alive=DEFAULT_KEEP_ALIVE, timeout=DEFAULT_TIMEOUT, pool_size=8):
+        self.host = _normalize_host(host)
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def chat(self, prompt, model, options=None, timeout=None, on_token=None, format=None):
+        """Send a single user message to ``/api/chat`` and return the full reply.
+
+        ``format`` is ``"json"`` or a JSON schema the reply must follow
+        (structured outputs, Ollama 0.5 and later).
+        """
+        messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        return self._stream("/api/chat", payload, lambda chunk: chunk.get("message", {}).get("content", ""),
+                            timeout, on_token)
+
+    def generate(self, prompt, model, options=None, timeout=None, on_token=None, format=None):
+        """Raw completion via ``/api/generate``."""
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        return self._stream("/api/generate", payload, lambda chunk: chunk.get("response", ""),
+                            timeout, on_token)
+
+    def preload(self, model):
+        """Load ``model`` into memory without generating anything."""
+        res = self.session.post(f"{self.host}/api/generate", json={"model": model, "keep_alive": self.keep_alive},
+                                timeout=self.timeout)
+        res.raise_for_status()
+
+    def _stream(self, path, payload, extract, timeout, on_token):
+        timeout = timeout or self.timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        first_token = None
+        parts = []
+        final = {}
+
+        with self.session.post(f"{self.host}{path}", json=payload, stream=True, timeout=timeout) as res:
+            if res.status_code != 200:
+                raise RuntimeError(f"Ollama call failed ({res.status_code}): {res.text}")
+            for line in res.iter_lines():
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Ollama call exceeded {timeout}s")
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError("Ollama call failed: " + str(chunk["error"]))
+                token = extract(chunk)
+                if token:
+                    if first_token is None:
+                        first_token = time.monotonic() - start
+                    parts.append(token)
+                    if on_token:
+                        on_token(token)
+                if chunk.get("done"):
+                    final = chunk
+                    break
+
+        latency = time.monotonic() - start
+        if first_token is None:
+            first_token = latency
+        eval_count = final.get("eval_count") or len(parts)
+        eval_duration = (final.get("eval_duration") or 0) / 1e9 or (latency - first_token)
+        result = GenerationResult(
+            text="".join(parts),
+            model=payload["model"],
+            latency=latency,
+            time_to_first_token=first_token,
+            eval_count=eval_count,
+            prompt_eval_count=final.get("prompt_eval_count") or 0,
+            tokens_per_second=eval_count / eval_duration if eval_duration > 0 else 0.0,
+        )
+        logger.info("ollama %s %s: %.2fs total, %.2fs to first token, %.1f tok/s",
+                    path, result.model, result.latency, result.time_to_first_token, result.tokens_per_second)
+        return result
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host=None, keep_alive=DEFAULT_KEEP_ALIVE):
+    """Process-wide client per host, so every caller shares one connection pool."""
+    host = _normalize_host(host)
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = _clients[host] = OllamaClient(host, keep_alive=keep_alive)
+        return client
@@ -0,0 +1,71 @@
+import re
+import html
+
+import metrics
+
+DESCRIPTION_TOKENS = 250  # budget for a shop description in a caption prompt
+INGREDIENT_TOKENS = 300  # budget for a recipe's ingredient list
+
+_BLOCKS = re.compile(r"<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+# <br> and block-level tags (paragraphs, list items, ...) become line breaks
+_BREAKS = re.compile(r"<br\s*/?>|</?(?:p|div|li|ul|ol|h[1-6]|tr|table)\b[^>]*>", re.IGNORECASE)
+_TAGS = re.compile(r"<[^>]+>")
+_NEWLINES = re.compile(r"[ \t\xa0]*\n\s*")
+_SPACES = re.compile(r"[ \t\xa0]{2,}")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def clean_html(text):
+    """Plain text of shop or ERP HTML: one line per ``<br>`` or paragraph, no tags, entities decoded."""
+    if not text:
+        return ""
+    # Each step is a compiled C-level substitution; the checks skip the ones plain text does not need
+    if "<" in text:
+        if "<!--" in text or "<s" in text or "<S" in text:
+            text = _BLOCKS.sub("", text)
+        text = _TAGS.sub("", _BREAKS.sub("\n", text))
+    if "&" in text:
+        text = html.unescape(text.replace("&nbsp;", " "))
+    return _SPACES.sub(" ", _NEWLINES.sub("\n", text.replace("\r", ""))).strip()
+
+
+def estimate_tokens(text):
+    """Rough token count without the model's tokenizer: about one token per 4 characters of a word, one per symbol."""
+    return sum((len(token) + 3) // 4 for token in _TOKEN.findall(text or ""))
+
+
+def truncate_to_budget(text, max_tokens):
+    """``text`` cut to about ``max_tokens`` at a line, sentence or word boundary, marked with an ellipsis."""
+    used = 0
+    for match in _TOKEN.finditer(text):
+        used += (len(match.group()) + 3) // 4
+        if used > max_tokens:
+            cut = match.start()
+            break
+    else:
+        return text
+    head = text[:cut]
+    for boundary in ("\n", ". ", " "):
+        position = head.rfind(boundary)
+        if position > len(head) // 2:
+            head = head[:position + len(boundary.rstrip())]
+            break
+    return head.rstrip() + ("\n…" if "\n" in head else " …")
+
+
+def prepare_input(raw, max_tokens):
+    """``raw`` shop or ERP text cleaned and cut to ``max_tokens``."""
+    return truncate_to_budget(clean_html(raw), max_tokens)
+
+
+def count_prompt(prompt, raw_tokens=None):
+    """Count ``prompt`` as sent in the active metrics run, and the tokens saved against ``raw_tokens``.
+
+    ``raw_tokens`` is the size of what would have been sent without
+    preprocessing and packing. Returns the prompt's estimated tokens.
+    """
+    tokens = estimate_tokens(prompt)
+    metrics.count("prompt_tokens.sent", tokens)
+    if raw_tokens is not None:
+        metrics.count("prompt_tokens.saved", max(0, raw_tokens - tokens))
+    return tokens
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+from contextlib import contextmanager
+
+RUNS_LOG = "data/metrics/runs.jsonl"
+MAX_SAMPLES = 1000  # per stage and run; totals and counts stay exact beyond that
+
+
+class Run:
+    """Stage timings and counters of one pipeline run."""
+
+    def __init__(self, flow):
+        self.flow = flow
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "total": 0.0, "samples": []})
+            entry["count"] += 1
+            entry["total"] += seconds
+            if len(entry["samples"]) < MAX_SAMPLES:
+                entry["samples"].append(round(seconds, 6))
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, duration, error=None):
+        return {
+            "run_id": self.run_id,
+            "flow": self.flow,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "duration": round(duration, 6),
+            "status": "failed" if error else "ok",
+            "error": str(error) if error else None,
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def run(flow, log_path=RUNS_LOG, textfile=None):
+    """Collect timings for everything inside the block and append one JSON line per run.
+
+    Instrumented code anywhere in the process (including worker threads)
+    reports into the active run. A nested ``run`` joins the outer one.
+    With ``textfile`` (default: ``metrics_textfile`` in the secrets), the
+    run is also exported for the Prometheus node exporter's textfile
+    collector. Also usable as a decorator.
+    """
+    global _active
+    with _active_lock:
+        outer = _active
+        if outer is None:
+            _active = Run(flow)
+        current = _active
+    if outer is not None:
+        yield current
+        return
+
+    start = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        with _active_lock:
+            _active = None
+        record = current.record(time.perf_counter() - start, error)
+        _append(log_path, record)
+        if textfile is None:
+            from settings import secrets
+
+            textfile = secrets.get("metrics_textfile")
+        if textfile:
+            write_textfile(textfile, record)
+
+
+def _append(path, record):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def observe(stage, seconds):
+    """Add a duration sample to ``stage`` of the active run (no-op without one)."""
+    current = _active
+    if current is not None:
+        current.observe(stage, seconds)
+
+
+def count(name, n=1):
+    current = _active
+    if current is not None:
+        current.count(name, n)
+
+
+@contextmanager
+def timer(stage):
+    """Time the block as one sample of ``stage``, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_textfile(path, record):
+    """Prometheus text exposition of the last run of ``record["flow"]``, written atomically."""
+    flow = _label(record["flow"])
+    lines = [
+        "# HELP social_pipeline_run_duration_seconds Duration of the last run.",
+        "# TYPE social_pipeline_run_duration_seconds gauge",
+        f'social_pipeline_run_duration_seconds{{flow="{flow}"}} {record["duration"]}',
+        "# HELP social_pipeline_run_success Whether the last run finished without an error.",
+        "# TYPE social_pipeline_run_success gauge",
+        f'social_pipeline_run_success{{flow="{flow}"}} {int(record["status"] == "ok")}',
+        "# HELP social_pipeline_run_timestamp_seconds End time of the last run.",
+        "# TYPE social_pipeline_run_timestamp_seconds gauge",
+        f'social_pipeline_run_timestamp_seconds{{flow="{flow}"}} {time.time():.0f}',
+        "# HELP social_pipeline_stage_seconds Time spent per stage in the last run.",
+        "# TYPE social_pipeline_stage_seconds gauge",
+    ]
+    for stage, entry in sorted(record["stages"].items()):
+        lines.append(f'social_pipeline_stage_seconds{{flow="{flow}",stage="{_label(stage)}"}} {entry["total"]:.6f}')
+    lines += [
+        "# HELP social_pipeline_stage_calls Timed calls per stage in the last run.",
+        "# TYPE social_pipeline_stage_calls gauge",
+    ]
+    for stage, entry in sorted(record["stages"].items()):
+        lines.append(f'social_pipeline_stage_calls{{flow="{flow}",stage="{_label(stage)}"}} {entry["count"]}')
+    lines += [
+        "# HELP social_pipeline_events Counters of the last run.",
+        "# TYPE social_pipeline_events gauge",
+    ]
+    for name, value in sorted(record["counters"].items()):
+        lines.append(f'social_pipeline_events{{flow="{flow}",name="{_label(name)}"}} {value}')
+
+    # One file per flow, so the collector keeps the last run of every flow
+    root, ext = os.path.splitext(path)
+    path = f"{root}_{record['flow']}{ext or '.prom'}"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of a non-empty list."""
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def load_runs(path=RUNS_LOG, flow=None, last=None):
+    runs = []
+    if not os.path.exists(path):
+        return runs
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if flow is None or record.get("flow") == flow:
+                runs.append(record)
+    return runs[-last:] if last else runs
+
+
+def summarize(runs):
+    """``{flow: {stage: {"runs", "calls", "p50", "p95", "max"}}}``; ``"run"`` is the whole run."""
+    samples = {}
+    for record in runs:
+        stages = samples.setdefault(record["flow"], {})
+        stages.setdefault("run", {"runs": 0, "calls": 0, "samples": []})
+        stages["run"]["runs"] += 1
+        stages["run"]["calls"] += 1
+        stages["run"]["samples"].append(record["duration"])
+        for stage, entry in record.get("stages", {}).items():
+            summary = stages.setdefault(stage, {"runs": 0, "calls": 0, "samples": []})
+            summary["runs"] += 1
+            summary["calls"] += entry["count"]
+            summary["samples"].extend(entry["samples"])
+    return {
+        flow: {
+            stage: {
+                "runs": s["runs"],
+                "calls": s["calls"],
+                "p50": percentile(s["samples"], 0.5),
+                "p95": percentile(s["samples"], 0.95),
+                "max": max(s["samples"]),
+            }
+            for stage, s in stages.items() if s["samples"]
+        }
+        for flow, stages in samples.items()
+    }
+
+
+def counter_totals(runs):
+    """``{flow: {counter: total}}`` across ``runs``."""
+    totals = {}
+    for record in runs:
+        flow = totals.setdefault(record["flow"], {})
+        for name, value in record.get("counters", {}).items():
+            flow[name] = flow.get(name, 0) + value
+    return totals
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pipeline run metrics.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="p50/p95 per stage across recorded runs")
+    report.add_argument("--flow", help="only this flow, e.g. weekly")
+    report.add_argument("--last", type=int, help="only the last N runs")
+    report.add_argument("--log", default=RUNS_LOG)
+    args = parser.parse_args()
+
+    runs = load_runs(args.log, args.flow, args.last)
+    if not runs:
+        print(f"No runs recorded in {args.log}.")
+    totals = counter_totals(runs)
+    for flow, stages in summarize(runs).items():
+        failed = sum(r["status"] != "ok" for r in runs if r["flow"] == flow)
+        print(f"\n{flow} ({stages['run']['runs']} runs, {failed} failed)")
+        print(f"  {'stage':<20} {'runs':>5} {'calls':>6} {'p50 s':>9} {'p95 s':>9} {'max s':>9}")
+        for stage, s in sorted(stages.items(), key=lambda item: (item[0] != "run", item[0])):
+            print(f"  {stage:<20} {s['runs']:>5} {s['calls']:>6} {s['p50']:>9.3f} {s['p95']:>9.3f} {s['max']:>9.3f}")
+        if totals.get(flow):
+            print(f"  {'counter':<20} {'total':>12} {'per run':>9}")
+            for name, total in sorted(totals[flow].items()):
+                print(f"  {name:<20} {total:>12} {total / stages['run']['runs']:>9.1f}")
@@ -0,0 +1,142 @@
+import os
+import csv
+import time
+
+from sqlite_store import open_db, shared
+
+ENCODING = "utf-8"
+HISTORY_DB = "data/post_history.sqlite3"
+LEGACY_LOG_PATH = "data/posted_log.csv"
+
+# Items are namespaced so products and recipes can share one store
+PRODUCT = "product"
+RECIPE = "recipe"
+
+
+def target_kind(kind, target):
+    """Namespace of per-target publish results, e.g. ``product@storefront-at``."""
+    return f"{kind}@{target}"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS latest (
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (kind, item_id)
+) WITHOUT ROWID;
+"""
+
+
+class PostHistory:
+    """Append-only log of post status transitions with an id -> latest status index.
+
+    Every status change is appended to ``events``; ``latest`` holds the most
+    recent status per item so lookups are a single primary-key probe instead
+    of a scan over the whole history.
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._conn, self._lock = open_db(path, SCHEMA, "synchronous=NORMAL")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, item_id, status, kind=PRODUCT, timestamp=None):
+        """Append a status transition and move the latest-status pointer."""
+        self.record_many([(item_id, status, timestamp)], kind=kind)
+
+    def record_many(self, entries, kind=PRODUCT):
+        """Append several ``(item_id, status, timestamp)`` transitions in one transaction."""
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self._conn:
+            for item_id, status, timestamp in entries:
+                timestamp = timestamp or now
+                cur = self._conn.execute(
+                    "INSERT INTO events (kind, item_id, timestamp, status) VALUES (?, ?, ?, ?)",
+                    (kind, str(item_id), timestamp, status),
+                )
+                self._conn.execute(
+                    "INSERT INTO latest (kind, item_id, seq, timestamp, status) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(kind, item_id) DO UPDATE SET "
+                    "seq = excluded.seq, timestamp = excluded.timestamp, status = excluded.status",
+                    (kind, str(item_id), cur.lastrowid, timestamp, status),
+                )
+
+    def latest_status(self, item_id, kind=PRODUCT):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM latest WHERE kind = ? AND item_id = ?",
+                (kind, str(item_id)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def has_entry(self, item_id, kind=PRODUCT):
+        return self.latest_status(item_id, kind=kind) is not None
+
+    def is_published(self, item_id, kind=PRODUCT):
+        return self.latest_status(item_id, kind=kind) == "published"
+
+    def ids(self, kind=PRODUCT, status=None):
+        """All item ids of ``kind`` in the index, optionally filtered by latest status."""
+        query = "SELECT item_id FROM latest WHERE kind = ?"
+        params = [kind]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(query, params)}
+
+    def history(self, item_id, kind=PRODUCT):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT timestamp, status FROM events WHERE kind = ? AND item_id = ? ORDER BY seq",
+                (kind, str(item_id)),
+            ).fetchall()
+
+    def import_csv(self, csv_path=LEGACY_LOG_PATH, encoding=ENCODING):
+        """One-shot import of the legacy ``posted_log.csv``.
+
+        The legacy file mixes product rows (``id,timestamp,status``, written
+        with or without a header) and recipe rows (``rezept_id,timestamp``).
+        Rows are replayed in file order so the last one per id wins.
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        products, recipes = [], []
+        with open(csv_path, newline="", encoding=encoding, errors="replace") as f:
+            for row in csv.reader(f):
+                if not row or row[0] in ("id", "rezept_id"):
+                    continue
+                if len(row) >= 3:
+                    products.append((row[0], row[2], row[1]))
+                elif len(row) == 2:
+                    recipes.append((row[0], "published", row[1]))
+        self.record_many(products, kind=PRODUCT)
+        self.record_many(recipes, kind=RECIPE)
+        return len(products) + len(recipes)
+
+
+@shared
+def get_history(path=HISTORY_DB):
+    """Shared store per database path; opened once per process."""
+    return PostHistory(path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    source = sys.argv[1] if len(sys.argv) > 1 else LEGACY_LOG_PATH
+    count = get_history().import_csv(source)
+    print(f"✅ Imported {count} log rows from {source} into {HISTORY_DB}")
@@ -0,0 +1,285 @@
+import os
+import time
+import datetime
+import logging
+
+from sqlite_store import open_db
+
+QUEUE_DB = "data/post_queue.sqlite3"
+DEFAULT_TARGET = "default"
+
+PENDING, UPLOADING, PUBLISHED, FAILED = "pending", "uploading", "published", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    product_id TEXT NOT NULL,
+    target TEXT NOT NULL,
+    state TEXT NOT NULL,
+    scheduled_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    result TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (product_id, target)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS queue_due ON queue (state, scheduled_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class PostQueue:
+    """Persistent posting queue with crash-safe state transitions.
+
+    Items move ``pending -> uploading -> published | failed``; every
+    transition is committed before the next step starts, so after a crash
+    the queue shows exactly which posts may have been half-published.
+    """
+
+    def __init__(self, path=QUEUE_DB):
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def enqueue(self, product_id, target=DEFAULT_TARGET, scheduled_at=None):
+        """Add a post unless it is already queued for ``target``. Returns True if added."""
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO queue (product_id, target, state, scheduled_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(product_id), target, PENDING, scheduled_at or now, now),
+            )
+        return cur.rowcount == 1
+
+    def recover(self):
+        """Fail posts left ``uploading`` by a crashed worker.
+
+        They may or may not have reached Instagram, so they are not retried
+        automatically; after checking the feed, re-queue them with
+        ``python posting_worker.py --retry <product_id>``.
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE queue SET state = ?, last_error = ?, updated_at = ? WHERE state = ?",
+                (FAILED, "interrupted during upload", time.time(), UPLOADING),
+            )
+        return cur.rowcount
+
+    def published_since(self, target, since):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM queue WHERE target = ? AND state = ? AND updated_at >= ?",
+                (target, PUBLISHED, since),
+            ).fetchone()[0]
+
+    def claim_next(self, target=DEFAULT_TARGET, now=None):
+        """Move the earliest due pending post of ``target`` to ``uploading`` and return its id."""
+        now = now or time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT product_id FROM queue WHERE target = ? AND state = ? AND scheduled_at <= ? "
+                "ORDER BY scheduled_at, product_id LIMIT 1",
+                (target, PENDING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE queue SET state = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE product_id = ? AND target = ?",
+                (UPLOADING, now, row[0], target),
+            )
+        return row[0]
+
+    def attempts(self, product_id, target=DEFAULT_TARGET):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM queue WHERE product_id = ? AND target = ?", (str(product_id), target)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def finish(self, product_id, target, state, error=None, result=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE queue SET state = ?, last_error = ?, result = ?, updated_at = ? "
+                "WHERE product_id = ? AND target = ?",
+                (state, error, result, time.time(), str(product_id), target),
+            )
+
+    def retry(self, product_id, target=DEFAULT_TARGET, scheduled_at=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE queue SET state = ?, scheduled_at = ?, updated_at = ? WHERE product_id = ? AND target = ?",
+                (PENDING, scheduled_at or time.time(), time.time(), str(product_id), target),
+            )
+
+    def requeue(self, product_id, target=DEFAULT_TARGET):
+        """Put a failed post back to ``pending`` for now; returns False if it is not failed."""
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE queue SET state = ?, scheduled_at = ?, updated_at = ? "
+                "WHERE product_id = ? AND target = ? AND state = ?",
+                (PENDING, now, now, str(product_id), target, FAILED),
+            )
+        return cur.rowcount == 1
+
+    def failed(self):
+        """``(product_id, target, last_error)`` of the failed posts."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT product_id, target, last_error FROM queue WHERE state = ? ORDER BY updated_at", (FAILED,)
+            ).fetchall()
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state"))
+
+
+class PostingWorker:
+    """Long-running publisher that drains the queue with posts-per-window pacing.
+
+    ``targets`` maps a target name (account/slot) to a ``publish(product_id)``
+    callable; each target is paced independently.
+    """
+
+    def __init__(self, queue, targets, posts_per_window=1, window_seconds=24 * 3600, load_approved=None,
+                 on_result=None, max_attempts=3, retry_delay=3600):
+        self.queue = queue
+        self.targets = targets
+        self.posts_per_window = posts_per_window
+        self.window_seconds = window_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.load_approved = load_approved
+        self.on_result = on_result
+        self._approvals_mtime = None
+
+    def refresh(self, approvals_path=None):
+        """Enqueue approved posts; re-reads the approvals only when the file changed."""
+        if self.load_approved is None:
+            return 0
+        if approvals_path:
+            if not os.path.exists(approvals_path):
+                return 0
+            mtime = os.stat(approvals_path).st_mtime_ns
+            if mtime == self._approvals_mtime:
+                return 0
+        added = 0
+        for product_id, scheduled_at in self.load_approved():
+            for target in self.targets:
+                added += self.queue.enqueue(product_id, target, scheduled_at)
+        # Only a fully read file counts as seen; after an error the next tick reads it again
+        if approvals_path:
+            self._approvals_mtime = mtime
+        return added
+
+    def tick(self, now=None):
+        """Publish every due post the pacing allows right now. Returns the number attempted."""
+        now = now or time.time()
+        attempted = 0
+        for target, publish in self.targets.items():
+            budget = self.posts_per_window - self.queue.published_since(target, now - self.window_seconds)
+            while budget > 0:
+                product_id = self.queue.claim_next(target, now)
+                if product_id is None:
+                    break
+                attempted += 1
+                try:
+                    print(f"📤 Publishing {product_id} to {target} ...")
+                    response = publish(product_id)
+                    self.queue.finish(product_id, target, PUBLISHED, result=str(response))
+                    budget -= 1
+                    print(f"✅ Success: {response}")
+                    if self.on_result:
+                        self.on_result(product_id, target, PUBLISHED)
+                except Exception as e:
+                    # Like the one-shot scheduler's next run, try failed posts again later (bounded)
+                    self.queue.finish(product_id, target, FAILED, error=str(e))
+                    if self.queue.attempts(product_id, target) < self.max_attempts:
+                        self.queue.retry(product_id, target, scheduled_at=now + self.retry_delay)
+                    print(f"❌ Error posting {product_id} to {target}: {e}")
+                    if self.on_result:
+                        self.on_result(product_id, target, f"failed: {e}")
+        return attempted
+
+    def run(self, poll_interval=60, approvals_path=None, once=False):
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"⚠️ {recovered} post(s) were interrupted mid-upload and marked failed.")
+        while True:
+            try:
+                added = self.refresh(approvals_path)
+                if added:
+                    print(f"🔍 Queued {added} newly approved post(s)")
+                self.tick()
+            except Exception:
+                logger.exception("posting worker tick failed")
+                if once:
+                    raise
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def main():
+    import argparse
+
+    import master_scheduler
+    from settings import secrets
+
+    parser = argparse.ArgumentParser(description="Publish approved posts from a persistent queue.")
+    parser.add_argument("--posts-per-window", type=int, default=1)
+    parser.add_argument("--window-hours", type=float, default=24)
+    parser.add_argument("--poll-interval", type=float, default=60)
+    parser.add_argument("--once", action="store_true", help="run a single tick and exit")
+    parser.add_argument("--status", action="store_true", help="print queue counts and failed posts and exit")
+    parser.add_argument("--retry", metavar="PRODUCT_ID", help="re-queue a failed post and exit")
+    parser.add_argument("--target", default=DEFAULT_TARGET, help="target of the post to --retry")
+    args = parser.parse_args()
+
+    queue = PostQueue()
+    if args.status:
+        for state, count in sorted(queue.counts().items()):
+            print(f"{state:>10}: {count}")
+        for product_id, target, error in queue.failed():
+            print(f"❌ {product_id} ({target}): {error}")
+        return
+    if args.retry:
+        if queue.requeue(args.retry, args.target):
+            print(f"🔁 {args.retry} re-queued for {args.target}")
+        else:
+            print(f"❌ {args.retry} is not a failed post of {args.target}")
+        return
+
+    def load_approved():
+        for row in master_scheduler.get_approved_entries(consumer="posting_worker"):
+            product_id = str(row["product_id"])
+            if master_scheduler.already_posted(product_id):
+                continue
+            # Optional publish_at column in the approvals sheet, local time
+            scheduled = row.get("publish_at")
+            scheduled_at = None
+            if scheduled:
+                try:
+                    if not isinstance(scheduled, datetime.datetime):
+                        scheduled = datetime.datetime.fromisoformat(str(scheduled).strip())
+                    scheduled_at = scheduled.timestamp()
+                except ValueError:
+                    # Skipped, not posted early; fixing the cell changes the file and it is read again
+                    logger.warning("skipping %s: publish_at %r is not a date and time", product_id, scheduled)
+                    continue
+            yield product_id, scheduled_at
+
+    worker = PostingWorker(
+        queue,
+        {DEFAULT_TARGET: master_scheduler.upload_and_publish},
+        posts_per_window=args.posts_per_window,
+        window_seconds=args.window_hours * 3600,
+        load_approved=load_approved,
+        on_result=lambda product_id, target, status: master_scheduler.update_log(product_id, status),
+    )
+    worker.run(args.poll_interval, approvals_path=secrets["sharepoint"], once=args.once)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    main()
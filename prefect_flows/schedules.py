@@ -1,26 +1,233 @@
 # prefect_flows/schedules.py
 
-from prefect import flow
-from datetime import time
-import subprocess
+import os
+import json
+import hashlib
+import itertools
+from datetime import timedelta
 
-# ========== OLD FLOWS (Commented Out) ==========
+from prefect import flow, task, unmapped
 
-# @flow(name="Fetch Product List Flow")
-# def fetch_product_list_flow():
-#     subprocess.run(["python", "fetch_product_list.py"], check=True)
+import metrics
 
-# @flow(name="Weekly Run Flow")
-# def run_weekly_flow():
-#     subprocess.run(["python", "run_weekly.py"], check=True)
+# ========== Settings ==========
 
-# @flow(name="Daily Post Scheduler Flow")
-# def master_scheduler_flow():
-#     subprocess.run(["python", "master_scheduler.py"], check=True)
+WEEKLY_LIMIT = 7
+CAPTION_TIMEOUT = 300  # seconds per caption
+CAPTION_RETRIES = 2
+CAPTION_CACHE_DAYS = 14
+CAPTION_REGENERATIONS = 2  # new captions for one the quality check rejected
 
 
-# ========== NEW RECIPE POSTING FLOW ==========
+def caption_cache_key(context, parameters):
+    """Cache key from the product content and the caption model/prompt, not the run.
+
+    Regenerations after a rejection run with ``refresh_cache`` and replace
+    the entry. The product's post history status is part of the key, so a
+    caption that was finally rejected (the product is logged as failed) is
+    not reused if the product comes up again.
+    """
+    from settings import secrets
+    from llm.generate_caption import caption_model
+    from post_history import get_history
+
+    product = parameters["product"]
+    content = {
+        "id": product.get("id"),
+        "titel": product.get("titel"),
+        "description": product.get("description"),
+        "model": caption_model(),
+        "prompt": secrets.get("prompt"),
+        "status": get_history().latest_status(product.get("id")),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ========== Tasks ==========
+
+@task(retries=3, retry_delay_seconds=60)
+def fetch_products():
+    from fetch_product_list import sync_product_data
+
+    return sync_product_data().summary()
+
+
+@task
+def select_products():
+    import pandas as pd
+    from run_weekly import encoding
+    from post_history import get_history
+    from candidate_selection import select_candidates
+
+    products = pd.read_csv("data/product_list.csv", sep=';', encoding=encoding, dtype=str, keep_default_na=False)
+    selected, timings = select_candidates(products, posted_ids=get_history().ids())
+    print("⏱️ Candidate selection: " + ", ".join(f"{k} {v * 1000:.1f}ms" for k, v in timings.items()))
+    return selected.to_dict(orient="records")
+
+
+@task(retries=CAPTION_RETRIES, retry_delay_seconds=30, cache_key_fn=caption_cache_key,
+      cache_expiration=timedelta(days=CAPTION_CACHE_DAYS), persist_result=True)
+def generate_product_caption(product, timeout=CAPTION_TIMEOUT, feedback=None):
+    from llm.generate_caption import generate_caption
+
+    return generate_caption(product.get("description"), product.get("titel"), product.get("id"), timeout=timeout,
+                            feedback=feedback)
+
+
+# Regenerations after a rejection replace the task's cached caption instead of reading it
+regenerate_caption = generate_product_caption.with_options(refresh_cache=True)
+
+
+@task
+def resolve_product_images(products):
+    """Write the image URLs of ``products`` after one concurrent check.
+
+    Returns ``(image_urls, errors)``, both by product id; a product the shop
+    serves no image for is in ``errors`` and is not captioned.
+    """
+    from run_weekly import prefetch_image_checks, write_image_urls
+
+    prefetch_image_checks(products)
+    image_urls, errors = {}, {}
+    for product in products:
+        try:
+            image_urls[product["id"]] = write_image_urls(product)
+        except Exception as e:
+            errors[product["id"]] = str(e)
+    return image_urls, errors
+
+
+@task
+def write_caption_file(product, caption):
+    from run_weekly import write_text_atomic
+
+    write_text_atomic(os.path.join("output", product["id"], "caption.txt"), caption)
+
+
+@task(retries=2, retry_delay_seconds=30)
+def export_approvals(writer):
+    from settings import secrets
+
+    writer.flush()
+    return writer.export_excel(secrets["sharepoint"])
+
+
+# Not retried: a publish that failed after the container was created may
+# already be live, so it is logged as failed and left for a manual check.
+@task
+def publish_product(product_id):
+    from master_scheduler import upload_and_publish
+
+    return upload_and_publish(product_id)
+
+
+# ========== Flows ==========
+
+@flow(name="Weekly Product Pipeline")
+@metrics.run("weekly")
+def weekly_product_pipeline(limit: int = WEEKLY_LIMIT, max_workers: int = None, fetch: bool = True):
+    """fetch -> select -> images -> caption -> approve, in one process.
+
+    Images are resolved first, so only products with a servable image use
+    LLM calls. Captions are generated ``max_workers`` at a time; a product whose
+    caption still fails after its retries, or is still rejected by the
+    quality gate after its regenerations, is replaced by the next candidate.
+    """
+    from run_weekly import PENDING_APPROVALS_CSV, caption_workers, caption_check, log_post
+    from approvals import ApprovalsWriter
+    from caption_quality import get_gate
+    from llm.generate_caption import discard_caption
+
+    max_workers = max_workers or caption_workers()
+    if fetch:
+        print(f"🔄 Product feed: {fetch_products()}")
+    candidates = iter(select_products())
+
+    gate = get_gate()
+    check = caption_check(gate)
+
+    def rejected(product, caption):
+        # Problems of a generated caption; a rejected one is dropped from the caption cache
+        if isinstance(caption, BaseException):
+            return []
+        problems = check(product, caption)
+        if problems:
+            discard_caption(product.get("description"), product.get("titel"), product["id"])
+        return problems
+
+    writer = ApprovalsWriter(PENDING_APPROVALS_CSV)
+    os.makedirs("output", exist_ok=True)
+    prepared = 0
+    while prepared < limit:
+        batch = list(itertools.islice(candidates, min(limit - prepared, max_workers)))
+        if not batch:
+            break
+
+        # Only products with a servable image are captioned
+        image_urls, errors = resolve_product_images(batch)
+        for product_id, error in errors.items():
+            log_post(product_id, f"failed: {error}")
+        batch = [product for product in batch if product["id"] in image_urls]
+
+        futures = generate_product_caption.map(batch, timeout=unmapped(CAPTION_TIMEOUT))
+        for product, future in zip(batch, futures):
+            product_id = product["id"]
+            caption = future.result(raise_on_failure=False)
+            problems = rejected(product, caption)
+            for _ in range(CAPTION_REGENERATIONS if problems else 0):
+                caption = regenerate_caption(product, timeout=CAPTION_TIMEOUT, feedback=problems,
+                                             return_state=True).result(raise_on_failure=False)
+                problems = rejected(product, caption)
+                if not problems:
+                    break
+            if isinstance(caption, BaseException) or problems:
+                error = caption if isinstance(caption, BaseException) else "; ".join(problems)
+                log_post(product_id, f"failed: {error}")
+                continue
+            try:
+                write_caption_file(product, caption)
+            except Exception as e:
+                log_post(product_id, f"failed: {e}")
+                continue
+            writer.add(product_id, product.get("titel"), product.get("description"), caption.strip(),
+                       image_urls[product_id])
+            log_post(product_id, "prepared")
+            gate.accept(product_id, caption)
+            prepared += 1
+            print(f"✅ Prepared {product_id}")
+
+    if len(writer):
+        added, updated = export_approvals(writer)
+        print(f"✅ Approvals exported ({added} added, {updated} updated)")
+    return prepared
+
+
+@flow(name="Daily Post Scheduler Flow")
+@metrics.run("scheduler")
+def master_scheduler_flow():
+    """Publish the first approved product that has not been published yet."""
+    from master_scheduler import get_approved_entries, already_posted, update_log
+
+    approved = get_approved_entries()
+    print(f"🔍 Approved entries found: {len(approved)}")
+    for row in approved:
+        product_id = row["product_id"]
+        if already_posted(product_id):
+            continue
+        response = publish_product(product_id, return_state=True)
+        if response.is_completed():
+            update_log(product_id, "published")
+            print(f"✅ Success: {response.result()}")
+            return product_id
+        error = response.result(raise_on_failure=False)
+        print(f"❌ Error posting {product_id}: {error}")
+        update_log(product_id, f"failed: {error}")
+    return None
+
 
 @flow(name="Weekly Recipe Instagram Post")
 def post_recipe_flow_wrapper():
-    subprocess.run(["python", "post_recipe_flow.py"], check=True)
+    from rezept_automation import post_recipe_flow
+
+    post_recipe_flow()
+
@@ -0,0 +1,140 @@
+import json
+import time
+
+from sqlite_store import open_db, shared
+
+JOURNAL_DB = "data/prepare_journal.sqlite3"
+
+# Steps of a product in a weekly preparation run, in order
+SELECTED, IMAGES, CAPTIONED, APPROVAL, FAILED = "selected", "images", "captioned", "approval", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    candidates TEXT NOT NULL,
+    cursor INTEGER NOT NULL DEFAULT 0,
+    started REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    step TEXT NOT NULL,
+    image_urls TEXT,
+    caption TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (run_id, product_id)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = ("product_id", "seq", "step", "image_urls", "caption", "error", "updated")
+
+
+class PrepareJournal:
+    """Write-ahead journal of the weekly preparation run.
+
+    A run stores its candidate order once, so a restarted run takes the same
+    candidates instead of a new random selection. Each product moves through
+    ``selected`` -> ``images`` -> ``captioned`` -> ``approval`` (or
+    ``failed``); a step is recorded after its output is on disk, with the
+    image URLs and caption kept here too, so a resumed run skips the steps a
+    product already finished. A run stays open until ``finish``.
+    """
+
+    def __init__(self, path=JOURNAL_DB):
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def open_run(self):
+        """Id of the unfinished run, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM runs WHERE finished IS NULL ORDER BY run_id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def start(self, candidate_ids):
+        """Open a new run over ``candidate_ids`` in selection order."""
+        with self._lock, self._conn:
+            cur = self._conn.execute("INSERT INTO runs (candidates, started) VALUES (?, ?)",
+                                     (json.dumps([str(i) for i in candidate_ids]), time.time()))
+        return cur.lastrowid
+
+    def take(self, run_id, count):
+        """The next ``count`` candidate ids of the run, recorded as ``selected``."""
+        with self._lock, self._conn:
+            candidates, cursor = self._conn.execute(
+                "SELECT candidates, cursor FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            taken = json.loads(candidates)[cursor:cursor + count]
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (run_id, product_id, seq, step, updated) VALUES (?, ?, ?, ?, ?)",
+                ((run_id, product_id, cursor + i, SELECTED, now) for i, product_id in enumerate(taken)),
+            )
+            self._conn.execute("UPDATE runs SET cursor = ? WHERE run_id = ?", (cursor + len(taken), run_id))
+        return taken
+
+    def items(self, run_id):
+        """``{product_id: entry}`` of the products taken so far, in selection order."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM items WHERE run_id = ? ORDER BY seq", (run_id,)).fetchall()
+        items = {}
+        for row in rows:
+            entry = dict(zip(COLUMNS, row))
+            entry["image_urls"] = json.loads(entry["image_urls"]) if entry["image_urls"] else None
+            items[entry["product_id"]] = entry
+        return items
+
+    def record(self, run_id, product_id, step, image_urls=None, caption=None, error=None):
+        """Move a product to ``step``; image URLs and caption are kept unless given again."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE items SET step = ?, image_urls = COALESCE(?, image_urls), caption = COALESCE(?, caption), "
+                "error = ?, updated = ? WHERE run_id = ? AND product_id = ?",
+                (step, json.dumps(image_urls) if image_urls is not None else None, caption, error, time.time(),
+                 run_id, str(product_id)),
+            )
+
+    def finish(self, run_id):
+        """Close the run once its approval rows are written; the next run selects anew."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE items SET step = ?, updated = ? WHERE run_id = ? AND step = ?",
+                               (APPROVAL, now, run_id, CAPTIONED))
+            self._conn.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (now, run_id))
+
+    def counts(self, run_id):
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT step, COUNT(*) FROM items WHERE run_id = ? GROUP BY step", (run_id,)))
+
+
+@shared
+def get_journal(path=JOURNAL_DB):
+    """Shared journal per database path; opened once per process."""
+    return PrepareJournal(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or abandon the unfinished weekly preparation run.")
+    parser.add_argument("--abandon", action="store_true",
+                        help="close the unfinished run, so the next run selects new candidates")
+    args = parser.parse_args()
+
+    journal = get_journal()
+    run_id = journal.open_run()
+    if run_id is None:
+        print("✅ No unfinished preparation run.")
+    elif args.abandon:
+        journal.finish(run_id)
+        print(f"🗑️ Run {run_id} closed ({journal.counts(run_id)}).")
+    else:
+        print(f"⏸️ Run {run_id} is unfinished and resumes on the next run: {journal.counts(run_id)}")
+        for product_id, entry in journal.items(run_id).items():
+            print(f"   {product_id}: {entry['step']}" + (f" ({entry['error']})" if entry["error"] else ""))
@@ -0,0 +1,217 @@
+import os
+import csv
+import json
+import time
+import math
+import hashlib
+from dataclasses import dataclass, field
+
+from sqlite_store import open_db
+
+PRODUCT_DB = "data/products.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    status TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    columns TEXT,
+    added INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_run INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    run_id INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    change TEXT NOT NULL,
+    PRIMARY KEY (run_id, product_id)
+) WITHOUT ROWID;
+"""
+
+ADDED, CHANGED, REMOVED = "added", "changed", "removed"
+
+
+@dataclass
+class Delta:
+    run_id: int
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self):
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def row_hash(values):
+    """Content hash of one product row; stable across runs and library versions."""
+    text = "\x1f".join("" if v is None else str(v) for v in values)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ProductStore:
+    """Local product table synced from the feed by content-hash deltas.
+
+    Every sync is a run; the products that were added, changed or removed in
+    a run are recorded so downstream steps can ask what changed since a given
+    run instead of rescanning the catalogue.
+    """
+
+    def __init__(self, path=PRODUCT_DB):
+        self.path = path
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def latest_run(self, status=None):
+        query = "SELECT run_id, started, status, etag, last_modified, columns FROM runs"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY run_id DESC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        keys = ("run_id", "started", "status", "etag", "last_modified", "columns")
+        run = dict(zip(keys, row))
+        run["columns"] = json.loads(run["columns"]) if run["columns"] else []
+        return run
+
+    def feed_validators(self):
+        """ETag and Last-Modified of the last feed that was applied."""
+        run = self.latest_run(status="applied")
+        if not run:
+            return None, None
+        return run["etag"], run["last_modified"]
+
+    def record_unchanged(self, etag=None, last_modified=None):
+        """Record a run where the feed was not modified (HTTP 304)."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO runs (started, status, etag, last_modified) VALUES (?, 'unchanged', ?, ?)",
+                (time.strftime("%Y-%m-%d %H:%M:%S"), etag, last_modified),
+            )
+        return Delta(cur.lastrowid)
+
+    def apply_snapshot(self, chunks, etag=None, last_modified=None):
+        """Diff a full feed (an iterable of DataFrames) against the store and apply only the delta."""
+        with self._lock:
+            known = dict(self._conn.execute("SELECT id, hash FROM products"))
+
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO runs (started, status) VALUES (?, 'running')",
+                (time.strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+            delta = Delta(cur.lastrowid)
+            seen = set()
+            columns = None
+
+            for chunk in chunks:
+                if columns is None:
+                    columns = list(chunk.columns)
+                    id_index = columns.index("id")
+                upserts = []
+                for values in chunk.itertuples(index=False, name=None):
+                    values = [_clean(v) for v in values]
+                    product_id = values[id_index]
+                    if product_id is None or product_id in seen:
+                        continue
+                    seen.add(product_id)
+                    digest = row_hash(values)
+                    previous = known.get(product_id)
+                    if previous == digest:
+                        continue
+                    (delta.added if previous is None else delta.changed).append(product_id)
+                    upserts.append((product_id, digest, json.dumps(dict(zip(columns, values)), ensure_ascii=False),
+                                    delta.run_id))
+                self._conn.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)", upserts)
+
+            if columns is None:
+                # Rolls the run back instead of deleting the whole catalogue
+                raise ValueError("Product feed is empty, store left unchanged.")
+            delta.removed = [product_id for product_id in known if product_id not in seen]
+            self._conn.executemany("DELETE FROM products WHERE id = ?", [(p,) for p in delta.removed])
+            self._conn.executemany(
+                "INSERT INTO changes (run_id, product_id, change) VALUES (?, ?, ?)",
+                [(delta.run_id, p, ADDED) for p in delta.added]
+                + [(delta.run_id, p, CHANGED) for p in delta.changed]
+                + [(delta.run_id, p, REMOVED) for p in delta.removed],
+            )
+            self._conn.execute(
+                "UPDATE runs SET status = 'applied', etag = ?, last_modified = ?, columns = ?, "
+                "added = ?, changed = ?, removed = ? WHERE run_id = ?",
+                (etag, last_modified, json.dumps(columns or []), len(delta.added), len(delta.changed),
+                 len(delta.removed), delta.run_id),
+            )
+        return delta
+
+    def changed_since(self, run_id, changes=(ADDED, CHANGED)):
+        """Ids of products added/changed (by default) in any run after ``run_id``."""
+        placeholders = ",".join("?" for _ in changes)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT product_id FROM changes WHERE run_id > ? AND change IN ({placeholders})",
+                (run_id, *changes),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get(self, product_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM products WHERE id = ?", (product_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def export_csv(self, csv_path, encoding="latin-1"):
+        """Write the whole store as the legacy ``product_list.csv`` (atomically)."""
+        run = self.latest_run(status="applied")
+        columns = run["columns"] if run else []
+        tmp_path = csv_path + ".tmp"
+        with self._lock, open(tmp_path, "w", newline="", encoding=encoding, errors="replace") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(columns)
+            for (data,) in self._conn.execute("SELECT data FROM products ORDER BY id"):
+                row = json.loads(data)
+                writer.writerow(["" if row.get(col) is None else row.get(col) for col in columns])
+        os.replace(tmp_path, csv_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the local product store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("runs", help="list recent sync runs")
+    since = sub.add_parser("changed-since", help="print ids added or changed after a run")
+    since.add_argument("run_id", type=int)
+    since.add_argument("--include-removed", action="store_true")
+    args = parser.parse_args()
+
+    store = ProductStore()
+    if args.command == "runs":
+        for row in store._conn.execute(
+            "SELECT run_id, started, status, added, changed, removed FROM runs ORDER BY run_id DESC LIMIT 20"
+        ):
+            print("{:>5}  {}  {:<9}  +{} ~{} -{}".format(*row))
+    elif args.command == "changed-since":
+        changes = (ADDED, CHANGED, REMOVED) if args.include_removed else (ADDED, CHANGED)
+        for product_id in sorted(store.changed_since(args.run_id, changes)):
+            print(product_id)
@@ -0,0 +1,308 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from sqlite_store import shared
+
+logger = logging.getLogger(__name__)
+
+INSTAGRAM, FACEBOOK = "instagram", "facebook"
+DEFAULT_TARGET = "default"
+CALLS_PER_SECOND = 5.0
+BURST = 10
+MAX_CONCURRENCY = 10  # concurrent media uploads per target (a carousel has at most 10 items)
+
+
+@dataclass
+class Post:
+    post_id: str
+    caption: str
+    image_urls: list
+    kind: str = "product"
+
+
+@dataclass
+class PublishResult:
+    target: str
+    response: object = None
+    error: Exception = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class PublishError(Exception):
+    """Raised when some targets failed; ``results`` has the outcome of every target."""
+
+    def __init__(self, results):
+        failed = {r.target: r.error for r in results.values() if not r.ok}
+        super().__init__("; ".join(f"{target}: {error}" for target, error in failed.items()))
+        self.results = results
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average with bursts of up to ``capacity``."""
+
+    def __init__(self, rate=CALLS_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Target:
+    """One account a post is published to.
+
+    ``steps(post)`` is a generator: it yields lists of media ids that must
+    be processed before it can continue, receives the ids that did not get
+    ready in time (or has the processing error of its own media raised at
+    the yield), and returns the publish response. The ``Publisher`` polls
+    the ids of all targets that share a Graph client together.
+    """
+
+    platform = None
+
+    def __init__(self, name, client, calls_per_second=CALLS_PER_SECOND, burst=BURST,
+                 max_concurrency=MAX_CONCURRENCY):
+        self.name = name
+        self.client = client
+        self.bucket = TokenBucket(calls_per_second, burst)
+        self.max_concurrency = max_concurrency
+
+    def call(self, fn, *args, **kwargs):
+        self.bucket.acquire()
+        return fn(*args, **kwargs)
+
+    def map(self, fn, items):
+        """``fn`` over ``items`` with at most ``max_concurrency`` in flight, results in order."""
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items)),
+                                thread_name_prefix=f"publish-{self.name}") as pool:
+            return list(pool.map(fn, items))
+
+    def steps(self, post):
+        raise NotImplementedError
+
+
+class InstagramTarget(Target):
+    platform = INSTAGRAM
+
+    def __init__(self, name, client, ig_user_id, **limits):
+        super().__init__(name, client, **limits)
+        self.ig_user_id = ig_user_id
+
+    def _create(self, **params):
+        return self.call(self.client.create_container, self.ig_user_id, **params)
+
+    def steps(self, post):
+        if len(post.image_urls) == 1:
+            creation_id = self._create(image_url=post.image_urls[0], caption=post.caption)
+            if (yield [creation_id]):
+                raise Exception(f"Media {creation_id} not ready in time.")
+            return self.call(self.client.publish, self.ig_user_id, creation_id)
+
+        media_ids = self.map(lambda url: self._create(image_url=url, is_carousel_item="true"), post.image_urls)
+        not_ready = yield media_ids
+        if not_ready:
+            raise Exception(f"Media {sorted(not_ready)} not ready in time.")
+        carousel_id = self._create(children=",".join(media_ids), media_type="CAROUSEL", caption=post.caption)
+        if (yield [carousel_id]):
+            raise Exception(f"Carousel {carousel_id} not ready in time.")
+        return self.call(self.client.publish, self.ig_user_id, carousel_id)
+
+
+class FacebookPageTarget(Target):
+    platform = FACEBOOK
+
+    def __init__(self, name, client, page_id, **limits):
+        super().__init__(name, client, **limits)
+        self.page_id = page_id
+
+    def steps(self, post):
+        # Page photos need no processing wait, so this generator never yields
+        yield from ()
+        if len(post.image_urls) == 1:
+            with metrics.timer("publish"):
+                return self.call(self.client.post, f"{self.page_id}/photos", idempotent=False,
+                                 url=post.image_urls[0], caption=post.caption)
+        with metrics.timer("upload"):
+            photo_ids = self.map(
+                lambda url: self.call(self.client.post, f"{self.page_id}/photos", url=url, published="false")["id"],
+                post.image_urls,
+            )
+        attached = {f"attached_media[{i}]": f'{{"media_fbid":"{photo_id}"}}' for i, photo_id in enumerate(photo_ids)}
+        with metrics.timer("publish"):
+            return self.call(self.client.post, f"{self.page_id}/feed", idempotent=False, message=post.caption,
+                             **attached)
+
+
+class Publisher:
+    """Publishes one post to several targets concurrently.
+
+    All targets advance step by step in parallel; between steps the media
+    ids of every target are polled in one batched request per Graph client,
+    so the total time follows the slowest target. Each target's outcome is
+    reported to ``on_result(post, target_name, status)`` on its own.
+    """
+
+    def __init__(self, targets, on_result=None, poll_timeout=60):
+        self.targets = {target.name: target for target in targets}
+        self.on_result = on_result
+        self.poll_timeout = poll_timeout
+
+    def _advance(self, name, gen, value, started):
+        """Run one step of a target: ``("wait", ids)``, ``("done", response)`` or ``("failed", error)``."""
+        try:
+            return "wait", gen.throw(value) if isinstance(value, Exception) else gen.send(value)
+        except StopIteration as stop:
+            return "done", stop.value
+        except Exception as e:
+            logger.warning("publish to %s failed after %.1fs: %s", name, time.monotonic() - started, e)
+            return "failed", e
+
+    def publish(self, post, targets=None):
+        """``{target_name: PublishResult}`` for ``targets`` (default: all); failures are in the results."""
+        # An empty list means no targets, e.g. a post that is already out everywhere
+        names = list(self.targets if targets is None else targets)
+        started = time.monotonic()
+        running = {name: self.targets[name].steps(post) for name in names}
+        values = dict.fromkeys(names)
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="publish") as pool:
+            while running:
+                outcomes = dict(zip(running, pool.map(
+                    lambda name: self._advance(name, running[name], values[name], started), list(running))))
+
+                waiting = {}
+                for name, (state, value) in outcomes.items():
+                    if state == "wait":
+                        waiting[name] = value
+                        continue
+                    del running[name]
+                    result = PublishResult(name, response=value if state == "done" else None,
+                                           error=value if state == "failed" else None,
+                                           elapsed=time.monotonic() - started)
+                    results[name] = result
+                    self._report(post, result)
+
+                # Shared readiness polling: one status loop per client for all its targets
+                by_client = {}
+                for name, media_ids in waiting.items():
+                    by_client.setdefault(id(self.targets[name].client), []).append(name)
+                polled = dict(pool.map(
+                    lambda group: (group, self._poll(group, waiting)), [tuple(g) for g in by_client.values()]))
+                for group, (pending, failed) in polled.items():
+                    for name in group:
+                        errored = [m for m in waiting[name] if m in failed]
+                        if errored:
+                            # Only the target that owns the broken container fails
+                            values[name] = Exception(f"Media {errored[0]} failed processing: {failed[errored[0]]}")
+                        else:
+                            values[name] = {m for m in waiting[name] if m in pending}
+        return results
+
+    def _poll(self, names, waiting):
+        """``(not_ready, failed)`` of the media ids the targets ``names`` wait for."""
+        client = self.targets[names[0]].client
+        media_ids = [media_id for name in names for media_id in waiting[name]]
+        if not media_ids:
+            return set(), {}
+        try:
+            return client.poll_ready(media_ids, timeout=self.poll_timeout)
+        except Exception as e:
+            # Status requests themselves failed: nothing of this client is known to be ready
+            logger.warning("readiness polling failed: %s", e)
+            return set(media_ids), {}
+
+    def _report(self, post, result):
+        metrics.count("targets.published" if result.ok else "targets.failed")
+        status = "published" if result.ok else f"failed: {result.error}"
+        print(f"{'✅' if result.ok else '❌'} {post.post_id} -> {result.target}: "
+              f"{result.response if result.ok else result.error} ({result.elapsed:.1f}s)")
+        if self.on_result:
+            self.on_result(post, result.target, status)
+
+
+def targets_from_config(secrets, pool_size=10):
+    """Targets from ``secrets["targets"]``, or the single Instagram account of ``access_token``/``ig_user_id``.
+
+    Each target entry has ``name``, ``platform`` (``instagram`` or
+    ``facebook``), ``access_token``, ``ig_user_id`` or ``page_id``, and
+    optionally ``calls_per_second``, ``burst`` and ``max_concurrency``.
+    """
+    import graph_api
+
+    entries = secrets.get("targets") or [{
+        "name": DEFAULT_TARGET,
+        "platform": INSTAGRAM,
+        "access_token": secrets["access_token"],
+        "ig_user_id": secrets["ig_user_id"],
+    }]
+    targets = []
+    for entry in entries:
+        client = graph_api.get_graph(entry["access_token"], entry.get("graph_api_url") or secrets.get("graph_api_url"),
+                                     pool_size=pool_size)
+        limits = {key: entry[key] for key in ("calls_per_second", "burst", "max_concurrency") if key in entry}
+        platform = entry.get("platform", INSTAGRAM)
+        if platform == INSTAGRAM:
+            targets.append(InstagramTarget(entry["name"], client, entry["ig_user_id"], **limits))
+        elif platform == FACEBOOK:
+            targets.append(FacebookPageTarget(entry["name"], client, entry["page_id"], **limits))
+        else:
+            raise ValueError(f"Unknown platform {platform!r} for target {entry['name']!r}")
+    return targets
+
+
+def log_to_history(post, target, status):
+    from post_history import get_history, target_kind
+
+    get_history().record(post.post_id, status, kind=target_kind(post.kind, target))
+
+
+@shared
+def get_publisher():
+    """Process-wide publisher for the configured targets, logging each target's result to the post history."""
+    from settings import secrets
+
+    return Publisher(targets_from_config(secrets), on_result=log_to_history)
+
+
+def publish_pending(post):
+    """Publish ``post`` to the targets it has not been published to yet.
+
+    Returns ``{target: response}``; raises ``PublishError`` if any target
+    failed, so the caller retries later and only the failed targets are
+    published again.
+    """
+    from post_history import get_history, target_kind
+
+    publisher = get_publisher()
+    history = get_history()
+    pending = [name for name in publisher.targets
+               if not history.is_published(post.post_id, kind=target_kind(post.kind, name))]
+    if not pending:
+        return {}
+    results = publisher.publish(post, pending)
+    if any(not r.ok for r in results.values()):
+        raise PublishError(results)
+    return {name: r.response for name, r in results.items()}
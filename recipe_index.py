@@ -0,0 +1,169 @@
+import os
+import hashlib
+
+from llm.preprocess import clean_html
+from sqlite_store import open_db, shared
+
+RECIPE_DB = "data/recipe_index.sqlite3"
+ERP_ENCODING = "cp850"
+# Bump when the stored columns or the ingredient cleaning change, to force a rebuild
+INDEX_VERSION = "2"
+
+MARKETING_COLUMNS = ["NUMMER", "TEXT_KZ"]
+TEXT_COLUMNS = ["TEXTNR", "STICHWORT", "INTERNET", "BANAME"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    nummer TEXT PRIMARY KEY,
+    text_kz TEXT,
+    stichwort TEXT,
+    name TEXT,
+    ingredients TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+
+def clean_ingredients_from_html(html):
+    return clean_html(html)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_recipe_rows(marketing_csv, text_csv, encoding=ERP_ENCODING):
+    """Recipe rows (``R...`` numbers with web text, no ``fr`` keywords) from the two ERP exports.
+
+    Only the needed columns are parsed, and the marketing table is reduced
+    to recipe numbers before the join.
+    """
+    import pandas as pd
+
+    mar = pd.read_csv(marketing_csv, sep=";", encoding=encoding, usecols=MARKETING_COLUMNS, dtype=str)
+    mar = mar[mar["NUMMER"].str.startswith("R", na=False)]
+    is_text = pd.read_csv(text_csv, sep=";", encoding=encoding, usecols=TEXT_COLUMNS, dtype=str)
+    recipes = mar.merge(is_text, left_on="TEXT_KZ", right_on="TEXTNR", how="inner")
+    recipes = recipes[recipes["INTERNET"].notna()]
+    recipes = recipes[~recipes["STICHWORT"].str.contains(r"^fr", case=False, na=False, regex=True)]
+    return recipes.drop_duplicates("NUMMER")
+
+
+class RecipeIndex:
+    """Recipe lookup table precomputed from the ERP CSV exports.
+
+    The exports are only re-parsed when their mtime/size changes and their
+    content hash differs from the last build; otherwise ``get`` is a primary
+    key lookup in ``data/recipe_index.sqlite3``.
+    """
+
+    def __init__(self, marketing_csv, text_csv, path=RECIPE_DB, encoding=ERP_ENCODING):
+        self.sources = [marketing_csv, text_csv]
+        self.encoding = encoding
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _recorded(self):
+        rows = self._conn.execute("SELECT path, mtime_ns, size, sha256 FROM sources").fetchall()
+        return {path: (mtime_ns, size, sha256) for path, mtime_ns, size, sha256 in rows}
+
+    def _stale(self):
+        """Current ``{path: (mtime_ns, size, sha256)}`` and whether the index must be rebuilt."""
+        version = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        recorded = self._recorded()
+        current = {}
+        stale = version is None or version[0] != INDEX_VERSION
+        for path in self.sources:
+            stat = os.stat(path)
+            known = recorded.get(os.path.abspath(path))
+            if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                current[path] = known
+                continue
+            # Touched or copied again: only a content change triggers a rebuild
+            sha256 = file_digest(path)
+            current[path] = (stat.st_mtime_ns, stat.st_size, sha256)
+            if not known or known[2] != sha256:
+                stale = True
+        return current, stale
+
+    def refresh(self, force=False):
+        """Rebuild the index if the sources changed. Returns True if it was rebuilt."""
+        with self._lock:
+            current, stale = self._stale()
+            if stale or force:
+                recipes = load_recipe_rows(*self.sources, encoding=self.encoding)
+                with self._conn:
+                    self._conn.execute("DELETE FROM recipes")
+                    self._conn.executemany(
+                        "INSERT INTO recipes (nummer, text_kz, stichwort, name, ingredients) VALUES (?, ?, ?, ?, ?)",
+                        (
+                            (row.NUMMER, row.TEXT_KZ, row.STICHWORT, row.BANAME,
+                             clean_ingredients_from_html(row.INTERNET))
+                            for row in recipes.itertuples(index=False)
+                        ),
+                    )
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                                       (INDEX_VERSION,))
+            with self._conn:
+                self._conn.execute("DELETE FROM sources")
+                self._conn.executemany(
+                    "INSERT INTO sources (path, mtime_ns, size, sha256) VALUES (?, ?, ?, ?)",
+                    ((os.path.abspath(path), *values) for path, values in current.items()),
+                )
+        return stale or force
+
+    def get(self, nummer):
+        """Recipe ``{"nummer", "text_kz", "stichwort", "name", "ingredients"}`` or None."""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT nummer, text_kz, stichwort, name, ingredients FROM recipes WHERE nummer = ?", (nummer,)
+            )
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip(("nummer", "text_kz", "stichwort", "name", "ingredients"), row))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+
+@shared
+def get_index(marketing_csv, text_csv, path=RECIPE_DB):
+    """Process-wide index for the given exports, refreshed on first use."""
+    index = RecipeIndex(marketing_csv, text_csv, path)
+    index.refresh()
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the recipe index from the ERP exports.")
+    parser.add_argument("marketing_csv", help="V2AR1001.csv")
+    parser.add_argument("text_csv", help="V4AR1005.csv")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the exports are unchanged")
+    parser.add_argument("--show", metavar="NUMMER", help="print one recipe, e.g. R944")
+    args = parser.parse_args()
+
+    index = RecipeIndex(args.marketing_csv, args.text_csv)
+    rebuilt = index.refresh(force=args.force)
+    print(f"{'🔄 Rebuilt' if rebuilt else '✅ Up to date'}: {len(index)} recipes")
+    if args.show:
+        recipe = index.get(args.show)
+        print(recipe if recipe else f"❌ Recipe {args.show} not found.")
@@ -0,0 +1,130 @@
+import time
+
+from sqlite_store import open_db, shared
+
+READY_DB = "data/recipe_ready.sqlite3"
+
+READY, PUBLISHING, PUBLISHED, FAILED = "ready", "publishing", "published", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ready (
+    rezept_id TEXT PRIMARY KEY,
+    nummer TEXT,
+    caption TEXT,
+    image_url TEXT,
+    state TEXT NOT NULL,
+    last_error TEXT,
+    prepared_at REAL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ready_state ON ready (state);
+"""
+
+COLUMNS = ("rezept_id", "nummer", "caption", "image_url", "state", "last_error", "prepared_at", "updated_at")
+
+
+class RecipeReadyQueue:
+    """Pregenerated recipe posts waiting for the weekly publish slot.
+
+    The pregeneration flow stores validated captions and image URLs as
+    ``ready`` (or ``failed`` with the reason); the Sunday flow claims one
+    ready recipe, publishes it and marks it ``published``.
+    """
+
+    def __init__(self, path=READY_DB):
+        self._conn, self._lock = open_db(path, SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def put(self, rezept_id, nummer, caption, image_url):
+        """Store a validated post as ``ready``, replacing an earlier failed or ready entry."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ready (rezept_id, nummer, caption, image_url, state, last_error, "
+                "prepared_at, updated_at) VALUES (?, ?, ?, ?, ?, NULL, ?, ?)",
+                (str(rezept_id), nummer, caption, image_url, READY, now, now),
+            )
+
+    def fail(self, rezept_id, error, nummer=None):
+        """Record why a recipe could not be prepared; a ready entry is left untouched."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO ready (rezept_id, nummer, state, last_error, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (rezept_id) DO UPDATE SET last_error = excluded.last_error, "
+                "updated_at = excluded.updated_at WHERE state = ?",
+                (str(rezept_id), nummer, FAILED, str(error), time.time(), FAILED),
+            )
+
+    def states(self):
+        """``{rezept_id: state}`` for every recipe the queue knows about."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT rezept_id, state FROM ready"))
+
+    def captions(self, state=PUBLISHED):
+        """``{rezept_id: caption}`` of the recipes in ``state``."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT rezept_id, caption FROM ready WHERE state = ? AND caption IS NOT NULL", (state,)))
+
+    def claim(self, rezept_ids):
+        """Move the first ready recipe in ``rezept_ids`` order to ``publishing`` and return it as a dict."""
+        order = [str(rid) for rid in rezept_ids]
+        if not order:
+            return None
+        placeholders = ", ".join("?" * len(order))
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM ready WHERE state = ? AND rezept_id IN ({placeholders})",
+                (READY, *order),
+            ).fetchall()
+            if not rows:
+                return None
+            row = min(rows, key=lambda r: order.index(r[0]))
+            self._conn.execute(
+                "UPDATE ready SET state = ?, updated_at = ? WHERE rezept_id = ?", (PUBLISHING, time.time(), row[0])
+            )
+        return dict(zip(COLUMNS, row))
+
+    def finish(self, rezept_id, state, error=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE ready SET state = ?, last_error = ?, updated_at = ? WHERE rezept_id = ?",
+                (state, error, time.time(), str(rezept_id)),
+            )
+
+    def requeue(self, rezept_id):
+        """Put a recipe left ``publishing`` by an interrupted run back to ``ready``."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE ready SET state = ?, updated_at = ? WHERE rezept_id = ? AND state = ?",
+                (READY, time.time(), str(rezept_id), PUBLISHING),
+            )
+        return cur.rowcount == 1
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM ready GROUP BY state"))
+
+
+@shared
+def get_queue(path=READY_DB):
+    """Shared queue per database path; opened once per process."""
+    return RecipeReadyQueue(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the pregenerated recipe queue.")
+    parser.add_argument("--retry", metavar="REZEPT_ID", help="put a recipe stuck in publishing back to ready")
+    args = parser.parse_args()
+
+    queue = get_queue()
+    if args.retry:
+        if not queue.requeue(args.retry):
+            print(f"❌ R{args.retry} is not publishing.")
+    for rezept_id, state in sorted(queue.states().items()):
+        print(f"R{rezept_id}: {state}")
+    print(queue.counts())
@@ -1,30 +1,34 @@
-import pandas as pd
 import re
 import urllib.parse
-import requests
-import json
-import time
+import logging
 import os
 from datetime import datetime
 from prefect import flow
 
-import ollama
+from publisher import Post, publish_pending
+from llm.ollama_client import get_client
+from llm.caption_cache import get_cache, cache_key
+from post_history import get_history, RECIPE
+from recipe_index import get_index
+from recipe_queue import get_queue, PUBLISHED, FAILED
+from llm.batch import generate_checked_captions
+from llm.generate_caption import with_feedback
+from caption_quality import get_gate
+from llm.preprocess import truncate_to_budget, estimate_tokens, count_prompt, INGREDIENT_TOKENS
+from settings import secrets
+import metrics
+from image_resolver import get_resolver
 
 # ========== Config ==========
 
-ENCODING = "utf-8"
-LOG_PATH = "data/posted_log.csv"
-SECRETS_PATH = "config/secrets.json"
 REZEPT_IDS = ["944", "459", "574", "610", "513"]  # full list here
-
-# ========== Load Secrets ==========
-
-with open(SECRETS_PATH, "r", encoding=ENCODING) as f:
-    secrets = json.load(f)
-
-ACCESS_TOKEN = secrets["access_token"]
-IG_USER_ID = secrets["ig_user_id"]
-APPROVALS_XLSX = secrets["sharepoint"]
+PREGENERATE_WORKERS = 2
+CAPTION_TIMEOUT = 300  # seconds per recipe caption
+OLLAMA_MODEL = "mistral:latest"
+OLLAMA_OPTIONS = {"temperature": 0}
+SHOP_DOMAIN = "hagengrote.de"  # the call to action links the shop
+IMAGE_BASE_URL = "https://www.hagengrote.de/$WS/hg1ht/websale8_shop-hg1ht/produkte/medien/bilder/gross"
+DEFAULT_ERP_CSV_DIR = "/Volumes/MARAL/CSV/F01"
 
 # ========== Helper Functions ==========
 
@@ -40,14 +44,6 @@ def normalize_german_url(url):
     parts[-1] = filename.lower()
     return "/".join(parts)
 
-def clean_ingredients_from_html(html):
-    html = re.sub(r"<br\s*/?>", "\n", html, flags=re.IGNORECASE)
-    text = re.sub(r"<[^>]+>", "", html)
-    text = re.sub(r"\r\n", "\n", text)
-    text = re.sub(r"\n+", "\n", text)
-    text = re.sub(r"&nbsp;", "", text)
-    return text.strip()
-
 def create_prompt(recipe_name, ingredients_text, recipe_id):
     return f"""Schreibe eine Instagram-Bildunterschrift für ein Rezept.
 
@@ -72,114 +68,147 @@ def create_prompt(recipe_name, ingredients_text, recipe_id):
         #rezeptderwoche #kochenmitliebe #hausgemacht #schnelleküche #genussmomente #hagengrote #familienrezepte #saisonalkochen #kochenmachtglücklich #rezeptideen
         """
 
-def call_ollama(prompt, model="mistral:latest"):
-    response = ollama.chat(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        options={"temperature": 0},
-    )
-    return response["message"]["content"]
+def call_ollama(prompt, model=OLLAMA_MODEL, timeout=None, raw_tokens=None, feedback=None):
+    request = with_feedback(prompt, feedback)
+
+    def generate():
+        count_prompt(request, raw_tokens)
+        return get_client(secrets.get("ollama_host")).chat(request, model=model, options=OLLAMA_OPTIONS,
+                                                           timeout=timeout).text
+
+    if feedback:
+        # A retry for a rejected caption always asks the model; its reply replaces the rejected one
+        text = generate()
+        get_cache().put(cache_key(prompt, model, OLLAMA_OPTIONS), text, model)
+        return text
+    # Deterministic at temperature 0, so an identical request can reuse the cached reply
+    return get_cache().get_or_generate(prompt, model, generate, options=OLLAMA_OPTIONS)
+
+def discard_reply(prompt, model=OLLAMA_MODEL):
+    """Drop the cached reply to ``prompt``, so a rejected caption is not served again."""
+    return get_cache().delete(cache_key(prompt, model, OLLAMA_OPTIONS))
 
 def clean_caption(raw_output):
     return re.sub(r"<think>.*?</think>", "", raw_output, flags=re.DOTALL).strip()
 
-def wait_until_ready(media_id):
-    for _ in range(10):
-        status_res = requests.get(
-            f"https://graph.facebook.com/v22.0/{media_id}?fields=status_code",
-            params={"access_token": ACCESS_TOKEN},
-        )
-        status = status_res.json().get("status_code")
-        if status == "FINISHED":
-            return True
-        time.sleep(2)
-    return False
-
-def upload_and_publish(image_url, caption):
-    res = requests.post(
-        f"https://graph.facebook.com/v22.0/{IG_USER_ID}/media",
-        params={
-            "image_url": image_url,
-            "caption": caption,
-            "access_token": ACCESS_TOKEN,
-        },
-    )
-    creation_id = res.json().get("id")
-    if not creation_id:
-        raise Exception(f"Media creation failed: {res.text}")
-    if not wait_until_ready(creation_id):
-        raise Exception(f"Media {creation_id} not ready in time.")
-    pub = requests.post(
-        f"https://graph.facebook.com/v22.0/{IG_USER_ID}/media_publish",
-        params={"creation_id": creation_id, "access_token": ACCESS_TOKEN},
-    )
-    return pub.json()
+def recipe_image_candidates(recipe_name, recipe_id):
+    """Possible photo URLs of a recipe, the shop's usual naming first."""
+    base_url = secrets.get("recipe_image_base_url", IMAGE_BASE_URL)
+    r_full = "-".join(recipe_name.split()) + "-_-" + recipe_id
+    url = f"{base_url}/{r_full}.jpg"
+    candidates = [normalize_german_url(url), f"{base_url}/{urllib.parse.quote(r_full)}.jpg"]
+    return list(dict.fromkeys(candidates))
+
+def caption_problems(caption, recipe_id, rezept_id=None):
+    """Reasons the caption must not be posted: quality rules, missing code or shop link, near-duplicates."""
+    return get_gate().problems(caption, required=[recipe_id, SHOP_DOMAIN], kind=RECIPE, post_id=rezept_id)
+
+def upload_and_publish(rezept_id, image_url, caption):
+    return publish_pending(Post(rezept_id, caption, [image_url], kind=RECIPE))
 
 def log_posted_recipe(rezept_id):
-    df = pd.DataFrame([[rezept_id, datetime.now()]], columns=["rezept_id", "timestamp"])
-    if os.path.exists(LOG_PATH):
-        df.to_csv(LOG_PATH, mode="a", header=False, index=False)
-    else:
-        df.to_csv(LOG_PATH, index=False)
+    get_history().record(rezept_id, "published", kind=RECIPE,
+                         timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+# ========== Main Flows ==========
+
+@flow
+@metrics.run("recipe_pregenerate")
+def pregenerate_recipe_flow(max_workers: int = PREGENERATE_WORKERS):
+    """Prepare captions and image URLs for every recipe not yet posted or ready."""
+    erp_csv_dir = secrets.get("erp_csv_dir", DEFAULT_ERP_CSV_DIR)
+    recipes = get_index(os.path.join(erp_csv_dir, "V2AR1001.csv"), os.path.join(erp_csv_dir, "V4AR1005.csv"))
+    posted_ids = get_history().ids(kind=RECIPE)
+    queue = get_queue()
+    states = queue.states()
+
+    todo = []
+    for rid in REZEPT_IDS:
+        if rid in posted_ids or states.get(rid) not in (None, FAILED):
+            continue
+        recipe = recipes.get(f"R{rid}")
+        if recipe is None:
+            queue.fail(rid, f"Recipe R{rid} not found in data.")
+            print(f"❌ Recipe R{rid} not found in data.")
+            continue
+        todo.append({"rezept_id": rid, **recipe})
+
+    if not todo:
+        print(f"✅ Nothing to pregenerate ({queue.counts()}).")
+        return
 
-# ========== Main Flow ==========
+    # Photo checks run concurrently and are cached, so the loop below only reads the cache
+    resolver = get_resolver()
+    resolver.check(url for r in todo for url in recipe_image_candidates(r["name"], r["nummer"]))
+
+    def prompt_of(recipe):
+        # The caption lists at most 10 ingredients, so the rest of a long list is cut before prompting
+        ingredients = truncate_to_budget(recipe["ingredients"], INGREDIENT_TOKENS)
+        return create_prompt(recipe["name"], ingredients, recipe["nummer"])
+
+    def caption_fn(recipe, timeout, feedback=None):
+        raw_tokens = estimate_tokens(create_prompt(recipe["name"], recipe["ingredients"], recipe["nummer"]))
+        return clean_caption(call_ollama(prompt_of(recipe), timeout=timeout, raw_tokens=raw_tokens,
+                                         feedback=feedback))
+
+    def check(recipe, caption):
+        return caption_problems(caption, recipe["nummer"], recipe["rezept_id"])
+
+    # Rejected captions are regenerated a bounded number of times before the recipe is marked failed
+    for result in generate_checked_captions(todo, check, caption_fn=caption_fn,
+                                            discard=lambda recipe: discard_reply(prompt_of(recipe)),
+                                            max_workers=max_workers, timeout=CAPTION_TIMEOUT):
+        recipe = result.product
+        rid, recipe_id = recipe["rezept_id"], recipe["nummer"]
+        image_url = next(iter(resolver.resolve([recipe_image_candidates(recipe["name"], recipe_id)])), None)
+        error = result.error or (None if image_url else "no recipe photo found")
+        if error:
+            queue.fail(rid, error, nummer=recipe_id)
+            print(f"❌ {recipe_id}: {error}")
+            continue
+        queue.put(rid, recipe_id, result.caption, image_url)
+        get_gate().accept(rid, result.caption, kind=RECIPE)
+        print(f"✅ {recipe_id} ready ({result.elapsed:.1f}s)")
 
 @flow
+@metrics.run("recipe_post")
 def post_recipe_flow():
-    # Step 1: Load and filter recipes
-    is_text = pd.read_csv("/Volumes/MARAL/CSV/F01/V4AR1005.csv", sep=";", encoding="cp850")
-    mar = pd.read_csv("/Volumes/MARAL/CSV/F01/V2AR1001.csv", sep=";", encoding="cp850")
-
-    marketing_istext_merged = mar[["NUMMER", "TEXT_KZ"]].merge(
-        is_text, left_on="TEXT_KZ", right_on="TEXTNR", how="outer"
-    )
-    recipe_data = marketing_istext_merged[marketing_istext_merged["NUMMER"].str.startswith("R", na=False)][
-        ["NUMMER", "TEXT_KZ", "STICHWORT", "INTERNET", "KATALOG", "BANAME", "SYS_ANLAGE", "SYS_BEWEG", "TEXT11"]
-    ]
-    recipe_data = recipe_data[recipe_data["INTERNET"].notna()]
-    recipe_data = recipe_data[~recipe_data["STICHWORT"].str.contains(r"^fr", case=False, na=False, regex=True)]
-
-    # Step 2: Check already posted
-    try:
-        posted_log = pd.read_csv(LOG_PATH)
-        posted_ids = posted_log["rezept_id"].astype(str).tolist()
-    except FileNotFoundError:
-        posted_ids = []
-
-    next_id = next((rid for rid in REZEPT_IDS if rid not in posted_ids), None)
-    if not next_id:
+    # Step 1: Next pregenerated recipe that has not been posted yet
+    posted_ids = get_history().ids(kind=RECIPE)
+    pending_ids = [rid for rid in REZEPT_IDS if rid not in posted_ids]
+    if not pending_ids:
         print("✅ All recipes have already been posted.")
         return
 
-    # Step 3: Extract recipe data
-    selected_recipe = recipe_data[recipe_data["NUMMER"] == f"R{next_id}"]
-    if selected_recipe.empty:
-        print(f"❌ Recipe R{next_id} not found in data.")
+    queue = get_queue()
+    entry = queue.claim(pending_ids)
+    if entry is None:
+        print(f"❌ No pregenerated recipe ready ({queue.counts()}); run pregenerate_recipe_flow.")
         return
 
-    recipe_description = selected_recipe.iloc[0]["INTERNET"]
-    recipe_name = selected_recipe.iloc[0]["BANAME"]
-    recipe_id = selected_recipe.iloc[0]["NUMMER"]
+    next_id = entry["rezept_id"]
+    recipe_id = entry["nummer"]
+    generated_caption = entry["caption"]
+    photo_url = entry["image_url"]
 
-    ingredients_text = clean_ingredients_from_html(recipe_description)
-    prompt = create_prompt(recipe_name, ingredients_text, recipe_id)
-    response = call_ollama(prompt)
-    generated_caption = clean_caption(response)
-
-    r_name = "-".join(recipe_name.split())
-    r_full = r_name + "-_-" + recipe_id
-    photo_url = f"https://www.hagengrote.de/$WS/hg1ht/websale8_shop-hg1ht/produkte/medien/bilder/gross/{r_full}.jpg"
-    photo_url = normalize_german_url(photo_url)
-
-    # Step 4: Upload
+    # Step 2: Upload
     print(f"📸 Posting Recipe: {recipe_id}")
     print(f"📝 Caption:\n{generated_caption}\n")
     print(f"🌐 Image URL: {photo_url}")
-    # upload_and_publish(photo_url, generated_caption)
+    # A crash here leaves the recipe 'publishing'; see 'python recipe_queue.py --retry'
+    # upload_and_publish(next_id, photo_url, generated_caption)
 
-    # Step 5: Log result
+    # Step 3: Log result
+    queue.finish(next_id, PUBLISHED)
     log_posted_recipe(next_id)
+    get_gate().remember(next_id, generated_caption, kind=RECIPE)
 
-# To test manually: python post_recipe_flow.py
+# To test manually: python rezept_automation.py [pregenerate]
 if __name__ == "__main__":
-    post_recipe_flow()
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if sys.argv[1:] == ["pregenerate"]:
+        pregenerate_recipe_flow()
+    else:
+        post_recipe_flow()
@@ -1,49 +1,41 @@
-import json
-import time
 import os
-import re
-import csv
-import random
-import datetime
-import shutil
-import pandas as pd
 
-from llm.generate_caption import generate_caption
+from llm.batch import generate_checked_captions
+from caption_quality import get_gate
+from post_history import get_history
+from prepare_journal import get_journal, SELECTED, IMAGES, CAPTIONED, FAILED
+from approvals import ApprovalsWriter
+from image_resolver import get_resolver, high_res_candidates
+from image_pipeline import preprocess_products
+from settings import secrets
+import metrics
 
 encoding = 'latin-1'
 
-# Load secrets
-with open("config/secrets.json", "r") as f:
-    secrets = json.load(f)
+PENDING_APPROVALS_CSV = "data/pending_approvals.csv"
 
-ACCESS_TOKEN = secrets["access_token"]
-IG_USER_ID = secrets["ig_user_id"]
+def caption_workers():
+    # Concurrent caption requests; the Ollama server needs OLLAMA_NUM_PARALLEL >= this
+    return int(secrets.get("caption_workers", 4))
 
-PENDING_APPROVALS_CSV = "data/pending_approvals.csv"
+def caption_pack_size():
+    # Short products captioned per request; > 1 needs a model with structured outputs
+    return int(secrets.get("caption_pack_size", 1))
 
-# Ensure log file exists
-def ensure_log():
-    if not os.path.exists("data/posted_log.csv"):
-        with open("data/posted_log.csv", "w", newline="", encoding=encoding) as f:
-            writer = csv.writer(f)
-            writer.writerow(["id", "timestamp", "status"])
-
-def ensure_approvals_csv():
-    if not os.path.exists(PENDING_APPROVALS_CSV):
-        with open(PENDING_APPROVALS_CSV, "w", newline="", encoding=encoding) as f:
-            writer = csv.writer(f, delimiter=';')
-            writer.writerow(["product_id", "titel", "description", "caption_file", "image_urls_file", "approved"])
-
-def already_posted(product_id):
-    if not os.path.exists("data/posted_log.csv"):
-        return False
-    with open("data/posted_log.csv", "r", encoding=encoding) as f:
-        return product_id in f.read()
+def caption_check(gate):
+    # Rule and near-duplicate checks; caption_cta in secrets.json is text every caption must contain
+    required = [secrets["caption_cta"]] if secrets.get("caption_cta") else []
+    return lambda row, caption: gate.problems(caption, required, post_id=row["id"])
+
+def write_text_atomic(path, text):
+    # Readers such as master_scheduler never see a half-written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
 
 def log_post(product_id, status):
-    with open("data/posted_log.csv", "a", newline="", encoding=encoding) as f:
-        writer = csv.writer(f)
-        writer.writerow([product_id, time.strftime("%Y-%m-%d %H:%M:%S"), status])
+    get_history().record(product_id, status)
 
 def collect_all_image_urls(row):
     urls = []
@@ -62,92 +54,149 @@ def collect_all_image_urls(row):
                 urls.append(alt_url)
     return urls
 
-def append_to_approvals_csv(product_id, titel, description, caption_path, image_urls_path):
-    # Read caption text
-    with open(caption_path, "r", encoding='utf-8') as f:
-        caption = f.read().strip()
-
-    # Read image URLs and join them into one string with newlines
-    with open(image_urls_path, "r", encoding='utf-8') as f:
-        image_urls = "|".join([line.strip() for line in f if line.strip()])
-
-    # Check if header is needed (file does not exist or is empty)
-    needs_header = not os.path.exists(PENDING_APPROVALS_CSV) or os.stat(PENDING_APPROVALS_CSV).st_size == 0
-
-    # Append to CSV using ';' as delimiter
-    with open(PENDING_APPROVALS_CSV, "w", newline="", encoding='utf-8') as f:
-        writer = csv.writer(f, delimiter=";")
-        writer.writerow([product_id, titel, description, caption, image_urls, "FALSE"])
-
-def is_seasonally_relevant(row):
-    today = datetime.date.today()
-    month = today.month
-    category = row.get("category", "").lower()
-    title = row.get("titel", "").lower()
-    description = row.get("description", "").lower()
-
-    if month == 12:
-        return any(keyword in (title + description + category) for keyword in ["weihnachten", "xmas", "christmas", "advent"])
-    if month in [3, 4]:
-        return any(keyword in (title + description + category) for keyword in ["ostern", "hase", "frühling", "oster"])
-    return not any(k in (title + description + category) for k in ["weihnachten", "xmas", "christmas", "advent", "ostern", "hase"])
-
-def convert_csv_to_excel_and_copy(csv_path, excel_path):
-    df = pd.read_csv(csv_path, sep=";", encoding="utf-8")
-    with pd.ExcelWriter(excel_path, mode='a',engine='xlsxwriter') as writer:
-        df.to_excel(writer,index=False)
-    print(f"✅ Excel file saved: {excel_path}")
-
-def prepare_multiple_products(limit=7):
-    ensure_log()
-    ensure_approvals_csv()
+def image_slots(row):
+    # One candidate list per image, the high-resolution variant first
+    return [high_res_candidates(url) for url in collect_all_image_urls(row)]
+
+def prefetch_image_checks(rows):
+    """Check the images of all ``rows`` in one concurrent pass, so ``write_image_urls`` hits the cache."""
+    get_resolver().check(url for row in rows for slot in image_slots(row) for url in slot)
+
+def write_image_urls(row):
+    """Write the verified image URLs of ``row``; raises if the shop serves none of them."""
+    image_urls = get_resolver().resolve(image_slots(row))
+    if not image_urls:
+        raise ValueError(f"No available image for {row['id']}")
+    product_dir = os.path.join("output", row["id"])
+    os.makedirs(product_dir, exist_ok=True)
+    write_text_atomic(os.path.join(product_dir, "image_urls.txt"), "\n".join(image_urls))
+    return image_urls
+
+def prepare_multiple_products(limit=7, max_workers=None, approvals_writer=None):
+    """Prepare up to ``limit`` posts and merge their approval rows into the approvals CSV.
+
+    Rows are collected in ``approvals_writer`` (a new ``ApprovalsWriter`` by
+    default) and written in one pass at the end, also after a failure.
+    Progress is kept in the prepare journal: after a crash, the next call
+    resumes the same run, finishing only the products that were not done.
+    """
+    writer = approvals_writer or ApprovalsWriter(PENDING_APPROVALS_CSV)
     os.makedirs("output", exist_ok=True)
-
-    with open("data/product_list.csv", "r", encoding=encoding) as f:
-        reader = list(csv.DictReader(f, delimiter=';'))
-        random.shuffle(reader)
-
-        prepared = 0
-        for row in reader:
-            if prepared >= limit:
-                break
-
-            product_id = row.get("id")
-            if not product_id or already_posted(product_id) or re.match(r'^\d+H[A-Z]\d+', product_id):
+    journal = get_journal()
+    try:
+        run_id = _prepare(limit, max_workers or caption_workers(), writer, journal)
+    finally:
+        if len(writer):
+            writer.flush()
+    journal.finish(run_id)
+    if len(writer) and secrets.get("image_public_base_url"):
+        # Optional: Instagram-ready derivatives, served from image_public_base_url
+        preprocess_products(list(writer.rows), secrets["image_public_base_url"])
+    return writer
+
+def _prepare(limit, max_workers, writer, journal):
+    import pandas as pd
+    from candidate_selection import select_candidates
+
+    with metrics.timer("load_products"):
+        products = pd.read_csv("data/product_list.csv", sep=';', encoding=encoding, dtype=str, keep_default_na=False)
+    run_id = journal.open_run()
+    if run_id is None:
+        # Any recorded status (prepared, failed, published) excludes a product
+        with metrics.timer("select"):
+            selected, timings = select_candidates(products, posted_ids=get_history().ids())
+        print("⏱️ Candidate selection: " + ", ".join(f"{k} {v * 1000:.1f}ms" for k, v in timings.items()))
+        run_id = journal.start(selected["id"])
+    else:
+        print(f"⏯️ Resuming preparation run {run_id}: {journal.counts(run_id)}")
+    # Rows of the run's candidates by id; only the few products taken are converted
+    by_id = products.drop_duplicates("id").set_index("id", drop=False)
+    items = journal.items(run_id)
+
+    def lookup(product_id):
+        return by_id.loc[product_id].to_dict() if product_id in by_id.index else None
+
+    gate = get_gate()
+    check = caption_check(gate)
+
+    # Products captioned before an interruption only need their approval row again
+    prepared = 0
+    for product_id, entry in items.items():
+        row = lookup(product_id) if entry["step"] == CAPTIONED else None
+        if row is not None:
+            writer.add(product_id, row.get("titel"), row.get("description"), entry["caption"].strip(),
+                       entry["image_urls"])
+            gate.accept(product_id, entry["caption"])
+            prepared += 1
+    pending = [product_id for product_id, entry in items.items() if entry["step"] in (SELECTED, IMAGES)]
+
+    def fail(product_id, error):
+        log_post(product_id, f"failed: {error}")
+        journal.record(run_id, product_id, FAILED, error=str(error))
+
+    # Captions are generated a batch at a time; failed items are replaced by
+    # pulling further candidates until `limit` products are prepared.
+    while prepared < limit:
+        taken, pending = pending[:limit - prepared], pending[limit - prepared:]
+        taken += journal.take(run_id, limit - prepared - len(taken))
+        if not taken:
+            break
+
+        selected = []
+        for product_id in taken:
+            row = lookup(product_id)
+            if row is not None:
+                selected.append(row)
+            else:
+                fail(product_id, "no longer in the product list")
+
+        batch = []
+        image_urls = {}
+        prefetch_image_checks(row for row in selected if row["id"] not in items or items[row["id"]]["step"] != IMAGES)
+        for row in selected:
+            entry = items.get(row["id"])
+            if entry and entry["step"] == IMAGES:
+                image_urls[row["id"]] = entry["image_urls"]
+                batch.append(row)
                 continue
-
             try:
-                stock = int(float(row.get("Bestand", 0)))
-                if stock < 10 or not is_seasonally_relevant(row):
-                    continue
-
-                name = row.get("titel")
-                description = row.get("description")
-                product_dir = os.path.join("output", product_id)
-                os.makedirs(product_dir, exist_ok=True)
-
-                caption_path = os.path.join(product_dir, "caption.txt")
-                image_urls_path = os.path.join(product_dir, "image_urls.txt")
-                image_urls = collect_all_image_urls(row)
-
-                with open(image_urls_path, "w", encoding="utf-8") as f:
-                    f.write("\n".join(image_urls))
-
-                caption = generate_caption(description, name, product_id)
-                with open(caption_path, "w", encoding="utf-8") as f:
-                    f.write(caption)
+                image_urls[row["id"]] = write_image_urls(row)
+                journal.record(run_id, row["id"], IMAGES, image_urls=image_urls[row["id"]])
+                batch.append(row)
+            except Exception as e:
+                fail(row["id"], e)
+
+        # Rejected captions are regenerated; a product still rejected is logged as failed and replaced
+        for result in generate_checked_captions(batch, check, max_workers=max_workers, pack_size=caption_pack_size()):
+            row = result.product
+            product_id = row["id"]
+            if not result.ok:
+                fail(product_id, result.error)
+                continue
 
-                append_to_approvals_csv(product_id, name, description, caption_path, image_urls_path)
+            try:
+                write_text_atomic(os.path.join("output", product_id, "caption.txt"), result.caption)
                 log_post(product_id, "prepared")
+                journal.record(run_id, product_id, CAPTIONED, caption=result.caption)
+
+                writer.add(product_id, row.get("titel"), row.get("description"), result.caption.strip(),
+                           image_urls[product_id])
+                gate.accept(product_id, result.caption)
                 prepared += 1
+                metrics.count("products.prepared")
+                print(f"✅ Prepared {product_id} ({result.elapsed:.1f}s)")
 
             except Exception as e:
-                log_post(product_id, f"failed: {str(e)}")
-                continue
+                fail(product_id, e)
+    return run_id
 
 if __name__ == "__main__":
-    csv_path = "data/pending_approvals.csv"
     excel_path = secrets['sharepoint']
 
-    prepare_multiple_products(limit=7)
-    convert_csv_to_excel_and_copy(csv_path, excel_path)
\ No newline at end of file
+    with metrics.run("weekly") as run:
+        writer = prepare_multiple_products(limit=7)
+        with metrics.timer("export_approvals"):
+            added, updated = writer.export_excel(excel_path)
+    print(f"✅ Excel file saved: {excel_path} ({added} added, {updated} updated)")
+    print(f"🧮 Prompt tokens: {run.counters.get('prompt_tokens.sent', 0)} sent, "
+          f"{run.counters.get('prompt_tokens.saved', 0)} saved")
\ No newline at end of file
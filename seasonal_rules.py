@@ -0,0 +1,123 @@
+import re
+import json
+import datetime
+import functools
+
+RULES_PATH = "config/seasonal_rules.json"
+
+UMLAUT_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+# Spelled-out umlauts in a folded keyword match either spelling in the text
+DIGRAPHS = {"ae": "(?:ae|ä)", "oe": "(?:oe|ö)", "ue": "(?:ue|ü)", "ss": "(?:ss|ß)"}
+
+
+def fold(text):
+    """Lowercase and spell out umlauts, so "Frühling" and "Fruehling" compare equal."""
+    return text.lower().translate(UMLAUT_FOLD)
+
+
+def _tokens(keyword):
+    tokens, i = [], 0
+    while i < len(keyword):
+        if keyword[i:i + 2] in DIGRAPHS:
+            tokens.append(DIGRAPHS[keyword[i:i + 2]])
+            i += 2
+        else:
+            tokens.append(re.escape(keyword[i]))
+            i += 1
+    return tokens
+
+
+def trie_regex(keywords):
+    """One alternation regex for all (folded) keywords, factored by common prefixes.
+
+    ``["oster", "ostern", "hase"]`` becomes ``(?:hase|oster(?:n)?)`` so the
+    engine tests each shared prefix once per position instead of once per
+    keyword. Umlauts are matched in both spellings by the pattern itself,
+    which keeps the text side a plain lowercase.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for token in _tokens(keyword):
+            node = node.setdefault(token, {})
+        node[""] = {}
+
+    def build(node):
+        if list(node) == [""]:
+            return ""
+        optional = "" in node
+        branches = [token + build(child) for token, child in sorted(node.items()) if token]
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            body = "(?:" + body + ")?"
+        return body
+
+    return re.compile(build(trie)) if keywords else None
+
+
+def _parse_day(value):
+    month, day = (int(part) for part in value.split("-"))
+    return month, day
+
+
+class SeasonalMatcher:
+    """Compiled include/exclude keyword matcher for one rule."""
+
+    def __init__(self, name, include=(), exclude=()):
+        self.name = name
+        self.include = sorted({fold(k) for k in include})
+        self.exclude = sorted({fold(k) for k in exclude})
+        self.include_re = trie_regex(self.include)
+        self.exclude_re = trie_regex(self.exclude)
+
+    def matches(self, text):
+        text = text.lower()
+        if self.include_re is not None and not self.include_re.search(text):
+            return False
+        return self.exclude_re is None or not self.exclude_re.search(text)
+
+    def mask(self, texts):
+        """Vectorized ``matches`` over a pandas Series of strings."""
+        lowered = texts.fillna("").str.lower()
+        result = lowered.notna()
+        if self.include_re is not None:
+            result &= lowered.str.contains(self.include_re, regex=True)
+        if self.exclude_re is not None:
+            result &= ~lowered.str.contains(self.exclude_re, regex=True)
+        return result
+
+
+class SeasonalRules:
+    """Date-ranged keyword rules loaded from a declarative JSON file."""
+
+    def __init__(self, rules, default=None):
+        self.rules = rules
+        self.default = default or {"name": "default"}
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config.get("rules", []), config.get("default"))
+
+    def rule_for(self, today):
+        key = (today.month, today.day)
+        for rule in self.rules:
+            start, end = _parse_day(rule["start"]), _parse_day(rule["end"])
+            if start <= end:
+                active = start <= key <= end
+            else:  # wraps the year end, e.g. 11-15 .. 01-06
+                active = key >= start or key <= end
+            if active:
+                return rule
+        return self.default
+
+    def matcher(self, today=None):
+        rule = self.rule_for(today or datetime.date.today())
+        return SeasonalMatcher(rule.get("name", ""), rule.get("include", ()), rule.get("exclude", ()))
+
+
+@functools.lru_cache(maxsize=8)
+def get_matcher(today=None, path=RULES_PATH):
+    """Matcher for ``today``, compiled once per run."""
+    return SeasonalRules.load(path).matcher(today)
@@ -0,0 +1,44 @@
+import json
+import threading
+
+SECRETS_PATH = "config/secrets.json"
+
+
+class Settings:
+    """``config/secrets.json``, read on first access instead of at import time.
+
+    Modules share the ``secrets`` instance below and look keys up when they
+    need them, so importing a module never opens the file and a run reads
+    it once. The path is relative to the working directory.
+    """
+
+    def __init__(self, path=SECRETS_PATH, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    with open(self.path, "r", encoding=self.encoding) as f:
+                        self._data = json.load(f)
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def reload(self):
+        """Forget the cached values; the next access reads the file again."""
+        with self._lock:
+            self._data = None
+
+
+secrets = Settings()
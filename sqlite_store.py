@@ -0,0 +1,48 @@
+import os
+import inspect
+import sqlite3
+import threading
+import functools
+
+
+def open_db(path, schema, *pragmas):
+    """``(connection, lock)`` for the SQLite database at ``path``, with ``schema`` applied.
+
+    The connection is shared by all threads of the store (WAL mode, so other
+    processes can read while it writes); every use must hold the lock.
+    ``pragmas`` are extra settings such as ``"synchronous=NORMAL"``.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in pragmas:
+        conn.execute(f"PRAGMA {pragma}")
+    conn.executescript(schema)
+    conn.commit()
+    return conn, threading.Lock()
+
+
+def shared(factory):
+    """Decorator for ``get_*`` accessors: one instance per process and argument values.
+
+    The first call with given arguments (defaults filled in, so ``get_x()``
+    and ``get_x(DEFAULT_PATH)`` are the same) creates the instance under a
+    lock, so threads starting at once never open a store twice.
+    """
+    signature = inspect.signature(factory)
+    instances = {}
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(bound.arguments.values())
+        with lock:
+            if key not in instances:
+                instances[key] = factory(*args, **kwargs)
+            return instances[key]
+
+    return get
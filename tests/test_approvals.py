@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+from approvals import ApprovalsReader, ApprovalsWriter
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / "approvals.xlsx")
+    writer = ApprovalsWriter(str(tmp_path / "pending.csv"))
+    for product_id in ("1", "2", "3"):
+        writer.add(product_id, f"Produkt {product_id}", "Beschreibung", "Caption", ["https://shop/1.jpg"])
+    writer.export_excel(path)
+    return path
+
+
+def set_approved(path, approved):
+    workbook = load_workbook(path)
+    sheet = workbook.worksheets[0]
+    header = [cell.value for cell in sheet[1]]
+    for row in sheet.iter_rows(min_row=2):
+        product_id = row[header.index("product_id")].value
+        if product_id in approved:
+            row[header.index("approved")].value = approved[product_id]
+    workbook.save(path)
+    # Same-second saves must still count as a modification
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def ids(rows):
+    return sorted(row["product_id"] for row in rows)
+
+
+def test_changed_rows(workbook, tmp_path):
+    reader = ApprovalsReader(workbook, snapshot_path=str(tmp_path / "snapshot.json"))
+    rows, changed = reader.read()
+    assert ids(rows) == ["1", "2", "3"] and changed == []
+
+    set_approved(workbook, {"1": "TRUE", "2": "wahr"})
+    rows, changed = reader.read()
+    assert ids(changed) == ["1", "2"]
+    assert ids(reader.approved()) == ["1", "2"]
+    assert reader.read()[1] == []
+
+    set_approved(workbook, {"2": "FALSE"})
+    assert ids(reader.read()[1]) == ["2"]
+
+
+def test_changes_are_tracked_per_consumer(workbook, tmp_path):
+    snapshot = str(tmp_path / "snapshot.json")
+    scheduler = ApprovalsReader(workbook, snapshot_path=snapshot, consumer="master_scheduler")
+    worker = ApprovalsReader(workbook, snapshot_path=snapshot, consumer="posting_worker")
+    scheduler.read()
+    worker.read()
+
+    set_approved(workbook, {"3": "TRUE"})
+    assert ids(scheduler.read()[1]) == ["3"]
+    # The scheduler's read does not hide the change from the worker
+    assert ids(worker.read()[1]) == ["3"]
+    assert scheduler.read()[1] == [] and worker.read()[1] == []
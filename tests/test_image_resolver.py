@@ -0,0 +1,150 @@
+import os
+
+import pytest
+
+import image_resolver
+import run_weekly
+from benchmarks.fakes import FakeImageServer
+from image_resolver import ImageResolver, high_res_candidates
+
+HOUR = 3600
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(image_resolver, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def server():
+    with FakeImageServer(latency=0.0) as server:
+        yield server
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    resolver = ImageResolver(str(tmp_path / "image_cache.sqlite3"), max_workers=4)
+    yield resolver
+    resolver.close()
+
+
+def test_high_res_candidates():
+    assert high_res_candidates("https://shop/bilder/normal/1.jpg") == [
+        "https://shop/bilder/gross/1.jpg", "https://shop/bilder/normal/1.jpg"]
+    assert high_res_candidates("https://shop/bilder/1.jpg") == ["https://shop/bilder/1.jpg"]
+    assert high_res_candidates("") == []
+
+
+def test_check(server, resolver):
+    found = server.add("/normal/1.jpg", b"\xff" * 1234)
+    missing = server.url + "/normal/2.jpg"
+
+    infos = resolver.check([found, missing, found])
+
+    assert set(infos) == {found, missing}
+    assert infos[found].ok and infos[found].size == 1234 and infos[found].etag
+    assert infos[missing].status == 404 and not infos[missing].ok
+    assert [method for method, _ in server.methods] == ["HEAD", "HEAD"]
+
+
+@pytest.mark.parametrize("status", [405, 501])
+def test_get_when_head_is_not_allowed(resolver, status):
+    with FakeImageServer(latency=0.0, head_status=status) as server:
+        url = server.add("/normal/1.jpg", 500)
+        info = resolver.check([url])[url]
+
+    assert info.ok and info.status == 200 and info.size == 500
+    assert server.methods == [("HEAD", "/normal/1.jpg"), ("GET", "/normal/1.jpg")]
+
+
+def test_unreachable_host(resolver):
+    with FakeImageServer(latency=0.0) as server:
+        url = server.url + "/normal/1.jpg"
+    info = resolver.check([url])[url]
+
+    assert info.status is None and not info.ok
+
+
+def test_image_is_trusted_for_24_hours(server, resolver, clock):
+    url = server.add("/normal/1.jpg")
+    resolver.check([url])
+
+    clock.now += 23 * HOUR
+    assert resolver.check([url])[url].ok
+    assert server.requests == 1
+
+    clock.now += 2 * HOUR
+    resolver.check([url])
+    assert server.requests == 2
+
+
+def test_missing_image_is_checked_again_after_an_hour(server, resolver, clock):
+    url = server.url + "/normal/1.jpg"
+    assert not resolver.check([url])[url].ok
+
+    server.add("/normal/1.jpg")
+    clock.now += 0.5 * HOUR
+    assert not resolver.check([url])[url].ok
+    assert server.requests == 1
+
+    clock.now += HOUR
+    assert resolver.check([url])[url].ok
+    assert server.requests == 2
+
+
+def test_cache_is_shared_across_resolvers(server, tmp_path):
+    url = server.add("/normal/1.jpg")
+    path = str(tmp_path / "image_cache.sqlite3")
+    first, second = ImageResolver(path), ImageResolver(path)
+    first.check([url])
+
+    assert second.check([url])[url].ok
+    assert server.requests == 1
+    first.close()
+    second.close()
+
+
+def test_resolve_prefers_gross(server, resolver):
+    server.add("/gross/1.jpg")
+    both = server.add("/normal/1.jpg")
+    normal_only = server.add("/normal/2.jpg")
+    neither = server.url + "/normal/3.jpg"
+
+    resolved = resolver.resolve([high_res_candidates(u) for u in (both, normal_only, neither)])
+
+    assert resolved == [server.url + "/gross/1.jpg", normal_only]
+    # All candidates of all slots are checked in the one pass
+    assert sorted(path for _, path in server.methods) == [
+        "/gross/1.jpg", "/gross/2.jpg", "/gross/3.jpg", "/normal/1.jpg", "/normal/2.jpg", "/normal/3.jpg"]
+
+
+def test_write_image_urls(server, resolver, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_weekly, "get_resolver", lambda: resolver)
+    server.add("/gross/1.jpg")
+    server.add("/normal/1_1.jpg")
+    row = {"id": "1", "image_link": server.url + "/normal/1.jpg", "Zusatzbild_1": "1_1.jpg"}
+
+    assert run_weekly.write_image_urls(row) == [server.url + "/gross/1.jpg", server.url + "/normal/1_1.jpg"]
+    with open(os.path.join("output", "1", "image_urls.txt"), encoding="utf-8") as f:
+        assert f.read().splitlines() == [server.url + "/gross/1.jpg", server.url + "/normal/1_1.jpg"]
+
+
+def test_write_image_urls_without_images(server, resolver, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_weekly, "get_resolver", lambda: resolver)
+    row = {"id": "2", "image_link": server.url + "/normal/2.jpg"}
+
+    with pytest.raises(ValueError, match="No available image for 2"):
+        run_weekly.write_image_urls(row)
+    assert not os.path.exists(os.path.join("output", "2"))
@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks.fakes import FakeOllamaServer
+from llm.ollama_client import OllamaClient
+
+REPLY = "Ein schönes Produkt für jeden Tag! #hagengrote"
+LATENCY = 0.1
+TOKEN_DELAY = 0.02
+
+
+@pytest.fixture
+def ollama():
+    with FakeOllamaServer(latency=LATENCY, token_delay=TOKEN_DELAY, reply=REPLY) as server:
+        yield server
+
+
+@pytest.fixture
+def client(ollama):
+    client = OllamaClient(ollama.url, keep_alive="10m", timeout=10)
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("method", ["chat", "generate"])
+def test_streamed_reply_and_metrics(ollama, client, method):
+    tokens = []
+    result = getattr(client, method)("Bildunterschrift für Pfanne", "llama3", on_token=tokens.append)
+
+    assert result.text == REPLY
+    assert "".join(tokens) == REPLY
+    assert result.model == "llama3"
+    assert result.eval_count == len(REPLY.split(" "))
+    assert result.prompt_eval_count > 0
+    assert LATENCY <= result.time_to_first_token < result.latency
+    assert result.latency >= LATENCY + (result.eval_count - 1) * TOKEN_DELAY
+    # eval_duration reported by the server: eval_count tokens at TOKEN_DELAY each
+    assert result.tokens_per_second == pytest.approx(1 / TOKEN_DELAY, rel=0.01)
+
+
+@pytest.mark.parametrize("method, field", [("chat", "messages"), ("generate", "prompt")])
+def test_request_payload(ollama, client, method, field):
+    getattr(client, method)("Hallo", "llama3", options={"temperature": 0.2}, format="json")
+
+    payload = ollama.payloads[-1]
+    assert payload["keep_alive"] == "10m"
+    assert payload["stream"] is True
+    assert payload["options"] == {"temperature": 0.2}
+    assert payload["format"] == "json"
+    assert field in payload
+
+
+def test_connections_are_reused(ollama, client):
+    for _ in range(3):
+        client.chat("Hallo", "llama3")
+
+    assert ollama.requests == 3
+    assert len(client.session.get_adapter(ollama.url).poolmanager.pools) == 1
+
+
+@pytest.mark.parametrize("method", ["chat", "generate"])
+def test_http_error(method):
+    with FakeOllamaServer(latency=0.0, failure_rate=1.0) as ollama:
+        client = OllamaClient(ollama.url)
+        with pytest.raises(RuntimeError, match=r"Ollama call failed \(500\).*model runner has unexpectedly stopped"):
+            getattr(client, method)("Hallo", "llama3")
+
+    assert ollama.failures == 1
+
+
+def test_host_without_scheme():
+    assert OllamaClient("localhost:11434").host == "http://localhost:11434"
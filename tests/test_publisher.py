@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.fakes import FakeGraphServer
+from graph_api import GraphClient
+from publisher import Post, Publisher, InstagramTarget, FacebookPageTarget
+
+IMAGE = "https://shop.example/bilder/gross/100001.jpg"
+
+
+@pytest.fixture
+def server():
+    with FakeGraphServer(latency=0.0, processing_time=0.1, error_users={"broken"}) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    client = GraphClient("fake-token", base_url=server.url, backoff=0.01)
+    yield client
+    client.session.close()
+
+
+def make_publisher(client, reported):
+    targets = [
+        InstagramTarget("ig", client, "1784"),
+        InstagramTarget("ig-broken", client, "broken"),
+        FacebookPageTarget("fb", client, "1000"),
+    ]
+    return Publisher(targets, on_result=lambda post, target, status: reported.append((target, status)),
+                     poll_timeout=5)
+
+
+@pytest.mark.parametrize("images", [1, 3])
+def test_container_error_fails_only_its_target(server, client, images):
+    reported = []
+    publisher = make_publisher(client, reported)
+    post = Post("100001", "Ein schönes Produkt! #hagengrote", [IMAGE] * images)
+
+    results = publisher.publish(post)
+
+    assert results["ig"].ok and results["fb"].ok
+    assert not results["ig-broken"].ok
+    assert "failed processing: ERROR" in str(results["ig-broken"].error)
+    assert sorted(user for user, _ in server.published) == ["1000", "1784"]
+    statuses = dict(reported)
+    assert statuses["ig"] == statuses["fb"] == "published"
+    assert statuses["ig-broken"].startswith("failed: ")
+
+
+def test_only_the_given_targets(server, client):
+    publisher = make_publisher(client, [])
+    post = Post("100001", "Ein schönes Produkt! #hagengrote", [IMAGE])
+
+    assert list(publisher.publish(post, ["ig"])) == ["ig"]
+    requests = server.requests
+    assert publisher.publish(post, []) == {}
+    assert server.requests == requests
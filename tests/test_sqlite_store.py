@@ -0,0 +1,40 @@
+import time
+import threading
+
+from sqlite_store import open_db, shared
+
+
+def test_open_db(tmp_path):
+    path = str(tmp_path / "data" / "store.sqlite3")
+    conn, lock = open_db(path, "CREATE TABLE IF NOT EXISTS t (x INTEGER);", "synchronous=NORMAL")
+
+    with lock, conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    # Opening again keeps the data
+    conn2, _ = open_db(path, "CREATE TABLE IF NOT EXISTS t (x INTEGER);")
+    assert conn2.execute("SELECT x FROM t").fetchall() == [(1,)]
+
+
+def test_shared_once_per_arguments():
+    created = []
+
+    @shared
+    def get_store(path="default.sqlite3"):
+        time.sleep(0.05)  # threads arriving together must not open it twice
+        created.append(path)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_store())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert created == ["default.sqlite3"]
+    assert all(store is results[0] for store in results)
+    assert get_store("default.sqlite3") is results[0]
+    assert get_store(path="other.sqlite3") is not results[0]
+    assert get_store.__name__ == "get_store"